@@ -6,11 +6,17 @@
 🚫 Para cuando no puedes aumentar cuotas de Dataflow
 """
 
+import os
 import subprocess
+import sys
 import time
 import logging
 from datetime import datetime
 
+# Módulos compartidos en el directorio raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from input_profile_cache import cached_schema
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -49,11 +55,15 @@ def run_bq_load():
     except Exception as e:
         logger.warning(f"⚠️  Error creando dataset: {e}")
     
+    # Esquema desde la caché de perfiles (auto-detect solo si no se pudo inferir)
+    schema = cached_schema(source_file)
+    schema_flag = f'--schema={schema}' if schema else '--autodetect'
+    
     # Comando de carga optimizado
     load_command = [
         'bq', 'load',
         '--source_format=CSV',
-        '--autodetect',  # Auto-detect schema
+        schema_flag,
         '--ignore_unknown_values',
         '--max_bad_records=10000',  # Permitir hasta 10k registros malos
         '--replace',  # Reemplazar tabla si existe
@@ -8,6 +8,7 @@ set -e
 
 echo "🚀 Iniciando carga optimizada para 8 IPs (sin aumentar cuotas)..."
 echo "⏰ Inicio: $(date)"
+START_EPOCH=$(date +%s)
 echo "💡 Esta solución funciona con tus cuotas actuales"
 
 # Configurar variables de entorno
@@ -17,6 +18,24 @@ export BUCKET_NAME="desafio-deacero-143d30a0-d8f8-4154-b7df-1773cf286d32"
 export DATASET_NAME="cdo_challenge"
 export TABLE_NAME="raw_data"
 
+# Parámetros de ajuste del job (sobrescribibles por entorno). Los mismos flags se pasan
+# al pipeline y se registran en el historial, para relacionar throughput y configuración
+NUM_WORKERS=${NUM_WORKERS:-7}
+MAX_NUM_WORKERS=${MAX_NUM_WORKERS:-8}
+MACHINE_TYPE=${MACHINE_TYPE:-n1-standard-16}
+DISK_SIZE_GB=${DISK_SIZE_GB:-500}
+MIN_BUNDLE_SIZE=${MIN_BUNDLE_SIZE:-1000000}
+JOB_FLAGS=(
+    --num_workers=$NUM_WORKERS
+    --max_num_workers=$MAX_NUM_WORKERS
+    --machine_type=$MACHINE_TYPE
+    --disk_size_gb=$DISK_SIZE_GB
+    --min_bundle_size=$MIN_BUNDLE_SIZE
+)
+# Flags adicionales del pipeline (ej. "--input_pattern=gs://... --key_aggregates=gs://...")
+read -r -a EXTRA_FLAGS <<< "${EXTRA_PIPELINE_ARGS:-}"
+JOB_FLAGS+=("${EXTRA_FLAGS[@]}")
+
 echo "🔧 Configuración actual:"
 echo "   📊 Proyecto: $PROJECT_ID"
 echo "   🌍 Región: $REGION (con cuota de 8 IPs)"
@@ -53,8 +72,11 @@ sed -i "s/tu-proyecto:tu-dataset.tu-tabla/$PROJECT_ID:$DATASET_NAME.$TABLE_NAME/
 sed -i "s|gs://tu-bucket/temp|$TEMP_LOCATION|g" ultra_optimized_8ips.py
 sed -i "s|gs://tu-bucket/staging|$STAGING_LOCATION|g" ultra_optimized_8ips.py
 
+# Módulos compartidos (profiling, lectores) viven en el directorio superior
+export PYTHONPATH="$(cd .. && pwd):$PYTHONPATH"
+
 echo "🚀 Ejecutando pipeline ultra-optimizado para 8 IPs..."
-echo "📊 Configuración: 7 workers, máquina n1-standard-16, disco 500GB"
+echo "📊 Configuración: ${JOB_FLAGS[*]}"
 
 # Ejecutar pipeline optimizado para 8 IPs
 python3 ultra_optimized_8ips.py \
@@ -63,17 +85,25 @@ python3 ultra_optimized_8ips.py \
     --temp_location=$TEMP_LOCATION \
     --staging_location=$STAGING_LOCATION \
     --runner=DataflowRunner \
-    --num_workers=7 \
-    --max_num_workers=8 \
-    --machine_type=n1-standard-16 \
-    --disk_size_gb=500 \
     --worker_region=$REGION \
-    --setup_file=./setup.py \
-    --save_main_session=False
+    --setup_file=../setup.py \
+    --save_main_session=False \
+    "${JOB_FLAGS[@]}"
 
 echo "✅ Pipeline completado!"
 echo "⏰ Fin: $(date)"
 
+# Registrar la ejecución en el historial y buscar regresiones de throughput
+echo "🗃️ Registrando ejecución en el historial..."
+python3 ../run_history.py record \
+    --script=run_8ips_optimized \
+    --start=$START_EPOCH \
+    --end=$(date +%s) \
+    --input_path=gs://$BUCKET_NAME/cdo_challenge.csv.gz \
+    ${METRICS_FILE:+--timeline=$METRICS_FILE} \
+    --config region=$REGION "${JOB_FLAGS[@]#--}" || true
+python3 ../run_history.py report --script=run_8ips_optimized || true
+
 # Limpiar recursos temporales
 echo "🧹 Limpiando recursos temporales..."
 gsutil -m rm -r $TEMP_LOCATION 2>/dev/null || true
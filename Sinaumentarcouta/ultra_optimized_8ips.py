@@ -14,6 +14,16 @@ import logging
 import time
 import argparse
 
+from column_sketches import ColumnProfileOptions, ComputeColumnProfile
+from compact_row import CompactRow, ReshuffleCompactRows
+from dependency_profiles import apply_profile
+from fan_out_router import FanOut, RoutingOptions, describe, load_spec
+from input_scheduler import ReadScheduledFiles, ScheduledInputOptions
+from key_aggregates import ComputeKeyAggregates, KeyAggregateOptions
+from load_checksums import ChecksumOptions, ComputeChecksums
+from local_warehouse_sink import LocalWarehouseOptions, WriteToLocalWarehouse
+from pipeline_profiler import profiled
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,10 +33,9 @@ class UltraOptimized8IPsOptions(PipelineOptions):
     
     @classmethod
     def _add_argparse_args(cls, parser):
-        parser.add_value_provider_argument('--input_file', type=str, required=True)
-        parser.add_value_provider_argument('--output_table', type=str, required=True)
-        parser.add_value_provider_argument('--temp_location', type=str, required=True)
-        parser.add_value_provider_argument('--staging_location', type=str, required=True)
+        parser.add_value_provider_argument('--input_file', type=str)
+        parser.add_value_provider_argument('--output_table', type=str)
+        # --temp_location y --staging_location ya los define GoogleCloudOptions
 
 class UltraFastCSVProcessor(beam.DoFn):
     """Procesador CSV ultra-rápido optimizado para máximo rendimiento"""
@@ -41,8 +50,8 @@ class UltraFastCSVProcessor(beam.DoFn):
         try:
             if element and element.strip():
                 self.processed_count += 1
-                # Procesamiento ultra-rápido sin validaciones
-                return [element.strip().split(self.delimiter)]
+                # Fila compacta: bytes + offsets, campos decodificados al accederlos
+                return [CompactRow.from_line(element.strip(), self.delimiter)]
             return []
         except Exception as e:
             self.error_count += 1
@@ -55,6 +64,35 @@ class UltraFastCSVProcessor(beam.DoFn):
         if self.processed_count > 0:
             logger.info(f"📊 Bundle procesado: {self.processed_count:,} líneas")
 
+@beam.ptransform_fn
+def WriteTable(rows, options, table, schema=None, write_disposition=BigQueryDisposition.WRITE_TRUNCATE):
+    """Lotes propios + sink de una tabla (almacén local o BigQuery)"""
+    batches = rows | 'BatchProcess' >> beam.BatchElements(min_batch_size=1000, max_batch_size=10000)
+    
+    local_warehouse = options.view_as(LocalWarehouseOptions).local_warehouse
+    if local_warehouse:
+        # Almacén local emulado: benchmarks end-to-end sin GCP
+        logger.info(f"💾 Cargando {table} al almacén local {local_warehouse}...")
+        return batches | 'WriteToLocalWarehouse' >> WriteToLocalWarehouse(
+            table,
+            local_warehouse,
+            schema=schema,
+            create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
+            write_disposition=write_disposition
+        )
+    
+    # Cargar a BigQuery con configuración ultra-optimizada
+    logger.info(f"💾 Cargando a BigQuery ({table}) con configuración ultra-optimizada...")
+    return batches | 'WriteToBigQuery' >> WriteToBigQuery(
+        table,
+        schema=schema,
+        create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
+        write_disposition=write_disposition,
+        ignore_unknown_values=True,
+        ignore_insert_ids=True,
+        method='STREAMING_INSERTS'  # Más rápido que batch
+    )
+
 def create_ultra_optimized_8ips_pipeline():
     """Crea pipeline ultra-optimizado para máximo 8 IPs"""
     
@@ -69,23 +107,24 @@ def create_ultra_optimized_8ips_pipeline():
     
     # Configuración ULTRA-optimizada para 8 IPs
     worker_options = options.view_as(WorkerOptions)
-    worker_options.num_workers = 7  # Usar 7 de 8 IPs disponibles
-    worker_options.max_num_workers = 8  # Máximo permitido
-    worker_options.machine_type = 'n1-standard-16'  # Máquina súper potente
-    worker_options.disk_size_gb = 500  # Disco enorme para máximo rendimiento
+    # Los flags de run_8ips_optimized.sh tienen prioridad (y son los que registra el historial)
+    worker_options.num_workers = worker_options.num_workers or 7  # Usar 7 de 8 IPs disponibles
+    worker_options.max_num_workers = worker_options.max_num_workers or 8  # Máximo permitido
+    worker_options.machine_type = worker_options.machine_type or 'n1-standard-16'  # Máquina súper potente
+    worker_options.disk_size_gb = worker_options.disk_size_gb or 500  # Disco enorme para máximo rendimiento
     worker_options.worker_region = 'us-central1'
     
     # Configuraciones adicionales para máximo rendimiento con pocos workers
-    worker_options.autoscaling_algorithm = 'THROUGHPUT_BASED'
-    worker_options.initial_num_workers = 7
+    worker_options.autoscaling_algorithm = 'THROUGHPUT_BASED'  # Arranca con num_workers = 7
     
     # Configuración de streaming ultra-optimizada
     standard_options = options.view_as(StandardOptions)
-    standard_options.runner = 'DataflowRunner'
+    standard_options.runner = standard_options.runner or 'DataflowRunner'  # --runner=DirectRunner para local
     
     # Configuraciones adicionales para velocidad extrema
     options.view_as(beam.options.pipeline_options.SetupOptions).save_main_session = False
-    options.view_as(beam.options.pipeline_options.SetupOptions).setup_file = None
+    # setup.py solo empaqueta los módulos del repo; las dependencias salen del perfil
+    apply_profile(options, 'split')
     
     return options
 
@@ -104,46 +143,66 @@ def run_ultra_optimized_8ips_pipeline():
     with beam.Pipeline(options=options) as pipeline:
         
         # Leer archivo comprimido con configuración ultra-optimizada
-        logger.info("📖 Leyendo archivo comprimido con configuración ultra-optimizada...")
-        raw_data = (
-            pipeline 
-            | 'ReadCSV' >> ReadFromText(
-                'gs://desafio-deacero-143d30a0-d8f8-4154-b7df-1773cf286d32/cdo_challenge.csv.gz',
-                compression_type='gzip',
-                strip_trailing_newlines=True,
-                # Configuraciones para velocidad extrema
-                validate=False,  # Sin validación para máxima velocidad
-                skip_header_lines=1,  # Saltar encabezado
-                min_bundle_size=1000000  # Bundles grandes para mejor rendimiento
+        input_options = options.view_as(ScheduledInputOptions)
+        if input_options.input_pattern or input_options.input_manifest:
+            # Muchos archivos: grupos balanceados por bytes, uno por worker
+            logger.info("📖 Leyendo archivos de entrada con planificación por tamaño...")
+            raw_data = pipeline | 'ReadCSV' >> ReadScheduledFiles.from_options(options, skip_header_lines=1)
+        else:
+            logger.info("📖 Leyendo archivo comprimido con configuración ultra-optimizada...")
+            raw_data = (
+                pipeline 
+                | 'ReadCSV' >> ReadFromText(
+                    'gs://desafio-deacero-143d30a0-d8f8-4154-b7df-1773cf286d32/cdo_challenge.csv.gz',
+                    compression_type='gzip',
+                    strip_trailing_newlines=True,
+                    # Configuraciones para velocidad extrema
+                    validate=False,  # Sin validación para máxima velocidad
+                    skip_header_lines=1,  # Saltar encabezado
+                    # Bundles grandes para mejor rendimiento (--min_bundle_size para comparar en el historial)
+                    min_bundle_size=1000000 if input_options.min_bundle_size is None else input_options.min_bundle_size
+                )
             )
-        )
         
         # Procesar CSV con procesador ultra-rápido
         logger.info("⚡ Procesando CSV con procesador ultra-rápido...")
-        processed_data = (
+        rows = (
             raw_data
-            | 'ProcessCSV' >> beam.ParDo(UltraFastCSVProcessor())
+            | 'ProcessCSV' >> beam.ParDo(
+                profiled(UltraFastCSVProcessor(), 'ProcessCSV', options)).with_output_types(CompactRow)
             | 'FilterEmpty' >> beam.Filter(lambda x: len(x) > 0)
-            | 'Reshuffle' >> beam.Reshuffle()  # Mejor distribución de datos
-            | 'BatchProcess' >> beam.BatchElements(min_batch_size=1000, max_batch_size=10000)
         )
         
-        # Cargar a BigQuery con configuración ultra-optimizada
-        logger.info("💾 Cargando a BigQuery con configuración ultra-optimizada...")
-        processed_data | 'WriteToBigQuery' >> WriteToBigQuery(
-            'tu-proyecto:tu-dataset.tu-tabla',  # Se actualizará automáticamente
-            schema=None,  # Auto-detect schema
-            create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
-            write_disposition=BigQueryDisposition.WRITE_TRUNCATE,
-            ignore_unknown_values=True,
-            ignore_insert_ids=True,
-            method='STREAMING_INSERTS',  # Más rápido que batch
-            # Configuraciones adicionales para máximo rendimiento
-            ignore_insufficient_shard_data=True,
-            ignore_insufficient_shard_data_for_validation=True,
-            ignore_insert_ids=True,
-            ignore_unknown_values=True
-        )
+        # Checksums calculados al vuelo para validar la carga sin re-escanear la tabla
+        checksum_manifest = options.view_as(ChecksumOptions).checksum_manifest
+        if checksum_manifest:
+            rows | 'Checksums' >> ComputeChecksums(checksum_manifest)
+        
+        # Perfil de columnas (distintos, cuantiles, top-k) sobre las mismas filas compactas
+        column_profile = options.view_as(ColumnProfileOptions).column_profile
+        if column_profile:
+            rows | 'ColumnProfile' >> ComputeColumnProfile(column_profile)
+        
+        # Agregados por clave: con 7-8 workers una clave caliente sin sal satura a uno solo
+        if options.view_as(KeyAggregateOptions).key_aggregates:
+            rows | 'KeyAggregates' >> ComputeKeyAggregates.from_options(options)
+        
+        # Las filas cruzan el shuffle ya codificadas como bytes (Reshuffle tipa sus valores como Any)
+        shuffled = rows | 'Reshuffle' >> ReshuffleCompactRows()
+        
+        routing_spec = options.view_as(RoutingOptions).routing_spec
+        if routing_spec:
+            # Varias tablas desde una sola lectura; cada ruta materializa solo sus columnas
+            routes = load_spec(routing_spec)
+            logger.info(f"🔀 Fan-out a {len(routes)} tablas:\n{describe(routes)}")
+            shuffled | 'FanOut' >> FanOut(routes, lambda route: WriteTable(
+                options, route.table, route.schema, route.write_disposition))
+        else:
+            (
+                shuffled
+                | 'Materialize' >> beam.Map(CompactRow.to_list)
+                | 'Write' >> WriteTable(options, 'tu-proyecto:tu-dataset.tu-tabla')  # Auto-detect schema
+            )
     
     end_time = time.time()
     duration = end_time - start_time
@@ -158,7 +217,8 @@ def main():
     parser.add_argument('--temp_location', help='Ubicación temporal')
     parser.add_argument('--staging_location', help='Ubicación de staging')
     
-    args = parser.parse_args()
+    # Las opciones del pipeline (p. ej. --input_pattern) las lee PipelineOptions
+    args, _ = parser.parse_known_args()
     
     # Si no se proporcionan argumentos, usar configuración por defecto
     if not args.project:
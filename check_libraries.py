@@ -15,6 +15,7 @@ REQUIRED_LIBRARIES = {
     'apache_beam': '2.48.0',
     'google.cloud.bigquery': '3.11.0',
     'google.cloud.storage': '2.10.0',
+    'google.cloud.bigquery_storage_v1': '2.27.0',  # AppendRowsRequest.ArrowData
     'pandas': '2.0.0',
     'numpy': '1.24.0',
     'pyarrow': '13.0.0',
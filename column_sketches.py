@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+📐 Perfil de Columnas con Sketches Combinables Durante la Carga
+🔢 HyperLogLog para distintos, sketch KLL para cuantiles, Misra-Gries para top-k
+🤝 Se combinan entre workers con un CombineFn (sin escaneos posteriores de la tabla)
+📝 El resultado es un artefacto JSON pequeño junto al manifiesto de checksums
+"""
+
+import argparse
+import base64
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import math
+import random
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import apache_beam as beam
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.options.pipeline_options import PipelineOptions
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 14        # 16384 registros: error relativo ~0.8%
+QUANTILE_K = 200          # Error de rango ~1% en KLL
+TOP_K = 64                # Contadores Misra-Gries por columna (se reportan los 10 mayores)
+NUMERIC_PROBE_ROWS = 100  # Sin ningún número en las primeras filas, la columna no es numérica
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+class ColumnProfileOptions(PipelineOptions):
+    """Opciones del perfil de columnas (desactivado si no se indica --column_profile)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--column_profile', default=None,
+                            help='Ruta local o gs:// del perfil de columnas (distintos, cuantiles, top-k)')
+
+def value_hash64(value: str) -> int:
+    """Hash de 64 bits estable entre workers (hash() de Python cambia por proceso)"""
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+class HyperLogLog:
+    """Conteo aproximado de distintos; la unión es el máximo registro a registro"""
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    def add(self, value: str):
+        hashed = value_hash64(value)
+        remaining_bits = 64 - self.precision
+        index = hashed >> remaining_bits
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Rango bajo: conteo lineal
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def to_text(self) -> str:
+        """Registros comprimidos para unir perfiles de cargas sucesivas"""
+        return base64.b64encode(zlib.compress(bytes(self.registers))).decode('ascii')
+
+    @classmethod
+    def from_text(cls, text: str, precision: int = HLL_PRECISION) -> 'HyperLogLog':
+        return cls(precision, bytearray(zlib.decompress(base64.b64decode(text))))
+
+class KLLSketch:
+    """
+    Sketch de cuantiles KLL: compactadores por nivel con peso 2^nivel
+
+    Al llenarse un nivel se ordena y sube uno de cada dos elementos (con
+    desplazamiento aleatorio); la capacidad decrece 2/3 por nivel inferior.
+    """
+
+    __slots__ = ('k', 'compactors', 'size', 'limit', 'count', 'min', 'max')
+
+    def __init__(self, k: int = QUANTILE_K):
+        self.k = k
+        self.compactors = [[]]
+        self.size = 0
+        self.limit = self._max_size()
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def add(self, value: float):
+        self.compactors[0].append(value)
+        self.size += 1
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.size >= self.limit:
+            self._compress()
+
+    def _compress(self):
+        while self.size >= self.limit:
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                        self.limit = self._max_size()
+                    items.sort()
+                    promoted = items[random.getrandbits(1)::2]
+                    self.compactors[level + 1].extend(promoted)
+                    self.size -= len(items) - len(promoted)
+                    items.clear()
+                    break
+
+    def merge(self, other: 'KLLSketch'):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        self.limit = self._max_size()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.size += other.size
+        self.count += other.count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def quantiles(self, fractions=QUANTILES) -> Dict[str, float]:
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.compactors) for value in items)
+        if not weighted:
+            return {}
+        total = sum(weight for _, weight in weighted)
+        results = {}
+        cumulative = 0
+        position = 0
+        for fraction in sorted(fractions):
+            target = fraction * total
+            while position < len(weighted) - 1 and cumulative + weighted[position][1] <= target:
+                cumulative += weighted[position][1]
+                position += 1
+            results[f"p{round(fraction * 100):02d}"] = weighted[position][0]
+        return results
+
+class MisraGries:
+    """
+    Valores frecuentes (heavy hitters) con hasta 2k contadores
+
+    Al superar 2k contadores se resta a todos el (k+1)-ésimo mayor y se
+    descartan los no positivos; lo restado acota el error de cada conteo.
+    """
+
+    __slots__ = ('k', 'counters', 'error')
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.counters = {}
+        self.error = 0
+
+    def add(self, value: str):
+        counters = self.counters
+        counters[value] = counters.get(value, 0) + 1
+        if len(counters) > 2 * self.k:
+            self._reduce()
+
+    def _reduce(self):
+        if len(self.counters) <= self.k:
+            return
+        threshold = sorted(self.counters.values(), reverse=True)[self.k]
+        self.error += threshold
+        self.counters = {value: count - threshold for value, count in self.counters.items() if count > threshold}
+
+    def merge(self, other: 'MisraGries'):
+        for value, count in other.counters.items():
+            self.counters[value] = self.counters.get(value, 0) + count
+        self.error += other.error
+        self._reduce()
+
+    def top(self, n: int) -> List[Dict[str, object]]:
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1], item[0]))[:n]
+        # Conteo real en [count, count + error]
+        return [{'value': value, 'count': count} for value, count in ranked]
+
+class ColumnSketch:
+    """Sketches de una columna: nulos, distintos, cuantiles numéricos y top-k"""
+
+    __slots__ = ('null_count', 'non_numeric_count', 'distinct', 'numeric', 'frequent')
+
+    def __init__(self, null_count: int = 0, precision: int = HLL_PRECISION, k: int = QUANTILE_K,
+                 top_k: int = TOP_K):
+        self.null_count = null_count
+        self.non_numeric_count = 0
+        self.distinct = HyperLogLog(precision)
+        self.numeric = KLLSketch(k)
+        self.frequent = MisraGries(top_k)
+
+    def add(self, value: str):
+        self.distinct.add(value)
+        self.frequent.add(value)
+        numeric = self.numeric
+        if numeric.count or self.non_numeric_count < NUMERIC_PROBE_ROWS:
+            try:
+                number = float(value)
+            except ValueError:
+                self.non_numeric_count += 1
+                return
+            if math.isfinite(number):
+                numeric.add(number)
+        else:
+            self.non_numeric_count += 1
+
+    def merge(self, other: 'ColumnSketch'):
+        self.null_count += other.null_count
+        self.non_numeric_count += other.non_numeric_count
+        self.distinct.merge(other.distinct)
+        self.numeric.merge(other.numeric)
+        self.frequent.merge(other.frequent)
+
+def _is_null(value) -> bool:
+    # BigQuery carga los campos CSV vacíos como NULL
+    return value is None or value == ''
+
+class ColumnSketchCombineFn(beam.CombineFn):
+    """Acumula [filas, ColumnSketch por columna]; las columnas nuevas cuentan nulos previos"""
+
+    def __init__(self, num_columns: int = 0, precision: int = HLL_PRECISION, k: int = QUANTILE_K,
+                 top_k: int = TOP_K):
+        self.num_columns = num_columns
+        self.precision = precision
+        self.k = k
+        self.top_k = top_k
+
+    def _new_sketch(self, null_count: int = 0) -> ColumnSketch:
+        return ColumnSketch(null_count, self.precision, self.k, self.top_k)
+
+    def _widen(self, accumulator, width: int):
+        sketches = accumulator[1]
+        while len(sketches) < width:
+            sketches.append(self._new_sketch(accumulator[0]))
+
+    def create_accumulator(self):
+        return [0, [self._new_sketch() for _ in range(self.num_columns)]]
+
+    def add_input(self, accumulator, row):
+        self._widen(accumulator, len(row))
+        accumulator[0] += 1
+        sketches = accumulator[1]
+        width = len(row)
+        for index, sketch in enumerate(sketches):
+            value = row[index] if index < width else None
+            if _is_null(value):
+                sketch.null_count += 1
+            else:
+                sketch.add(str(value))
+        return accumulator
+
+    def merge_accumulators(self, accumulators):
+        accumulators = list(accumulators)
+        merged = accumulators[0]
+        for accumulator in accumulators[1:]:
+            width = max(len(merged[1]), len(accumulator[1]))
+            self._widen(merged, width)
+            self._widen(accumulator, width)
+            merged[0] += accumulator[0]
+            for sketch, other in zip(merged[1], accumulator[1]):
+                sketch.merge(other)
+        return merged
+
+    def extract_output(self, accumulator):
+        return accumulator
+
+def build_profile(accumulator, column_names: List[str], top_n: int = 10) -> Dict[str, object]:
+    rows, sketches = accumulator
+    column_names = list(column_names) + [f"col_{index}" for index in range(len(column_names), len(sketches))]
+    columns = []
+    for name, sketch in zip(column_names, sketches):
+        column = {
+            'name': name,
+            'null_count': sketch.null_count,
+            'distinct_estimate': sketch.distinct.estimate(),
+            'top_values': sketch.frequent.top(top_n),
+            'top_count_error': sketch.frequent.error,
+            'numeric_count': sketch.numeric.count,
+            'hll_registers': sketch.distinct.to_text(),
+        }
+        if sketch.numeric.count:
+            column.update({'min': sketch.numeric.min, 'max': sketch.numeric.max,
+                           'quantiles': sketch.numeric.quantiles()})
+        columns.append(column)
+    return {
+        'row_count': rows,
+        'sketches': {
+            'distinct': f"hyperloglog p={sketches[0].distinct.precision if sketches else HLL_PRECISION}",
+            'distinct_relative_error': round(sketches[0].distinct.relative_error(), 4) if sketches else None,
+            'quantiles': f"kll k={sketches[0].numeric.k if sketches else QUANTILE_K}",
+            'top_values': f"misra-gries k={sketches[0].frequent.k if sketches else TOP_K}",
+        },
+        'columns': columns,
+    }
+
+def write_profile(profile: Dict[str, object], path: str):
+    with FileSystems.create(path) as f:
+        f.write(json.dumps(profile, indent=2, ensure_ascii=False).encode('utf-8'))
+    logger.info(f"📐 Perfil de columnas: {path} ({profile['row_count']:,} filas, {len(profile['columns'])} columnas)")
+
+def read_profile(path: str) -> Dict[str, object]:
+    with FileSystems.open(path) as f:
+        return json.loads(f.read().decode('utf-8'))
+
+class ComputeColumnProfile(beam.PTransform):
+    """Construye los sketches de filas (listas de valores o CompactRow) y escribe el perfil"""
+
+    def __init__(self, profile_path: str, column_names: Optional[List[str]] = None):
+        super().__init__()
+        self.profile_path = profile_path
+        self.column_names = column_names or []
+
+    def expand(self, rows):
+        column_names = self.column_names
+        profile_path = self.profile_path
+        return (
+            rows
+            | 'CombineSketches' >> beam.CombineGlobally(ColumnSketchCombineFn(len(column_names)))
+            | 'WriteProfile' >> beam.Map(lambda accumulator: write_profile(
+                build_profile(accumulator, column_names), profile_path))
+        )
+
+def _read_rows(path: str, skip_header_lines: int = 1, limit: Optional[int] = None):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8', errors='replace') as f:
+        reader = csv.reader(f)
+        for _ in range(skip_header_lines):
+            next(reader, None)
+        for count, row in enumerate(reader):
+            if limit is not None and count >= limit:
+                break
+            yield row
+
+def compare_exact(path: str, num_shards: int = 8, limit: Optional[int] = None):
+    """Construye el perfil en shards combinados (como los workers) y lo compara con valores exactos"""
+    combine_fn = ColumnSketchCombineFn()
+    rows = list(_read_rows(path, limit=limit))
+
+    start_time = time.time()
+    shards = [combine_fn.create_accumulator() for _ in range(num_shards)]
+    for index, row in enumerate(rows):
+        combine_fn.add_input(shards[index % num_shards], row)
+    sketch_seconds = time.time() - start_time
+    profile = build_profile(combine_fn.merge_accumulators(shards), [])
+
+    print(f"📁 {path}: {len(rows):,} filas en {num_shards} shards, sketches en {sketch_seconds:.2f} s "
+          f"({len(rows) / max(sketch_seconds, 1e-9):,.0f} filas/s)")
+    print(f"{'Columna':<10} {'Distintos':>10} {'Estimado':>10} {'Error':>7} {'p50 exacto':>12} {'p50':>12} "
+          f"{'Top-1 exacto':>14} {'Top-1':>14}")
+    print("-" * 97)
+    for index, column in enumerate(profile['columns']):
+        values = [row[index] for row in rows if index < len(row) and row[index] != '']
+        exact_distinct = len(set(values))
+        error = abs(column['distinct_estimate'] - exact_distinct) / max(exact_distinct, 1)
+        numbers = []
+        for value in values:
+            try:
+                numbers.append(float(value))
+            except ValueError:
+                pass
+        numbers.sort()
+        exact_median = f"{numbers[len(numbers) // 2]:.4g}" if numbers else '-'
+        median = f"{column['quantiles']['p50']:.4g}" if column.get('quantiles') else '-'
+        counts = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        exact_top = max(counts.items(), key=lambda item: (item[1], item[0]))[0] if counts else '-'
+        top = column['top_values'][0]['value'] if column['top_values'] else '-'
+        print(f"{column['name']:<10} {exact_distinct:>10,} {column['distinct_estimate']:>10,} {error:>6.1%} "
+              f"{exact_median:>12} {median:>12} {exact_top[:14]:>14} {top[:14]:>14}")
+
+def show(profile: Dict[str, object]):
+    print(f"📐 {profile['row_count']:,} filas ({profile['sketches']['distinct']}, {profile['sketches']['quantiles']}, "
+          f"{profile['sketches']['top_values']})")
+    for column in profile['columns']:
+        summary = f"   • {column['name']}: ~{column['distinct_estimate']:,} distintos, {column['null_count']:,} nulos"
+        if column.get('quantiles'):
+            quantiles = column['quantiles']
+            summary += f", p50={quantiles['p50']:.4g} p95={quantiles['p95']:.4g} p99={quantiles['p99']:.4g}"
+        if column['top_values']:
+            summary += ", top: " + ", ".join(f"{item['value']!r}×{item['count']:,}" for item in column['top_values'][:3])
+        print(summary)
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de columnas con sketches combinables")
+    parser.add_argument("profile", nargs="?", help="Perfil escrito por el pipeline (local o gs://)")
+    parser.add_argument("--compare", default=None, help="CSV local: comparar los sketches con valores exactos")
+    parser.add_argument("--rows", type=int, default=None, help="Máximo de filas a leer con --compare")
+    parser.add_argument("--shards", type=int, default=8, help="Acumuladores combinados con --compare")
+
+    args = parser.parse_args()
+    if args.compare:
+        compare_exact(args.compare, args.shards, args.rows)
+        return 0
+    if not args.profile:
+        parser.error("indica un perfil o --compare")
+    show(read_profile(args.profile))
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
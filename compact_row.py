@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+🪶 Fila Compacta Zero-Copy
+📦 Bytes crudos de la línea + arreglo de offsets de campos (__slots__, sin dict por objeto)
+🔤 Los campos se decodifican solo al accederlos
+🧬 Coder de Beam; en el Reshuffle las filas viajan ya codificadas como bytes
+"""
+
+import argparse
+import gzip
+import sys
+import time
+import tracemalloc
+from array import array
+from itertools import accumulate
+from typing import Iterator, List, Union
+
+import apache_beam as beam
+from apache_beam.coders import coders
+from apache_beam.typehints import Any
+
+_DELIMITER_CACHE = {}
+
+def _unquote(text: str) -> str:
+    """Valor de un campo que empieza con comilla, como lo entrega el módulo csv"""
+    parts = []
+    position = 1
+    while True:
+        quote = text.find('"', position)
+        if quote < 0:
+            parts.append(text[position:])
+            break
+        parts.append(text[position:quote])
+        if text.startswith('"', quote + 1):
+            parts.append('"')
+            position = quote + 2
+            continue
+        # Tras la comilla de cierre el resto del campo se toma literal
+        parts.append(text[quote + 1:])
+        break
+    return ''.join(parts)
+
+class CompactRow:
+    """
+    Fila CSV como bytes de la línea + inicio del campo siguiente de cada campo
+
+    El campo i ocupa data[stops[i-1]:stops[i] - len(delimiter)] (stops[-1] = 0).
+    """
+
+    __slots__ = ('data', 'stops', 'delimiter')
+
+    def __init__(self, data: bytes, stops: array, delimiter: bytes = b','):
+        self.data = data
+        self.stops = stops
+        self.delimiter = delimiter
+
+    @classmethod
+    def from_line(cls, line: Union[str, bytes], delimiter: Union[str, bytes] = ',') -> 'CompactRow':
+        """
+        Delimita los campos de una línea sin conservar strings
+
+        Como en el módulo csv, una comilla solo abre un campo entrecomillado al
+        inicio del campo; en cualquier otra posición es un carácter más.
+        """
+        data = line.encode('utf-8') if isinstance(line, str) else bytes(line)
+        separator = _DELIMITER_CACHE.get(delimiter)
+        if separator is None:
+            separator = delimiter.encode('utf-8') if isinstance(delimiter, str) else bytes(delimiter)
+            _DELIMITER_CACHE[delimiter] = separator
+        width = len(separator)
+        typecode = 'H' if len(data) + width <= 0xFFFF else 'I'
+
+        if b'"' not in data:
+            return cls(data, array(typecode, accumulate(len(part) + width for part in data.split(separator))),
+                       separator)
+
+        stops = []
+        position = 0
+        while True:
+            search = position
+            if data.startswith(b'"', position):
+                # Campo entrecomillado: "" es una comilla escapada
+                closing = position
+                while True:
+                    closing = data.find(b'"', closing + 1)
+                    if closing < 0 or not data.startswith(b'"', closing + 1):
+                        break
+                    closing += 1
+                if closing < 0:
+                    break
+                search = closing + 1
+            end = data.find(separator, search)
+            if end < 0:
+                break
+            position = end + width
+            stops.append(position)
+        stops.append(len(data) + width)
+        return cls(data, array(typecode, stops), separator)
+
+    def __len__(self) -> int:
+        return len(self.stops)
+
+    def _field(self, index: int) -> str:
+        start = self.stops[index - 1] if index else 0
+        end = self.stops[index] - len(self.delimiter)
+        if end > start and self.data[start] == 0x22:
+            return _unquote(self.data[start:end].decode('utf-8', errors='replace'))
+        return self.data[start:end].decode('utf-8', errors='replace')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._field(position) for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("índice de campo fuera de rango")
+        return self._field(index)
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self._field(index)
+
+    def to_list(self) -> List[str]:
+        """Materializa la fila como lista de strings (p. ej. antes del sink)"""
+        return [self._field(index) for index in range(len(self))]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CompactRow) and self.data == other.data and self.delimiter == other.delimiter
+
+    def __hash__(self) -> int:
+        return hash(self.data)
+
+    def __repr__(self) -> str:
+        return f"CompactRow({self.to_list()!r})"
+
+    def __reduce__(self):
+        return CompactRow, (self.data, self.stops, self.delimiter)
+
+class CompactRowCoder(coders.Coder):
+    """
+    Serializa CompactRow como [longitud del delimitador][delimitador][bytes de la línea]
+
+    Los offsets no viajan: se recalculan al decodificar. Ojo: beam.Reshuffle
+    declara sus valores como Any y usa el coder genérico, que pickles cualquier
+    objeto propio; para que el shuffle lleve solo estos bytes hay que usar
+    ReshuffleCompactRows.
+    """
+
+    def encode(self, row: CompactRow) -> bytes:
+        return bytes((len(row.delimiter),)) + row.delimiter + row.data
+
+    def decode(self, encoded: bytes) -> CompactRow:
+        width = encoded[0]
+        return CompactRow.from_line(encoded[1 + width:], encoded[1:1 + width])
+
+    def is_deterministic(self) -> bool:
+        return True
+
+    def to_type_hint(self):
+        return CompactRow
+
+beam.coders.registry.register_coder(CompactRow, CompactRowCoder)
+
+class ReshuffleCompactRows(beam.PTransform):
+    """Reshuffle de CompactRow que codifica a bytes antes y decodifica después"""
+
+    def expand(self, rows):
+        coder = CompactRowCoder()
+        return (
+            rows
+            | 'EncodeRows' >> beam.Map(coder.encode).with_output_types(bytes)
+            | 'Reshuffle' >> beam.Reshuffle()
+            | 'DecodeRows' >> beam.Map(coder.decode).with_output_types(CompactRow)
+        )
+
+def shuffle_coder() -> coders.Coder:
+    """Coder de los valores dentro de beam.Reshuffle (ReshufflePerKey los tipa como Any)"""
+    return beam.coders.registry.get_coder(Any)
+
+def _load_lines(path: str, limit: int) -> List[str]:
+    opener = gzip.open if path.endswith('.gz') else open
+    lines = []
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            lines.append(line.rstrip('\r\n'))
+            if len(lines) >= limit:
+                break
+    return lines
+
+def benchmark(path: str, num_rows: int = 100000, delimiter: str = ','):
+    """
+    Compara memoria por fila y bytes de shuffle: lista de str vs CompactRow
+
+    Los bytes de shuffle se miden con el coder que usa beam.Reshuffle para los
+    valores (shuffle_coder), no con CompactRowCoder directamente: 'CompactRow'
+    es la fila pasada tal cual a Reshuffle y 'CompactRow (bytes)' la fila
+    codificada antes, como hace ReshuffleCompactRows.
+    """
+    lines = _load_lines(path, num_rows)
+    print(f"📁 {path}: {len(lines):,} filas")
+
+    value_coder = shuffle_coder()
+    row_coder = CompactRowCoder()
+    results = {}
+    for name, build, to_shuffle in (
+            ('list[str]', lambda line: line.split(delimiter), lambda row: row),
+            ('CompactRow', lambda line: CompactRow.from_line(line, delimiter), lambda row: row),
+            ('CompactRow (bytes)', lambda line: CompactRow.from_line(line, delimiter), row_coder.encode)):
+        start_time = time.time()
+        rows = [build(line) for line in lines]
+        build_seconds = time.time() - start_time
+        del rows
+
+        # Segunda construcción solo para medir memoria (tracemalloc ralentiza)
+        tracemalloc.start()
+        rows = [build(line) for line in lines]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        shuffle_bytes = sum(len(value_coder.encode(to_shuffle(row))) for row in rows)
+        results[name] = (memory / max(len(rows), 1), shuffle_bytes / max(len(rows), 1), build_seconds)
+        del rows
+
+    print(f"{'Tipo':<20} {'Memoria/fila (B)':>17} {'Shuffle/fila (B)':>17} {'Construcción (s)':>17}")
+    print("-" * 74)
+    for name, (memory, shuffle, seconds) in results.items():
+        print(f"{name:<20} {memory:>17,.0f} {shuffle:>17,.0f} {seconds:>17.2f}")
+
+    list_memory, list_shuffle, _ = results['list[str]']
+    compact_memory, _, _ = results['CompactRow']
+    pickled_shuffle = results['CompactRow'][1]
+    encoded_shuffle = results['CompactRow (bytes)'][1]
+    print(f"🪶 Memoria {list_memory / compact_memory:.1f}x menor; shuffle frente a list[str]: "
+          f"{list_shuffle / encoded_shuffle:.2f}x con ReshuffleCompactRows, "
+          f"{list_shuffle / pickled_shuffle:.2f}x pasando CompactRow directo a Reshuffle")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de CompactRow frente a listas de strings")
+    parser.add_argument("path", help="Archivo CSV local (puede estar comprimido con gzip)")
+    parser.add_argument("--rows", type=int, default=100000, help="Filas a cargar")
+    parser.add_argument("--delimiter", default=",", help="Delimitador del CSV")
+
+    args = parser.parse_args()
+    benchmark(args.path, args.rows, args.delimiter)
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
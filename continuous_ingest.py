@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+🔄 Ingesta Continua con Micro-Lotes
+👀 Vigila un prefijo gs:// (o un directorio local) y detecta archivos nuevos
+📦 Agrupa archivos en micro-lotes por tamaño o tiempo y los agrega con WRITE_APPEND
+🧾 Registro at-most-once por archivo en SQLite
+⏱️ Expone latencia llegada→consultable y throughput sostenido
+"""
+
+import argparse
+import csv
+import fnmatch
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+DEFAULT_LEDGER_PATH = os.environ.get('INGEST_LEDGER_DB', os.path.expanduser('~/.ultra_fast_loader/ingest_ledger.db'))
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    arrived_at REAL NOT NULL,
+    claimed_at REAL NOT NULL,
+    loaded_at REAL,
+    batch_id INTEGER NOT NULL,
+    rows INTEGER,
+    status TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ingested_loaded ON ingested_files(loaded_at);
+"""
+
+# Archivo detectado: (ruta, tamaño en bytes, llegada en epoch)
+FileEntry = Tuple[str, int, float]
+
+class LocalDirectoryLister:
+    """Lista archivos de un directorio local (sustituto de un prefijo GCS para pruebas)"""
+
+    def __init__(self, root_dir: str, pattern: str = '*', min_age_seconds: float = 2.0):
+        self.root_dir = root_dir
+        self.pattern = pattern
+        # Archivos modificados hace menos de min_age_seconds pueden estar escribiéndose
+        self.min_age_seconds = min_age_seconds
+
+    def list_files(self) -> List[FileEntry]:
+        now = time.time()
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for filename in filenames:
+                if not fnmatch.fnmatch(filename, self.pattern):
+                    continue
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                if now - stat.st_mtime >= self.min_age_seconds:
+                    entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+class GCSLister:
+    """Lista objetos bajo un prefijo gs:// (los objetos aparecen ya completos)"""
+
+    def __init__(self, prefix: str, pattern: str = '*'):
+        from google.cloud import storage
+
+        bucket_name, _, self.prefix = prefix[len('gs://'):].partition('/')
+        self.client = storage.Client()
+        self.bucket_name = bucket_name
+        self.pattern = pattern
+
+    def list_files(self) -> List[FileEntry]:
+        entries = []
+        for blob in self.client.list_blobs(self.bucket_name, prefix=self.prefix):
+            if blob.name.endswith('/') or not fnmatch.fnmatch(os.path.basename(blob.name), self.pattern):
+                continue
+            entries.append((f"gs://{self.bucket_name}/{blob.name}", blob.size, blob.time_created.timestamp()))
+        return sorted(entries, key=lambda entry: entry[2])
+
+class IngestLedger:
+    """Registro de archivos reclamados/cargados; un archivo reclamado nunca se vuelve a cargar"""
+
+    def __init__(self, db_path: str = DEFAULT_LEDGER_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(LEDGER_SCHEMA)
+
+    def known_paths(self) -> set:
+        return {row['path'] for row in self.connection.execute("SELECT path FROM ingested_files")}
+
+    def next_batch_id(self) -> int:
+        row = self.connection.execute("SELECT COALESCE(MAX(batch_id), 0) + 1 AS next_id FROM ingested_files").fetchone()
+        return row['next_id']
+
+    def claim(self, batch_id: int, files: List[FileEntry]) -> List[FileEntry]:
+        """Reclama los archivos antes de cargarlos (at-most-once); devuelve los reclamados"""
+        claimed = []
+        now = time.time()
+        with self.connection:
+            for path, size, arrived_at in files:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO ingested_files (path, size, arrived_at, claimed_at, batch_id, status) "
+                    "VALUES (?, ?, ?, ?, ?, 'CLAIMED')", (path, size, arrived_at, now, batch_id))
+                if cursor.rowcount:
+                    claimed.append((path, size, arrived_at))
+        return claimed
+
+    def mark_loaded(self, batch_id: int, rows_by_path: Dict[str, Optional[int]], loaded_at: float):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE ingested_files SET status = 'LOADED', loaded_at = ?, rows = ? WHERE path = ? AND batch_id = ?",
+                [(loaded_at, rows, path, batch_id) for path, rows in rows_by_path.items()])
+
+    def mark_failed(self, batch_id: int, error: str):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE ingested_files SET status = 'FAILED', error = ? WHERE batch_id = ? AND status = 'CLAIMED'",
+                (error[:1000], batch_id))
+
+    def metrics(self, window_seconds: float = 3600.0) -> Dict[str, float]:
+        """Latencia llegada→consultable y throughput de la ventana reciente"""
+        since = time.time() - window_seconds
+        rows = self.connection.execute(
+            "SELECT size, rows, arrived_at, claimed_at, loaded_at FROM ingested_files "
+            "WHERE status = 'LOADED' AND loaded_at >= ? ORDER BY loaded_at", (since,)).fetchall()
+        failed = self.connection.execute(
+            "SELECT COUNT(*) AS failed FROM ingested_files WHERE status = 'FAILED' AND claimed_at >= ?",
+            (since,)).fetchone()['failed']
+        if not rows:
+            return {'files': 0, 'failed_files': failed}
+
+        latencies = sorted(row['loaded_at'] - row['arrived_at'] for row in rows)
+        total_bytes = sum(row['size'] for row in rows)
+        total_rows = sum(row['rows'] or 0 for row in rows)
+        span = max(rows[-1]['loaded_at'] - min(row['claimed_at'] for row in rows), 1e-9)
+        return {
+            'files': len(rows),
+            'failed_files': failed,
+            'bytes': total_bytes,
+            'rows': total_rows,
+            'latency_p50_seconds': statistics.median(latencies),
+            'latency_p95_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'latency_max_seconds': latencies[-1],
+            'mb_per_second': total_bytes / MB / span,
+            'rows_per_second': total_rows / span,
+        }
+
+class MicroBatcher:
+    """Acumula archivos y decide cuándo cerrar un micro-lote (tamaño, cantidad o espera)"""
+
+    def __init__(self, max_bytes: int = 1024 * MB, max_files: int = 500, max_wait_seconds: float = 60.0):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_wait_seconds = max_wait_seconds
+        self.pending: List[FileEntry] = []
+        self._first_seen: Optional[float] = None
+
+    def add(self, files: List[FileEntry]):
+        if files and not self.pending:
+            self._first_seen = time.time()
+        self.pending.extend(files)
+
+    def pending_bytes(self) -> int:
+        return sum(size for _, size, _ in self.pending)
+
+    def ready(self, force: bool = False) -> bool:
+        if not self.pending:
+            return False
+        return (force or self.pending_bytes() >= self.max_bytes or len(self.pending) >= self.max_files
+                or time.time() - self._first_seen >= self.max_wait_seconds)
+
+    def take(self) -> List[FileEntry]:
+        """Extrae un lote respetando max_bytes/max_files (al menos un archivo)"""
+        batch, total = [], 0
+        while self.pending and len(batch) < self.max_files:
+            size = self.pending[0][1]
+            if batch and total + size > self.max_bytes:
+                break
+            batch.append(self.pending.pop(0))
+            total += size
+        self._first_seen = time.time() if self.pending else None
+        return batch
+
+class BigQueryAppendSink:
+    """Job de carga WRITE_APPEND desde URIs gs:// (sin coste de ingesta y el más rápido para archivos)"""
+
+    def __init__(self, table: str, schema: Optional[str] = None, skip_header_lines: int = 1):
+        from google.cloud import bigquery
+
+        self.bigquery = bigquery
+        self.client = bigquery.Client()
+        self.table = table.replace(':', '.')
+        self.schema = schema
+        self.skip_header_lines = skip_header_lines
+
+    def load(self, paths: List[str]) -> Dict[str, Optional[int]]:
+        if any(not path.startswith('gs://') for path in paths):
+            raise ValueError("El sink de BigQuery solo admite archivos gs://")
+
+        job_config = self.bigquery.LoadJobConfig(
+            source_format=self.bigquery.SourceFormat.CSV,
+            write_disposition=self.bigquery.WriteDisposition.WRITE_APPEND,
+            create_disposition=self.bigquery.CreateDisposition.CREATE_IF_NEEDED,
+            skip_leading_rows=self.skip_header_lines,
+            allow_quoted_newlines=True,
+            allow_jagged_rows=True,
+            ignore_unknown_values=True,
+        )
+        if self.schema:
+            job_config.schema = [self.bigquery.SchemaField(*field.split(':', 1)) for field in self.schema.split(',')]
+        else:
+            job_config.autodetect = True
+
+        job = self.client.load_table_from_uri(paths, self.table, job_config=job_config)
+        job.result()
+        # El job reporta filas totales, no por archivo
+        rows_by_path = {path: None for path in paths}
+        rows_by_path[paths[0]] = job.output_rows
+        return rows_by_path
+
+class SQLiteAppendSink:
+    """Tabla SQLite local como destino consultable (sustituto de BigQuery para pruebas)"""
+
+    def __init__(self, db_path: str, table: str = 'raw_data', skip_header_lines: int = 1):
+        self.connection = sqlite3.connect(db_path)
+        self.table = table
+        self.skip_header_lines = skip_header_lines
+        self.columns: Optional[List[str]] = None
+
+    def _ensure_table(self, header: List[str]):
+        existing = [row[1] for row in self.connection.execute(f'PRAGMA table_info("{self.table}")')]
+        if existing:
+            self.columns = existing
+            return
+        self.columns = [name.strip() or f"col_{index}" for index, name in enumerate(header)]
+        columns_sql = ', '.join(f'"{name}" TEXT' for name in self.columns)
+        self.connection.execute(f'CREATE TABLE "{self.table}" ({columns_sql})')
+
+    def _read_rows(self, path: str) -> List[List[str]]:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', newline='', encoding='utf-8', errors='replace') as f:
+            return list(csv.reader(f))
+
+    def load(self, paths: List[str]) -> Dict[str, Optional[int]]:
+        rows_by_path = {}
+        # Un lote = una transacción: o se agregan todos sus archivos o ninguno
+        with self.connection:
+            for path in paths:
+                rows = self._read_rows(path)
+                header = rows[:self.skip_header_lines]
+                data = [row for row in rows[self.skip_header_lines:] if row]
+                if not data:
+                    # Archivo vacío o solo encabezado: 0 filas, sin tumbar al resto del lote
+                    rows_by_path[path] = 0
+                    continue
+                if self.columns is None:
+                    self._ensure_table(header[0] if header else [f"col_{index}" for index in range(len(data[0]))])
+                width = len(self.columns)
+                placeholders = ', '.join('?' * width)
+                self.connection.executemany(
+                    f'INSERT INTO "{self.table}" VALUES ({placeholders})',
+                    ((row + [None] * width)[:width] for row in data))
+                rows_by_path[path] = len(data)
+        return rows_by_path
+
+def make_lister(source: str, pattern: str):
+    return GCSLister(source, pattern) if source.startswith('gs://') else LocalDirectoryLister(source, pattern)
+
+def make_sink(destination: str, skip_header_lines: int = 1, schema: Optional[str] = None):
+    """Elige el sink: 'proyecto:dataset.tabla' → carga BigQuery, 'ruta.db[:tabla]' → SQLite local"""
+    if destination.endswith('.db'):
+        return SQLiteAppendSink(destination, 'raw_data', skip_header_lines)
+    if '.db:' in destination:
+        db_path, _, table = destination.rpartition(':')
+        return SQLiteAppendSink(db_path, table, skip_header_lines)
+    return BigQueryAppendSink(destination, schema, skip_header_lines)
+
+def process_batch(ledger: IngestLedger, sink, files: List[FileEntry]) -> Optional[int]:
+    """Reclama, carga y registra un micro-lote; devuelve el id del lote"""
+    batch_id = ledger.next_batch_id()
+    claimed = ledger.claim(batch_id, files)
+    if not claimed:
+        return None
+
+    batch_bytes = sum(size for _, size, _ in claimed)
+    start_time = time.time()
+    try:
+        rows_by_path = sink.load([path for path, _, _ in claimed])
+    except Exception as e:
+        # At-most-once: los archivos quedan FAILED y no se reintentan automáticamente
+        ledger.mark_failed(batch_id, str(e))
+        logger.error(f"❌ Lote {batch_id} falló ({len(claimed)} archivos): {e}")
+        return batch_id
+
+    loaded_at = time.time()
+    ledger.mark_loaded(batch_id, rows_by_path, loaded_at)
+    duration = max(loaded_at - start_time, 1e-9)
+    oldest = min(arrived_at for _, _, arrived_at in claimed)
+    logger.info(f"📦 Lote {batch_id}: {len(claimed)} archivos, {batch_bytes / MB:.1f} MB en {duration:.2f} s "
+                f"({batch_bytes / MB / duration:.1f} MB/s), latencia máx {loaded_at - oldest:.1f} s")
+    return batch_id
+
+def write_metrics(ledger: IngestLedger, metrics_file: Optional[str], window_seconds: float) -> Dict[str, float]:
+    metrics = ledger.metrics(window_seconds)
+    metrics['updated_at'] = time.time()
+    if metrics_file:
+        tmp_path = metrics_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(metrics, f, indent=2)
+        os.replace(tmp_path, metrics_file)
+    return metrics
+
+def watch(lister, ledger: IngestLedger, sink, batcher: MicroBatcher, poll_seconds: float = 10.0,
+          once: bool = False, metrics_file: Optional[str] = None, metrics_window_seconds: float = 3600.0):
+    """Bucle de vigilancia; con once=True carga lo pendiente y termina"""
+    queued = set()
+    while True:
+        known = ledger.known_paths()
+        new_files = [entry for entry in lister.list_files() if entry[0] not in known and entry[0] not in queued]
+        if new_files:
+            logger.info(f"👀 {len(new_files)} archivos nuevos ({sum(size for _, size, _ in new_files) / MB:.1f} MB)")
+            batcher.add(new_files)
+            queued.update(path for path, _, _ in new_files)
+
+        processed = False
+        while batcher.ready(force=once):
+            batch = batcher.take()
+            queued.difference_update(path for path, _, _ in batch)
+            process_batch(ledger, sink, batch)
+            processed = True
+
+        if processed:
+            metrics = write_metrics(ledger, metrics_file, metrics_window_seconds)
+            if metrics['files']:
+                logger.info(f"📊 Última hora: {metrics['files']} archivos, {metrics['mb_per_second']:.1f} MB/s, "
+                            f"latencia p50 {metrics['latency_p50_seconds']:.1f} s, "
+                            f"p95 {metrics['latency_p95_seconds']:.1f} s")
+
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta continua de archivos nuevos en micro-lotes")
+    parser.add_argument("--source", required=True, help="Prefijo gs://bucket/ruta o directorio local a vigilar")
+    parser.add_argument("--destination", required=True,
+                        help="Tabla proyecto:dataset.tabla o base SQLite local ruta.db[:tabla]")
+    parser.add_argument("--schema", default=None, help="Esquema campo:TIPO,... (por defecto auto-detect)")
+    parser.add_argument("--pattern", default="*.csv*", help="Patrón de nombres de archivo")
+    parser.add_argument("--max_batch_mb", type=float, default=1024, help="Tamaño máximo de un micro-lote")
+    parser.add_argument("--max_batch_files", type=int, default=500, help="Archivos máximos por micro-lote")
+    parser.add_argument("--max_wait_seconds", type=float, default=60, help="Espera máxima antes de cerrar un lote")
+    parser.add_argument("--poll_seconds", type=float, default=10, help="Intervalo entre listados")
+    parser.add_argument("--skip_header_lines", type=int, default=1, help="Líneas de encabezado por archivo")
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH, help="Base SQLite del registro de archivos")
+    parser.add_argument("--metrics_file", default=None, help="JSON con latencia y throughput actualizados")
+    parser.add_argument("--once", action="store_true", help="Cargar lo pendiente y terminar")
+
+    args = parser.parse_args()
+
+    lister = make_lister(args.source, args.pattern)
+    ledger = IngestLedger(args.ledger)
+    sink = make_sink(args.destination, args.skip_header_lines, args.schema)
+    batcher = MicroBatcher(int(args.max_batch_mb * MB), args.max_batch_files, args.max_wait_seconds)
+
+    print(f"👀 Vigilando {args.source} ({args.pattern}) → {args.destination}")
+    print(f"📦 Micro-lotes: {args.max_batch_mb:.0f} MB / {args.max_batch_files} archivos / {args.max_wait_seconds:.0f} s")
+
+    try:
+        watch(lister, ledger, sink, batcher, args.poll_seconds, args.once, args.metrics_file)
+    except KeyboardInterrupt:
+        print("\n⏹️  Ingesta detenida")
+
+    metrics = ledger.metrics()
+    if metrics['files']:
+        print(f"✅ {metrics['files']} archivos cargados en la última hora, {metrics['rows']:,} filas")
+        print(f"⏱️  Latencia llegada→consultable: p50 {metrics['latency_p50_seconds']:.1f} s, "
+              f"p95 {metrics['latency_p95_seconds']:.1f} s")
+        print(f"🚀 Throughput sostenido: {metrics['mb_per_second']:.1f} MB/s ({metrics['rows_per_second']:,.0f} filas/s)")
+    if metrics['failed_files']:
+        print(f"⚠️  {metrics['failed_files']} archivos fallidos (no se reintentan)")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+📦 Perfiles de Dependencias para Arranque Rápido de Workers
+🎯 Cada modo del pipeline declara solo lo que importa (nada de pandas en los workers)
+🧳 Wheelhouse offline: los workers instalan sin resolver ni consultar PyPI
+⏱️ Tiempo de instalación de cada perfil medible en local
+"""
+
+import argparse
+import ast
+import logging
+import os
+import re
+import site
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import time
+from typing import Dict, List, Optional, Set
+
+try:
+    from apache_beam.options.pipeline_options import PipelineOptions
+except ImportError:  # setup.py importa este módulo al construir el sdist, donde Beam puede no estar
+    PipelineOptions = object
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SETUP_FILE = os.path.join(ROOT, 'setup.py')
+DEFAULT_WHEELHOUSE = os.path.join(ROOT, 'wheelhouse')
+
+# Plataforma del contenedor por defecto del SDK de Beam en Dataflow
+WORKER_PLATFORM = 'manylinux2014_x86_64'
+
+BEAM_REQUIREMENT = 'apache-beam[gcp]==2.48.0'
+
+# Importaciones que ya trae el contenedor del SDK (apache-beam[gcp] y sus dependencias)
+SDK_PROVIDED_IMPORTS = ('apache_beam', 'google.api_core', 'google.cloud.bigquery', 'google.cloud.storage', 'pyarrow',
+                        'numpy', 'requests')
+
+# Importación → distribución que hay que instalar en el worker
+IMPORT_DISTRIBUTIONS = {
+    'google.cloud.bigquery_storage_v1': 'google-cloud-bigquery-storage',
+    'pandas': 'pandas',
+    'fastparquet': 'fastparquet',
+}
+
+PROFILES = {
+    'split': {
+        'description': 'Parseo con split/CompactRow y WriteToBigQuery (solo el contenedor del SDK)',
+        'modules': ['ultra_fast_loader', 'Sinaumentarcouta/ultra_optimized_8ips'],
+        'requirements': [],
+    },
+    'arrow': {
+        'description': 'Lotes Arrow hacia la Storage Write API',
+        'modules': ['storage_write_sink'],
+        # pyarrow lo aporta Beam 2.48 (<12): fijar 13.0.0 rompe la resolución
+        'requirements': ['google-cloud-bigquery-storage>=2.27.0'],
+    },
+}
+
+# Herramientas locales (análisis, verificación); nunca se instalan en los workers
+LOCAL_REQUIREMENTS = ['pandas==2.1.1', 'numpy==1.24.3', 'fastparquet==2023.10.1']
+
+class DependencyProfileOptions(PipelineOptions):
+    """Perfil de dependencias del job y wheelhouse desde el que instalan los workers"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--dependency_profile', default=None, choices=sorted(PROFILES),
+                            help='Perfil de dependencias de los workers (por defecto el del pipeline)')
+        parser.add_argument('--wheelhouse', default=DEFAULT_WHEELHOUSE,
+                            help='Directorio generado con "dependency_profiles.py build"')
+
+def extras_require() -> Dict[str, List[str]]:
+    """Extras de setup.py: un extra por perfil más 'local'"""
+    extras = {name: list(profile['requirements']) for name, profile in PROFILES.items()}
+    extras['local'] = list(LOCAL_REQUIREMENTS)
+    return extras
+
+def normalize(name: str) -> str:
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def requirement_name(requirement: str) -> str:
+    return normalize(re.split(r'[\[<>=!~; ]', requirement, maxsplit=1)[0])
+
+def requirements_path(wheelhouse: str, profile: str) -> str:
+    return os.path.join(wheelhouse, f'requirements-{profile}.txt')
+
+def apply_profile(options, default_profile: str) -> str:
+    """
+    Configura el staging de dependencias del job según el perfil
+
+    setup.py solo empaqueta los módulos del repositorio (sin dependencias
+    pesadas); si existe el lock del perfil en el wheelhouse, los workers
+    instalan esas ruedas con --no-index en lugar de resolver contra PyPI.
+    """
+    from apache_beam.options.pipeline_options import SetupOptions
+
+    profile_options = options.view_as(DependencyProfileOptions)
+    profile = profile_options.dependency_profile or default_profile
+    setup_options = options.view_as(SetupOptions)
+    setup_options.setup_file = setup_options.setup_file or SETUP_FILE
+
+    lock_path = requirements_path(profile_options.wheelhouse, profile)
+    if os.path.exists(lock_path):
+        setup_options.requirements_file = lock_path
+        setup_options.requirements_cache = os.path.join(profile_options.wheelhouse, profile)
+        logger.info(f"📦 Perfil '{profile}': ruedas desde {setup_options.requirements_cache}")
+    elif PROFILES[profile]['requirements']:
+        logger.warning(f"⚠️ Perfil '{profile}' sin wheelhouse: ejecuta "
+                       f"'python3 dependency_profiles.py build --profile {profile}'")
+    return profile
+
+def _stdlib_modules() -> frozenset:
+    """Módulos de la librería estándar: sys.stdlib_module_names (3.10+) o el directorio stdlib"""
+    if hasattr(sys, 'stdlib_module_names'):
+        return frozenset(sys.stdlib_module_names)
+    stdlib = sysconfig.get_paths()['stdlib']
+    names = set(sys.builtin_module_names)
+    for directory in (stdlib, os.path.join(stdlib, 'lib-dynload')):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.listdir(directory):
+            name = entry.split('.')[0]
+            if name.isidentifier() and (entry.endswith(('.py', '.so', '.pyd'))
+                                        or os.path.isfile(os.path.join(directory, entry, '__init__.py'))):
+                names.add(name)
+    return frozenset(names)
+
+STDLIB_MODULES = _stdlib_modules()
+
+def _module_path(module: str) -> Optional[str]:
+    for candidate in (os.path.join(ROOT, f'{module}.py'), os.path.join(ROOT, 'Sinaumentarcouta', f'{module}.py')):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def third_party_imports(module: str) -> Set[str]:
+    """Importaciones de terceros de un módulo y de los módulos locales que importa"""
+    found = set()
+    pending = [module]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        path = _module_path(os.path.basename(current))
+        if path is None or path in seen:
+            continue
+        seen.add(path)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [f'{node.module}.{alias.name}' for alias in node.names]
+            else:
+                continue
+            for name in names:
+                top = name.split('.')[0]
+                if _module_path(top):
+                    pending.append(top)
+                elif top not in STDLIB_MODULES:
+                    found.add(name)
+    return found
+
+def _matches(name: str, prefix: str) -> bool:
+    return name == prefix or name.startswith(prefix + '.')
+
+def required_distributions(module: str) -> Dict[str, List[str]]:
+    """Distribuciones a instalar en el worker → importaciones que las requieren"""
+    required = {}
+    for name in sorted(third_party_imports(module)):
+        distribution = next((dist for prefix, dist in IMPORT_DISTRIBUTIONS.items() if _matches(name, prefix)), None)
+        if distribution is None:
+            if any(_matches(name, prefix) for prefix in SDK_PROVIDED_IMPORTS):
+                continue
+            distribution = name.split('.')[0]
+        required.setdefault(normalize(distribution), []).append(name)
+    return required
+
+def check() -> bool:
+    """Verifica que cada perfil declare exactamente lo que importan sus módulos"""
+    ok = True
+    for name, profile in PROFILES.items():
+        required = {}
+        for module in profile['modules']:
+            required.update(required_distributions(module))
+        declared = {requirement_name(requirement) for requirement in profile['requirements']}
+        missing = sorted(set(required) - declared)
+        unused = sorted(declared - set(required))
+        status = '✅' if not missing else '❌'
+        print(f"{status} {name}: requiere {sorted(required) or 'solo el contenedor del SDK'}")
+        for distribution in missing:
+            print(f"   ❌ falta {distribution} (importado como {', '.join(required[distribution])})")
+        for distribution in unused:
+            print(f"   ⚠️ {distribution} declarado pero no importado")
+        ok = ok and not missing
+    return ok
+
+def installed_pins(python: str = sys.executable) -> Dict[str, str]:
+    """Versiones instaladas (pip freeze) de un intérprete"""
+    output = subprocess.run([python, '-m', 'pip', 'freeze', '--disable-pip-version-check'],
+                            check=True, capture_output=True, text=True).stdout
+    return read_pins(output.splitlines())
+
+def read_pins(lines) -> Dict[str, str]:
+    pins = {}
+    for line in lines:
+        name, separator, version = line.strip().partition('==')
+        if separator and not name.startswith(('-', '#')):
+            pins[requirement_name(name)] = version.split(';')[0].strip()
+    return pins
+
+def _wheel_pin(filename: str):
+    # nombre-versión(-build)?-python-abi-plataforma.whl
+    name, version = filename.split('-')[:2]
+    return normalize(name), version
+
+def build(profile: str, wheelhouse: str = DEFAULT_WHEELHOUSE, platform: Optional[str] = WORKER_PLATFORM,
+          python_version: Optional[str] = None, base_constraints: Optional[str] = None) -> Dict[str, str]:
+    """
+    Descarga las ruedas del perfil y escribe su lock (nombre==versión)
+
+    Las versiones se restringen a las del contenedor del SDK (base_constraints,
+    p. ej. 'pip freeze' de la imagen apache/beam_python3.11_sdk:2.48.0; por
+    defecto el entorno actual) y las ruedas que el contenedor ya trae se
+    descartan: el lock solo contiene lo que el worker realmente instala.
+    """
+    requirements = PROFILES[profile]['requirements']
+    target = os.path.join(wheelhouse, profile)
+    os.makedirs(target, exist_ok=True)
+    if base_constraints:
+        with open(base_constraints, encoding='utf-8') as f:
+            base = read_pins(f)
+    else:
+        base = installed_pins()
+
+    lock = {}
+    if requirements:
+        # Los paquetes del perfil eligen versión libremente; el resto queda fijado al contenedor
+        requested = {requirement_name(requirement) for requirement in requirements}
+        constraints = {name: version for name, version in base.items() if name not in requested}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            constraints_path = os.path.join(temp_dir, 'constraints.txt')
+            with open(constraints_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(f'{name}=={version}\n' for name, version in sorted(constraints.items())))
+            command = [sys.executable, '-m', 'pip', 'download', '--disable-pip-version-check', '-q',
+                       '--dest', target, '--constraint', constraints_path, '--only-binary=:all:', *requirements]
+            if platform:
+                command += ['--platform', platform, '--implementation', 'cp',
+                            '--python-version', python_version or f'{sys.version_info[0]}{sys.version_info[1]}']
+            subprocess.run(command, check=True)
+
+        for filename in sorted(os.listdir(target)):
+            if not filename.endswith('.whl'):
+                continue
+            name, version = _wheel_pin(filename)
+            if base.get(name) == version:
+                # Ya instalada en el contenedor: no se sube ni se reinstala
+                os.remove(os.path.join(target, filename))
+            else:
+                lock[name] = version
+
+    with open(requirements_path(wheelhouse, profile), 'w', encoding='utf-8') as f:
+        f.write(''.join(f'{name}=={version}\n' for name, version in sorted(lock.items())))
+    return lock
+
+def _directory_bytes(path: str) -> int:
+    if not os.path.isdir(path):
+        return 0
+    return sum(os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path))
+
+def measure(profile: str, wheelhouse: str = DEFAULT_WHEELHOUSE, online: bool = False) -> Dict[str, float]:
+    """
+    Mide la instalación del perfil en un entorno limpio sobre los paquetes actuales
+
+    El venv ve los paquetes del intérprete actual (como el contenedor del SDK);
+    offline instala el lock desde el wheelhouse con --no-index, online
+    instala el mismo lock desde PyPI sin caché para comparar.
+    """
+    lock_path = requirements_path(wheelhouse, profile)
+    with open(lock_path, encoding='utf-8') as f:
+        packages = sum(1 for line in f if line.strip())
+    if not packages:
+        return {'seconds': 0.0, 'packages': 0, 'megabytes': 0.0}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        venv_dir = os.path.join(temp_dir, 'venv')
+        subprocess.run([sys.executable, '-m', 'venv', venv_dir], check=True)
+        python = os.path.join(venv_dir, 'bin', 'python')
+        purelib = subprocess.run([python, '-c', 'import sysconfig; print(sysconfig.get_paths()["purelib"])'],
+                                 check=True, capture_output=True, text=True).stdout.strip()
+        with open(os.path.join(purelib, 'sdk_base.pth'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(site.getsitepackages()) + '\n')
+
+        command = [python, '-m', 'pip', 'install', '--disable-pip-version-check', '-q']
+        if online:
+            command += ['--no-cache-dir', '-r', lock_path]
+        else:
+            command += ['--no-index', '--find-links', os.path.join(wheelhouse, profile), '-r', lock_path]
+
+        start_time = time.perf_counter()
+        subprocess.run(command, check=True)
+        seconds = time.perf_counter() - start_time
+
+    return {
+        'seconds': seconds,
+        'packages': packages,
+        'megabytes': _directory_bytes(os.path.join(wheelhouse, profile)) / 1024 / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfiles de dependencias y wheelhouse offline para los workers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("profiles", help="Listar perfiles y sus dependencias")
+    subparsers.add_parser("check", help="Verificar que los perfiles cubren las importaciones de sus módulos")
+
+    build_parser = subparsers.add_parser("build", help="Descargar las ruedas y escribir el lock de un perfil")
+    build_parser.add_argument("--profile", default="all", choices=sorted(PROFILES) + ["all"])
+    build_parser.add_argument("--wheelhouse", default=DEFAULT_WHEELHOUSE)
+    build_parser.add_argument("--local", action="store_true",
+                              help="Ruedas para esta máquina (para medir) en lugar de la del worker")
+    build_parser.add_argument("--python_version", default=None, help="Versión de Python del worker, p. ej. 311")
+    build_parser.add_argument("--base_constraints", default=None,
+                              help="pip freeze del contenedor del SDK (por defecto el entorno actual)")
+
+    measure_parser = subparsers.add_parser("measure", help="Medir la instalación offline de cada perfil")
+    measure_parser.add_argument("--profile", default="all", choices=sorted(PROFILES) + ["all"])
+    measure_parser.add_argument("--wheelhouse", default=DEFAULT_WHEELHOUSE)
+    measure_parser.add_argument("--online", action="store_true", help="Comparar también con instalar desde PyPI")
+
+    args = parser.parse_args()
+
+    if args.command == "profiles":
+        for name, profile in PROFILES.items():
+            print(f"📦 {name}: {profile['description']}")
+            print(f"   Módulos: {', '.join(profile['modules'])}")
+            print(f"   Dependencias extra: {', '.join(profile['requirements']) or 'ninguna'}")
+        return 0
+
+    if args.command == "check":
+        return 0 if check() else 1
+
+    profiles = sorted(PROFILES) if args.profile == "all" else [args.profile]
+
+    if args.command == "build":
+        for profile in profiles:
+            lock = build(profile, args.wheelhouse, None if args.local else WORKER_PLATFORM,
+                         args.python_version, args.base_constraints)
+            print(f"✅ {profile}: {len(lock)} ruedas → {requirements_path(args.wheelhouse, profile)}")
+        print(f"💡 Uso: --dependency_profile=<perfil> --wheelhouse={args.wheelhouse}")
+        return 0
+
+    print(f"{'Perfil':<10} {'Paquetes':>9} {'MB':>8} {'Offline (s)':>12} {'PyPI (s)':>10}")
+    print("-" * 53)
+    for profile in profiles:
+        if not os.path.exists(requirements_path(args.wheelhouse, profile)):
+            print(f"{profile:<10} sin wheelhouse (ejecuta build --local)")
+            continue
+        offline = measure(profile, args.wheelhouse)
+        online = f"{measure(profile, args.wheelhouse, online=True)['seconds']:>10.1f}" if args.online else f"{'-':>10}"
+        print(f"{profile:<10} {offline['packages']:>9} {offline['megabytes']:>8.1f} {offline['seconds']:>12.1f} {online}")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
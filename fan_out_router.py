@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+🔀 Fan-Out en una Sola Pasada hacia Varias Tablas
+📜 Especificación de rutas en JSON: filtro por columna, proyección y limpieza
+🏷️ Un único ParDo con salidas etiquetadas (TaggedOutput) por ruta
+📦 Cada ruta escribe con su propio sink y sus propios lotes
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+from typing import Callable, List, Optional
+
+import apache_beam as beam
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.pvalue import TaggedOutput
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROUTE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+class RoutingOptions(PipelineOptions):
+    """Opciones de fan-out (sin --routing_spec se escribe una sola tabla)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--routing_spec', default=None,
+                            help='JSON local o gs:// con las rutas de salida (ver fan_out_router.py)')
+
+class Route:
+    """Una ruta: tabla destino, filtro opcional, proyección y limpieza"""
+
+    def __init__(self, spec: dict, header: Optional[List[str]] = None):
+        self.name = spec['name']
+        if not ROUTE_NAME_PATTERN.match(self.name):
+            raise ValueError(f"Nombre de ruta inválido '{self.name}' (solo letras, dígitos y _)")
+        self.table = spec['table']
+        self.schema = spec.get('schema')
+        self.write_disposition = spec.get('write_disposition', 'WRITE_TRUNCATE')
+        self.strip = spec.get('strip', False)
+        self.skip_empty = spec.get('skip_empty', False)
+
+        where = spec.get('where')
+        self.where_column = _column_index(where['column'], header) if where else None
+        self.where_values = frozenset(where['in']) if where and 'in' in where else None
+        self.where_not_empty = bool(where and where.get('not_empty'))
+        self.columns = [_column_index(column, header) for column in spec['columns']] if spec.get('columns') else None
+
+    def matches(self, row) -> bool:
+        if self.where_column is None:
+            return True
+        value = row[self.where_column] if self.where_column < len(row) else ''
+        if self.where_values is not None and value not in self.where_values:
+            return False
+        return not (self.where_not_empty and value == '')
+
+    def project(self, row) -> List[str]:
+        width = len(row)
+        values = [row[index] if index < width else '' for index in self.columns] if self.columns else list(row)
+        if self.strip:
+            values = [value.strip() for value in values]
+        return values
+
+def _column_index(column, header: Optional[List[str]]) -> int:
+    """Columna por posición (int) o por nombre del encabezado de la especificación"""
+    if isinstance(column, int):
+        return column
+    if not header or column not in header:
+        raise ValueError(f"Columna '{column}' no encontrada en el encabezado de la especificación")
+    return header.index(column)
+
+def load_spec(path: str) -> List[Route]:
+    """
+    Lee la especificación de rutas
+
+    {"header": ["id", "pais", ...],
+     "routes": [{"name": "raw", "table": "p:ds.raw"},
+                {"name": "mx", "table": "p:ds.mx", "where": {"column": "pais", "in": ["MX"]},
+                 "columns": ["id", "monto"], "strip": true, "schema": "id:INTEGER,monto:FLOAT"}]}
+    """
+    with FileSystems.open(path) as f:
+        spec = json.loads(f.read().decode('utf-8'))
+    routes = [Route(route, spec.get('header')) for route in spec['routes']]
+    names = [route.name for route in routes]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nombres de ruta duplicados: {names}")
+    # Varias rutas a una misma tabla solo pueden anexar: con WRITE_TRUNCATE/WRITE_EMPTY
+    # cada sink vaciaría o rechazaría lo que escribió la otra ruta
+    by_table = {}
+    for route in routes:
+        by_table.setdefault(route.table.replace(':', '.'), []).append(route)
+    for table, shared in by_table.items():
+        if len(shared) > 1 and any(route.write_disposition != 'WRITE_APPEND' for route in shared):
+            raise ValueError(f"Las rutas {[route.name for route in shared]} escriben en {table}: "
+                             f"todas deben usar write_disposition WRITE_APPEND")
+    return routes
+
+class RouteRowsFn(beam.DoFn):
+    """Emite cada fila a todas las rutas que la aceptan (una fila puede ir a varias tablas)"""
+
+    def __init__(self, routes: List[Route]):
+        self.routes = routes
+        self.routed = {route.name: Metrics.counter('fan_out', f'rows_{route.name}') for route in routes}
+        self.unrouted = Metrics.counter('fan_out', 'rows_unrouted')
+
+    def process(self, row):
+        matched = False
+        for route in self.routes:
+            if not route.matches(row):
+                continue
+            values = route.project(row)
+            if route.skip_empty and all(value == '' for value in values):
+                continue
+            matched = True
+            self.routed[route.name].inc()
+            yield TaggedOutput(route.name, values)
+        if not matched:
+            self.unrouted.inc()
+
+class FanOut(beam.PTransform):
+    """Reparte las filas parseadas una sola vez entre varias rutas, cada una con su sink"""
+
+    def __init__(self, routes: List[Route], sink_factory: Callable[[Route], beam.PTransform]):
+        super().__init__()
+        self.routes = routes
+        self.sink_factory = sink_factory
+
+    def expand(self, rows):
+        names = [route.name for route in self.routes]
+        outputs = rows | 'RouteRows' >> beam.ParDo(RouteRowsFn(self.routes)).with_outputs(*names)
+        results = {}
+        for route in self.routes:
+            results[route.name] = outputs[route.name] | f'Write_{route.name}' >> self.sink_factory(route)
+        return results
+
+def describe(routes: List[Route]) -> str:
+    lines = []
+    for route in routes:
+        condition = 'todas las filas'
+        if route.where_column is not None:
+            condition = f"columna {route.where_column}"
+            if route.where_values is not None:
+                condition += f" ∈ {sorted(route.where_values)}"
+            if route.where_not_empty:
+                condition += " no vacía"
+        projection = f"columnas {route.columns}" if route.columns else 'todas las columnas'
+        lines.append(f"   • {route.name} → {route.table}: {condition}, {projection}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Valida y muestra una especificación de fan-out")
+    parser.add_argument("spec", help="JSON local o gs:// con las rutas")
+
+    args = parser.parse_args()
+    routes = load_spec(args.spec)
+    print(f"🔀 {len(routes)} rutas desde una sola lectura:")
+    print(describe(routes))
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+🧠 Caché Persistente de Esquema y Perfil de Entrada
+🔑 Clave: tamaño + generación/etag + hash del encabezado del archivo
+📋 Guarda esquema inferido, estadísticas por columna, estimación de filas y límites de shards
+♻️ Se invalida automáticamente cuando cambia el objeto de origen
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get('INPUT_PROFILE_CACHE', os.path.expanduser('~/.ultra_fast_loader/profile_cache'))
+SAMPLE_BYTES = 8 * 1024 * 1024  # Prefijo (comprimido) leído para inferir el perfil
+HEADER_BYTES = 64 * 1024  # Prefijo leído para la huella (solo encabezado)
+
+def _read_prefix(path: str, num_bytes: int) -> Tuple[bytes, Dict[str, object]]:
+    """Lee los primeros bytes crudos del archivo y sus metadatos de versión"""
+    if path.startswith('gs://'):
+        from google.cloud import storage
+
+        bucket_name, _, blob_name = path[len('gs://'):].partition('/')
+        blob = storage.Client().bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(path)
+        end = min(num_bytes, blob.size) - 1
+        data = blob.download_as_bytes(start=0, end=end, raw_download=True) if end >= 0 else b''
+        return data, {'size': blob.size, 'generation': str(blob.generation), 'etag': blob.etag}
+
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read(num_bytes)
+    return data, {'size': stat.st_size, 'generation': str(stat.st_mtime_ns), 'etag': None}
+
+def _decompress_prefix(path: str, data: bytes) -> bytes:
+    """Descomprime un prefijo gzip sin necesitar el archivo completo"""
+    if not (path.endswith('.gz') or data[:2] == b'\x1f\x8b'):
+        return data
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        return decompressor.decompress(data)
+    except zlib.error:
+        return b''
+
+def fingerprint(path: str) -> Dict[str, object]:
+    """Huella del origen: tamaño, generación/etag y hash del encabezado"""
+    raw, metadata = _read_prefix(path, HEADER_BYTES)
+    text = _decompress_prefix(path, raw)
+    header = text.split(b'\n', 1)[0]
+    metadata['header_hash'] = hashlib.sha256(header).hexdigest()
+    return metadata
+
+def _column_name(name: str, index: int) -> str:
+    """Nombre de columna válido para BigQuery"""
+    cleaned = re.sub(r'[^0-9a-zA-Z_]', '_', name.strip())
+    if not cleaned or cleaned[0].isdigit():
+        cleaned = f"col_{index}_{cleaned}".rstrip('_')
+    return cleaned
+
+def _value_type(value: str) -> str:
+    """Tipo más específico compatible con un valor"""
+    lowered = value.lower()
+    if lowered in ('true', 'false'):
+        return 'BOOLEAN'
+    try:
+        int(value)
+        return 'INTEGER'
+    except ValueError:
+        pass
+    try:
+        float(value)
+        return 'FLOAT'
+    except ValueError:
+        return 'STRING'
+
+def _merge_types(current: Optional[str], new: str) -> str:
+    if current is None or current == new:
+        return new
+    if {current, new} == {'INTEGER', 'FLOAT'}:
+        return 'FLOAT'
+    return 'STRING'
+
+def infer_profile(path: str, raw_prefix: bytes, total_size: int, delimiter: str = ',') -> Dict[str, object]:
+    """Infiere esquema, estadísticas por columna y filas estimadas a partir de un prefijo"""
+    text = _decompress_prefix(path, raw_prefix)
+    complete = len(raw_prefix) >= total_size
+    if not complete:
+        # Se descarta la última línea (probablemente truncada)
+        text = text[:text.rfind(b'\n') + 1]
+
+    rows = list(csv.reader(io.StringIO(text.decode('utf-8', errors='replace')), delimiter=delimiter))
+    if not rows:
+        return {'schema': None, 'columns': [], 'row_count_estimate': 0}
+
+    header, sample = rows[0], rows[1:]
+    names = [_column_name(name, index) for index, name in enumerate(header)]
+    types = [None] * len(names)
+    nulls = [0] * len(names)
+    max_lengths = [0] * len(names)
+    for row in sample:
+        for index in range(len(names)):
+            value = row[index] if index < len(row) else ''
+            if value == '':
+                nulls[index] += 1
+                continue
+            types[index] = _merge_types(types[index], _value_type(value))
+            max_lengths[index] = max(max_lengths[index], len(value))
+
+    types = [column_type or 'STRING' for column_type in types]
+    sample_count = max(len(sample), 1)
+    columns = [{'name': name, 'type': column_type, 'null_fraction': nulls[index] / sample_count,
+                'max_length': max_lengths[index]}
+               for index, (name, column_type) in enumerate(zip(names, types))]
+
+    # Filas por byte del prefijo (comprimido si aplica) extrapoladas al tamaño total
+    if complete:
+        row_count_estimate = len(sample)
+    else:
+        row_count_estimate = int(len(sample) * total_size / max(len(raw_prefix), 1))
+
+    return {
+        'schema': ','.join(f"{column['name']}:{column['type']}" for column in columns),
+        'columns': columns,
+        'sample_rows': len(sample),
+        'row_count_estimate': row_count_estimate,
+    }
+
+class InputProfileCache:
+    """Caché en disco de perfiles de entrada indexada por ruta y validada por huella"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, path: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(path.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    def _load(self, path: str) -> Optional[dict]:
+        entry_path = self._entry_path(path)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, path: str, entry: dict):
+        entry_path = self._entry_path(path)
+        tmp_path = entry_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp_path, entry_path)
+
+    def invalidate(self, path: str):
+        entry_path = self._entry_path(path)
+        if os.path.exists(entry_path):
+            os.remove(entry_path)
+
+    def lookup(self, path: str, current: Optional[Dict[str, object]] = None) -> Optional[dict]:
+        """Devuelve la entrada si la huella coincide; si no, la elimina"""
+        entry = self._load(path)
+        if entry is None:
+            return None
+        current = current or fingerprint(path)
+        if entry.get('fingerprint') != current:
+            logger.info(f"♻️ El origen cambió, se invalida el perfil en caché: {path}")
+            self.invalidate(path)
+            return None
+        return entry
+
+    def get_or_build_profile(self, path: str, delimiter: str = ',') -> Tuple[dict, bool]:
+        """Devuelve (perfil, acierto_de_caché), infiriendo y guardando si no hay acierto"""
+        metadata = fingerprint(path)
+        entry = self.lookup(path, metadata)
+        if entry is not None:
+            return entry['profile'], True
+
+        start_time = time.time()
+        raw, _ = _read_prefix(path, SAMPLE_BYTES)
+        profile = infer_profile(path, raw, metadata['size'], delimiter)
+        profile['inferred_at'] = time.time()
+        profile['inference_seconds'] = time.time() - start_time
+        profile['shard_boundaries'] = {}
+        self._save(path, {'path': path, 'fingerprint': metadata, 'profile': profile})
+        return profile, False
+
+    def get_shard_boundaries(self, path: str, key: str) -> Optional[List[List[int]]]:
+        """Límites de shards guardados para una configuración (p. ej. '8:1:quote')"""
+        entry = self.lookup(path)
+        if entry is None:
+            return None
+        return entry['profile'].get('shard_boundaries', {}).get(key)
+
+    def store_shard_boundaries(self, path: str, key: str, boundaries: List[Tuple[int, int]]):
+        """Guarda límites de shards en la entrada vigente (crea el perfil si no existe)"""
+        self.get_or_build_profile(path)
+        entry = self._load(path)
+        entry['profile'].setdefault('shard_boundaries', {})[key] = [list(bounds) for bounds in boundaries]
+        self._save(path, entry)
+
+def cached_schema(path: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Optional[str]:
+    """Esquema 'campo:TIPO,...' del origen, o None para recurrir a auto-detect"""
+    try:
+        profile, hit = InputProfileCache(cache_dir).get_or_build_profile(path)
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudo obtener el perfil de {path}: {e}")
+        return None
+    logger.info(f"🧠 Esquema {'desde caché' if hit else 'inferido y guardado'}: {path}")
+    return profile.get('schema')
+
+def main():
+    parser = argparse.ArgumentParser(description="Caché de esquema y perfil de archivos de entrada")
+    parser.add_argument("path", help="Archivo local o gs://bucket/objeto")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="Directorio de la caché")
+    parser.add_argument("--delimiter", default=",", help="Delimitador del CSV")
+    parser.add_argument("--invalidate", action="store_true", help="Eliminar la entrada en caché")
+
+    args = parser.parse_args()
+    cache = InputProfileCache(args.cache_dir)
+
+    if args.invalidate:
+        cache.invalidate(args.path)
+        print(f"🗑️ Entrada eliminada: {args.path}")
+        return 0
+
+    start_time = time.time()
+    profile, hit = cache.get_or_build_profile(args.path, args.delimiter)
+    print(f"{'✅ Acierto de caché' if hit else '🧠 Perfil inferido'} en {time.time() - start_time:.2f} segundos")
+    print(f"📋 Esquema: {profile['schema']}")
+    print(f"📊 Filas estimadas: {profile['row_count_estimate']:,}")
+    for column in profile['columns']:
+        print(f"   {column['name']:<30} {column['type']:<8} nulos {column['null_fraction']:.1%}")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
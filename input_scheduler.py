@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+🗂️ Entrada Multi-Archivo con Planificación por Tamaño
+🔍 Descubre archivos por glob o manifiesto con el tamaño de cada uno
+⚖️ Reparte el trabajo mayor-primero (LPT) o en grupos balanceados por bytes
+⏱️ Compara el makespan contra una asignación ingenua (round-robin)
+🧺 En el pipeline cada grupo planificado se lee completo tras un GroupByKey por grupo
+"""
+
+import argparse
+import heapq
+import logging
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import apache_beam as beam
+from apache_beam.io.filesystem import CompressionTypes
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.io.range_trackers import OffsetRangeTracker
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import PipelineOptions, WorkerOptions
+
+from quoted_csv_source import QuotedCSVSource
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Unidad de trabajo: (ruta, inicio, fin) en bytes; fin=None lee el archivo completo
+WorkItem = Tuple[str, int, Optional[int]]
+
+class ScheduledInputOptions(PipelineOptions):
+    """Opciones de entrada multi-archivo (sin ellas se usa el archivo único de siempre)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--input_pattern', default=None,
+                            help='Glob de archivos de entrada (local o gs://)')
+        parser.add_argument('--input_manifest', default=None,
+                            help='Archivo con una ruta por línea (opcionalmente "ruta,tamaño")')
+        parser.add_argument('--input_groups', type=int, default=0,
+                            help='Grupos de trabajo (0 = uno por worker)')
+        parser.add_argument('--input_schedule', default='balanced', choices=['lpt', 'balanced', 'naive'],
+                            help='Estrategia de reparto de archivos')
+        parser.add_argument('--min_bundle_size', type=int, default=None,
+                            help='Tamaño mínimo de bundle al leer el archivo único en bytes (por defecto el del loader)')
+
+def _is_compressed(path: str) -> bool:
+    return CompressionTypes.detect_compression_type(path) != CompressionTypes.UNCOMPRESSED
+
+def read_manifest(manifest_path: str) -> List[Tuple[str, Optional[int]]]:
+    """Lee un manifiesto 'ruta[,tamaño]' por línea (ignora vacías y comentarios #)"""
+    entries = []
+    with FileSystems.open(manifest_path, compression_type=CompressionTypes.UNCOMPRESSED) as f:
+        for raw_line in f.read().decode('utf-8').splitlines():
+            line = raw_line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path, _, size = line.partition(',')
+            entries.append((path.strip(), int(size) if size.strip() else None))
+    return entries
+
+def discover_files(pattern: Optional[str] = None, manifest: Optional[str] = None) -> List[Tuple[str, int]]:
+    """Lista [(ruta, tamaño)] desde un glob y/o un manifiesto, en orden de descubrimiento"""
+    files = []
+    if pattern:
+        for match in FileSystems.match([pattern])[0].metadata_list:
+            files.append((match.path, match.size_in_bytes))
+    if manifest:
+        entries = read_manifest(manifest)
+        missing = [path for path, size in entries if size is None]
+        sizes = {}
+        if missing:
+            for result in FileSystems.match(missing):
+                for match in result.metadata_list:
+                    sizes[match.path] = match.size_in_bytes
+        for path, size in entries:
+            files.append((path, size if size is not None else sizes[path]))
+    return files
+
+def split_large_files(files: List[Tuple[str, int]], target_bytes: int) -> List[Tuple[WorkItem, int]]:
+    """Divide archivos sin comprimir mayores que target_bytes en rangos de bytes"""
+    items = []
+    for path, size in files:
+        if size <= target_bytes or _is_compressed(path):
+            items.append(((path, 0, None), size))
+            continue
+        pieces = -(-size // target_bytes)
+        step = -(-size // pieces)
+        for start in range(0, size, step):
+            end = min(start + step, size)
+            items.append(((path, start, end), end - start))
+    return items
+
+def schedule_naive(files: List[Tuple[str, int]], num_groups: int) -> List[List[Tuple[WorkItem, int]]]:
+    """Asignación ingenua: archivos completos en round-robin según el orden del glob"""
+    groups = [[] for _ in range(num_groups)]
+    for index, (path, size) in enumerate(files):
+        groups[index % num_groups].append(((path, 0, None), size))
+    return groups
+
+def schedule_lpt(items: List[Tuple[WorkItem, int]], num_groups: int) -> List[List[Tuple[WorkItem, int]]]:
+    """Longest Processing Time: cada unidad, de mayor a menor, al grupo menos cargado"""
+    groups = [[] for _ in range(num_groups)]
+    heap = [(0, index) for index in range(num_groups)]
+    for item, size in sorted(items, key=lambda entry: entry[1], reverse=True):
+        load, index = heapq.heappop(heap)
+        groups[index].append((item, size))
+        heapq.heappush(heap, (load + size, index))
+    return groups
+
+def schedule_files(files: List[Tuple[str, int]], num_groups: int,
+                   strategy: str = 'balanced') -> List[List[Tuple[WorkItem, int]]]:
+    """
+    Reparte archivos en num_groups grupos según la estrategia
+
+    'lpt' asigna archivos completos de mayor a menor; 'balanced' además divide
+    los archivos sin comprimir mayores que la carga media en rangos de bytes,
+    de modo que ningún archivo grande quede como cola al final.
+    """
+    num_groups = max(1, num_groups)
+    if strategy == 'naive':
+        return schedule_naive(files, num_groups)
+    if strategy == 'lpt':
+        return schedule_lpt([((path, 0, None), size) for path, size in files], num_groups)
+    target = max(1, -(-sum(size for _, size in files) // num_groups))
+    return schedule_lpt(split_large_files(files, target), num_groups)
+
+def makespan(groups: List[List[Tuple[WorkItem, int]]]) -> Dict[str, float]:
+    """Bytes del grupo más cargado y desbalance (máximo / media)"""
+    loads = [sum(size for _, size in group) for group in groups]
+    mean = sum(loads) / max(len(loads), 1)
+    return {
+        'max_bytes': max(loads) if loads else 0,
+        'mean_bytes': mean,
+        'imbalance': (max(loads) / mean) if mean else 1.0,
+    }
+
+def scheduled_source(path: str, skip_header_lines: int = 0) -> QuotedCSVSource:
+    """Fuente de un archivo que emite registros completos (respeta saltos de línea entre comillas)"""
+    return QuotedCSVSource(path, skip_header_lines=skip_header_lines, validate=False, raw_records=True)
+
+def read_work_item(item: WorkItem, skip_header_lines: int = 0) -> Iterator[str]:
+    """Lee los registros de una unidad de trabajo (los que empiezan en [inicio, fin))"""
+    path, start, end = item
+    tracker = OffsetRangeTracker(start, OffsetRangeTracker.OFFSET_INFINITY if end is None else end)
+    yield from scheduled_source(path, skip_header_lines).read_records(path, tracker)
+
+def keyed_work_items(groups: List[List[Tuple[WorkItem, int]]]) -> List[Tuple[int, Tuple[WorkItem, int]]]:
+    """[(grupo, (unidad, bytes))]: la clave del GroupByKey es el grupo planificado"""
+    return [(index, entry) for index, group in enumerate(groups) for entry in group]
+
+class _ReadGroupFn(beam.DoFn):
+    """Lee todas las unidades de un grupo, de mayor a menor (el orden del plan LPT)"""
+
+    def __init__(self, skip_header_lines: int = 0):
+        self.skip_header_lines = skip_header_lines
+        self.groups_read = Metrics.counter('input_scheduler', 'groups_read')
+        self.bytes_scheduled = Metrics.distribution('input_scheduler', 'group_bytes')
+
+    def process(self, element):
+        _, entries = element
+        # GroupByKey no conserva el orden: se restablece el mayor-primero del plan
+        entries = sorted(entries, key=lambda entry: entry[1], reverse=True)
+        self.groups_read.inc()
+        self.bytes_scheduled.update(sum(size for _, size in entries))
+        for item, _ in entries:
+            yield from read_work_item(item, self.skip_header_lines)
+
+class ReadScheduledFiles(beam.PTransform):
+    """
+    Lee muchos archivos aplicando el plan por tamaño
+
+    schedule_files reparte las unidades (archivos completos, o rangos de bytes
+    de los archivos grandes sin comprimir con 'balanced') en num_groups grupos;
+    cada unidad se emite con su grupo como clave y, tras el GroupByKey, un
+    grupo se lee completo en un solo elemento: la carga por grupo es la del
+    plan y el makespan estimado se cumple. Los .gz se colocan enteros según
+    su tamaño. Dentro de un grupo no hay división dinámica.
+    """
+
+    def __init__(self, pattern: Optional[str] = None, manifest: Optional[str] = None,
+                 num_groups: int = 8, strategy: str = 'balanced', skip_header_lines: int = 0):
+        super().__init__()
+        self.pattern = pattern
+        self.manifest = manifest
+        self.num_groups = num_groups
+        self.strategy = strategy
+        self.skip_header_lines = skip_header_lines
+
+    @classmethod
+    def from_options(cls, options: PipelineOptions, skip_header_lines: int = 0) -> 'ReadScheduledFiles':
+        input_options = options.view_as(ScheduledInputOptions)
+        worker_options = options.view_as(WorkerOptions)
+        num_groups = input_options.input_groups or worker_options.max_num_workers or worker_options.num_workers or 1
+        return cls(input_options.input_pattern, input_options.input_manifest, num_groups,
+                   input_options.input_schedule, skip_header_lines)
+
+    def expand(self, pbegin):
+        files = discover_files(self.pattern, self.manifest)
+        if not files:
+            raise ValueError(f"No se encontraron archivos de entrada: {self.pattern or self.manifest}")
+        groups = schedule_files(files, self.num_groups, self.strategy)
+        stats = makespan(groups)
+        logger.info(f"🗂️ {len(files)} archivos en {len(groups)} grupos ({self.strategy}): "
+                    f"mayor {stats['max_bytes'] / MB:,.1f} MB, desbalance {stats['imbalance']:.2f}x")
+
+        return (
+            pbegin
+            | 'CreateWorkItems' >> beam.Create(keyed_work_items(groups), reshuffle=False)
+            | 'GroupBySchedule' >> beam.GroupByKey()
+            | 'ReadGroups' >> beam.ParDo(_ReadGroupFn(self.skip_header_lines))
+        )
+
+def _measure_group(args) -> Tuple[float, int]:
+    """Lee un grupo completo y devuelve (segundos, líneas)"""
+    items, skip_header_lines = args
+    start_time = time.time()
+    lines = 0
+    for item in items:
+        for _ in read_work_item(item, skip_header_lines):
+            lines += 1
+    return time.time() - start_time, lines
+
+def benchmark(files: List[Tuple[str, int]], num_groups: int, worker_mb_per_second: float,
+              measure: bool = False, skip_header_lines: int = 0):
+    """Compara el makespan de cada estrategia contra la asignación ingenua"""
+    total = sum(size for _, size in files)
+    print(f"🗂️ {len(files)} archivos, {total / MB:,.1f} MB, {num_groups} grupos")
+    print(f"{'Estrategia':<12} {'Mayor (MB)':>12} {'Desbalance':>11} {'Estimado (s)':>13} "
+          f"{'Medido (s)':>11} {'vs ingenuo':>11}")
+    print("-" * 75)
+
+    baseline = None
+    for strategy in ('naive', 'lpt', 'balanced'):
+        groups = schedule_files(files, num_groups, strategy)
+        stats = makespan(groups)
+        estimated = stats['max_bytes'] / MB / worker_mb_per_second
+        measured = None
+        if measure:
+            work = [([item for item, _ in group], skip_header_lines) for group in groups]
+            start_time = time.time()
+            with Pool(processes=len(work)) as pool:
+                pool.map(_measure_group, work)
+            measured = time.time() - start_time
+
+        value = measured if measured is not None else estimated
+        if baseline is None:
+            baseline = value
+        print(f"{strategy:<12} {stats['max_bytes'] / MB:>12,.1f} {stats['imbalance']:>10.2f}x {estimated:>13.1f} "
+              f"{(f'{measured:.2f}' if measured is not None else 'N/A'):>11} {baseline / max(value, 1e-9):>10.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Planificación de entrada multi-archivo por tamaño")
+    parser.add_argument("--input_pattern", default=None, help="Glob de archivos (local o gs://)")
+    parser.add_argument("--input_manifest", default=None, help="Manifiesto con una ruta por línea")
+    parser.add_argument("--groups", type=int, default=8, help="Número de grupos/workers")
+    parser.add_argument("--worker_mb_per_second", type=float, default=50.0,
+                        help="Throughput estimado por worker para el makespan estimado")
+    parser.add_argument("--measure", action="store_true", help="Leer los grupos en paralelo y medir (solo local)")
+    parser.add_argument("--skip_header_lines", type=int, default=0, help="Líneas de encabezado por archivo")
+
+    args = parser.parse_args()
+    if not args.input_pattern and not args.input_manifest:
+        parser.error("Se requiere --input_pattern o --input_manifest")
+
+    files = discover_files(args.input_pattern, args.input_manifest)
+    if not files:
+        print("❌ No se encontraron archivos")
+        return 1
+
+    benchmark(files, args.groups, args.worker_mb_per_second, args.measure, args.skip_header_lines)
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
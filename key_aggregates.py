@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+🔑 Agregados por Clave Durante la Carga, Resistentes al Sesgo
+🎯 Muestreo de frecuencias (Misra-Gries) para detectar claves calientes
+🧂 Claves calientes repartidas en sub-claves (salting) y combinadas en dos fases
+⚖️ Reporte de la carga por worker antes y después del salting
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import math
+import random
+import sys
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import apache_beam as beam
+from apache_beam.io import ReadFromText, WriteToText
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import PipelineOptions, WorkerOptions
+
+from column_sketches import MisraGries
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 0.01
+MAX_FANOUT_PER_WORKER = 4
+# Apariciones mínimas de una clave en la muestra: con menos, su parte es ruido de muestreo
+MIN_HOT_KEY_SAMPLES = 20
+BUCKET_MODEL = 'crc32(clave) % workers (modelo; no es la asignación real de rangos de claves de Dataflow)'
+
+class KeyAggregateOptions(PipelineOptions):
+    """Opciones de agregados por clave (desactivados si no se indica --key_aggregates)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--key_aggregates', default=None,
+                            help='Prefijo local o gs:// de los agregados por clave (CSV) y su reporte')
+        parser.add_argument('--aggregate_key', default='0',
+                            help='Columna clave (posición o nombre del esquema)')
+        parser.add_argument('--aggregate_values', default='',
+                            help='Columnas a sumar por clave, separadas por comas')
+        parser.add_argument('--key_sample_rate', type=float, default=DEFAULT_SAMPLE_RATE,
+                            help='Fracción de filas muestreadas para detectar claves calientes')
+
+def column_index(column: str, column_names: List[str]) -> int:
+    """Columna por posición ('3') o por nombre del esquema"""
+    if column.isdigit():
+        return int(column)
+    if column not in column_names:
+        raise ValueError(f"Columna '{column}' no está en el esquema")
+    return column_names.index(column)
+
+def key_bucket(key, num_workers: int) -> int:
+    """
+    Worker que se modela para la clave (hash estable, módulo workers)
+
+    Dataflow reparte rangos de claves codificadas y los reequilibra en
+    ejecución; este módulo solo aproxima el reparto para comparar el
+    desbalance antes y después del salting.
+    """
+    return zlib.crc32(repr(key).encode('utf-8')) % num_workers
+
+def fanout_for_share(share: float, num_workers: int) -> int:
+    """Sub-claves para que ninguna supere la mitad de la carga media de un worker"""
+    return min(max(math.ceil(share * 2 * num_workers), 2), MAX_FANOUT_PER_WORKER * num_workers)
+
+class _KeyVectorFn(beam.DoFn):
+    """Fila → (clave, [filas, suma_1, ..., suma_n])"""
+
+    def __init__(self, key_index: int, value_indexes: List[int]):
+        self.key_index = key_index
+        self.value_indexes = value_indexes
+        self.non_numeric = Metrics.counter('key_aggregates', 'non_numeric_values')
+
+    def process(self, row):
+        width = len(row)
+        key = row[self.key_index] if self.key_index < width else ''
+        # Todo float: Beam infiere el coder del vector y uno de enteros truncaría las sumas
+        vector = [1.0]
+        for index in self.value_indexes:
+            value = row[index] if index < width else ''
+            try:
+                vector.append(float(value))
+            except ValueError:
+                self.non_numeric.inc()
+                vector.append(0.0)
+        yield key, vector
+
+class SumVectorsFn(beam.CombineFn):
+    """Suma vectores [filas, sumas...]; sirve para ambas fases (filas y parciales)"""
+
+    def create_accumulator(self):
+        return None
+
+    def add_input(self, accumulator, vector):
+        if accumulator is None:
+            return list(vector)
+        for index, value in enumerate(vector):
+            accumulator[index] += value
+        return accumulator
+
+    def merge_accumulators(self, accumulators):
+        merged = None
+        for accumulator in accumulators:
+            if accumulator is not None:
+                merged = self.add_input(merged, accumulator)
+        return merged
+
+    def extract_output(self, accumulator):
+        return accumulator
+
+class HotKeysCombineFn(beam.CombineFn):
+    """
+    Frecuencias de una muestra de claves → {clave caliente: sub-claves}
+
+    Una clave es caliente con al menos 1/(2·workers) de la muestra y
+    min_samples apariciones; con una muestra menor que min_samples/umbral
+    ninguna clave puede distinguirse del ruido y no se aplica sal.
+    """
+
+    def __init__(self, num_workers: int, min_samples: int = MIN_HOT_KEY_SAMPLES):
+        self.num_workers = num_workers
+        self.min_samples = min_samples
+
+    def create_accumulator(self):
+        # Con 8 contadores por worker toda clave con >1/(2·workers) de la muestra queda registrada
+        return [0, MisraGries(8 * self.num_workers)]
+
+    def add_input(self, accumulator, key):
+        accumulator[0] += 1
+        accumulator[1].add(key)
+        return accumulator
+
+    def merge_accumulators(self, accumulators):
+        accumulators = list(accumulators)
+        merged = accumulators[0]
+        for accumulator in accumulators[1:]:
+            merged[0] += accumulator[0]
+            merged[1].merge(accumulator[1])
+        return merged
+
+    def extract_output(self, accumulator):
+        sampled, frequent = accumulator
+        threshold = 1 / (2 * self.num_workers)
+        if sampled < self.min_samples / threshold:
+            logger.info(f"🔑 Muestra de {sampled:,} claves (< {self.min_samples / threshold:,.0f}): sin salting")
+            return {}
+        hot_keys = {}
+        for key, count in frequent.counters.items():
+            share = count / sampled
+            if count >= self.min_samples and share >= threshold:
+                hot_keys[key] = fanout_for_share(share, self.num_workers)
+        return hot_keys
+
+class _SaltHotKeysFn(beam.DoFn):
+    """(clave, vector) → ((clave, sal), vector); solo las claves calientes reciben sal > 0"""
+
+    def __init__(self):
+        self.salted_rows = Metrics.counter('key_aggregates', 'salted_rows')
+
+    def setup(self):
+        # Reparto round-robin desde un desplazamiento aleatorio por instancia
+        self.position = random.randrange(1 << 16)
+
+    def process(self, element, hot_keys):
+        key, vector = element
+        fanout = hot_keys.get(key)
+        if not fanout:
+            yield (key, 0), vector
+            return
+        self.position += 1
+        self.salted_rows.inc()
+        yield (key, self.position % fanout), vector
+
+class LoadDistributionCombineFn(beam.CombineFn):
+    """Filas por worker del shuffle con la clave original y con la clave con sal"""
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+
+    def create_accumulator(self):
+        return [[0] * self.num_workers, [0] * self.num_workers]
+
+    def add_input(self, accumulator, salted_key):
+        key, salt = salted_key
+        accumulator[0][key_bucket(key, self.num_workers)] += 1
+        accumulator[1][key_bucket(salted_key if salt else key, self.num_workers)] += 1
+        return accumulator
+
+    def merge_accumulators(self, accumulators):
+        merged = self.create_accumulator()
+        for before, after in accumulators:
+            for index in range(self.num_workers):
+                merged[0][index] += before[index]
+                merged[1][index] += after[index]
+        return merged
+
+    def extract_output(self, accumulator):
+        return accumulator
+
+def _imbalance(loads: List[int]) -> float:
+    mean = sum(loads) / max(len(loads), 1)
+    return max(loads) / mean if mean else 0.0
+
+def build_report(distribution, hot_keys: Dict[str, int]) -> Dict[str, object]:
+    before, after = distribution
+    return {
+        'workers': len(before),
+        'bucket_model': BUCKET_MODEL,
+        'hot_keys': [{'key': key, 'fanout': fanout} for key, fanout in sorted(hot_keys.items())],
+        'rows_per_worker_before': before,
+        'rows_per_worker_after': after,
+        # max/media: 1.0 es reparto perfecto; N significa que un worker hace N veces su parte
+        'imbalance_before': round(_imbalance(before), 3),
+        'imbalance_after': round(_imbalance(after), 3),
+    }
+
+def write_report(distribution, hot_keys: Dict[str, int], path: str) -> Dict[str, object]:
+    report = build_report(distribution, hot_keys)
+    with FileSystems.create(path) as f:
+        f.write(json.dumps(report, indent=2, ensure_ascii=False).encode('utf-8'))
+    logger.info(f"⚖️ Carga por worker: desbalance {report['imbalance_before']}x → {report['imbalance_after']}x "
+                f"({len(hot_keys)} claves calientes con sal) — {path}")
+    return report
+
+def format_aggregate(element) -> str:
+    key, vector = element
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='').writerow([key, int(vector[0])] + [repr(value) for value in vector[1:]])
+    return buffer.getvalue()
+
+class ComputeKeyAggregates(beam.PTransform):
+    """
+    Filas y sumas por clave con salting automático de claves calientes
+
+    1. Una muestra de claves estima frecuencias (Misra-Gries combinable)
+    2. Las claves con más de 1/(2·workers) de las filas (y MIN_HOT_KEY_SAMPLES
+       apariciones en la muestra) se reparten en sub-claves
+    3. CombinePerKey sobre (clave, sal), se quita la sal y un segundo
+       CombinePerKey une como mucho 'fanout' parciales por clave
+
+    with_hot_key_fanout de Beam necesita el fanout al construir el pipeline;
+    aquí las claves calientes salen de los propios datos (entrada lateral).
+    """
+
+    def __init__(self, output_prefix: str, key_index: int, value_indexes: List[int], value_names: List[str],
+                 num_workers: int, sample_rate: float = DEFAULT_SAMPLE_RATE):
+        super().__init__()
+        self.output_prefix = output_prefix
+        self.key_index = key_index
+        self.value_indexes = value_indexes
+        self.value_names = value_names
+        self.num_workers = num_workers
+        self.sample_rate = sample_rate
+
+    def expand(self, rows):
+        num_workers = self.num_workers
+        report_path = f"{self.output_prefix}.load.json"
+        keyed = rows | 'KeyVectors' >> beam.ParDo(
+            _KeyVectorFn(self.key_index, self.value_indexes)).with_output_types(Tuple[str, List[float]])
+        hot_keys = (
+            keyed
+            | 'Keys' >> beam.Keys()
+            | 'SampleKeys' >> beam.Filter(lambda _, rate: random.random() < rate, self.sample_rate)
+            | 'FindHotKeys' >> beam.CombineGlobally(HotKeysCombineFn(num_workers))
+        )
+        salted = keyed | 'SaltHotKeys' >> beam.ParDo(_SaltHotKeysFn(), beam.pvalue.AsSingleton(hot_keys))
+
+        (
+            salted
+            | 'SaltedKeys' >> beam.Keys()
+            | 'LoadDistribution' >> beam.CombineGlobally(LoadDistributionCombineFn(num_workers))
+            | 'WriteLoadReport' >> beam.Map(write_report, beam.pvalue.AsSingleton(hot_keys), report_path)
+        )
+
+        header = ','.join(['key', 'rows'] + [f"sum_{name}" for name in self.value_names])
+        return (
+            salted
+            | 'CombineSalted' >> beam.CombinePerKey(SumVectorsFn())
+            | 'Unsalt' >> beam.Map(lambda element: (element[0][0], element[1]))
+            | 'CombinePartials' >> beam.CombinePerKey(SumVectorsFn())
+            | 'Format' >> beam.Map(format_aggregate)
+            | 'WriteAggregates' >> WriteToText(self.output_prefix, file_name_suffix='.csv', header=header)
+        )
+
+    @classmethod
+    def from_options(cls, options: PipelineOptions, column_names: Optional[List[str]] = None):
+        aggregate_options = options.view_as(KeyAggregateOptions)
+        column_names = column_names or []
+        values = [value.strip() for value in aggregate_options.aggregate_values.split(',') if value.strip()]
+        value_indexes = [column_index(value, column_names) for value in values]
+        worker_options = options.view_as(WorkerOptions)
+        num_workers = worker_options.max_num_workers or worker_options.num_workers or 8
+        return cls(aggregate_options.key_aggregates,
+                   column_index(aggregate_options.aggregate_key, column_names),
+                   value_indexes,
+                   [column_names[index] if index < len(column_names) else f"col_{index}" for index in value_indexes],
+                   num_workers,
+                   aggregate_options.key_sample_rate)
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados por clave con salting de claves calientes (DirectRunner)")
+    parser.add_argument("path", help="CSV local (puede estar comprimido con gzip)")
+    parser.add_argument("--output", required=True, help="Prefijo de salida de agregados y reporte")
+    parser.add_argument("--key", default="0", help="Columna clave (posición)")
+    parser.add_argument("--values", default="", help="Columnas a sumar (posiciones separadas por comas)")
+    parser.add_argument("--workers", type=int, default=8, help="Workers simulados para el reporte de carga")
+    parser.add_argument("--sample_rate", type=float, default=DEFAULT_SAMPLE_RATE)
+
+    args, pipeline_args = parser.parse_known_args()
+    options = PipelineOptions(pipeline_args + [
+        f'--key_aggregates={args.output}', f'--aggregate_key={args.key}',
+        f'--aggregate_values={args.values}', f'--key_sample_rate={args.sample_rate}',
+        f'--max_num_workers={args.workers}'])
+
+    with beam.Pipeline(options=options) as pipeline:
+        (
+            pipeline
+            | 'ReadCSV' >> ReadFromText(args.path, skip_header_lines=1)
+            | 'ParseCSV' >> beam.Map(lambda line: next(csv.reader([line])))
+            | 'KeyAggregates' >> ComputeKeyAggregates.from_options(options)
+        )
+
+    with FileSystems.open(f"{args.output}.load.json") as f:
+        report = json.loads(f.read().decode('utf-8'))
+    hot_keys = ', '.join(f"{item['key']}×{item['fanout']}" for item in report['hot_keys'])
+    print(f"🔑 Claves calientes: {hot_keys or 'ninguna'}")
+    print(f"{'Worker':<8} {'Antes':>12} {'Después':>12}")
+    print("-" * 34)
+    for worker, (before, after) in enumerate(zip(report['rows_per_worker_before'], report['rows_per_worker_after'])):
+        print(f"{worker:<8} {before:>12,} {after:>12,}")
+    print(f"⚖️ Desbalance (máx/media): {report['imbalance_before']}x → {report['imbalance_after']}x")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
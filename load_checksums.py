@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+🧮 Checksums en el Pipeline para Validar la Carga sin Re-escanear
+🔢 Conteo de filas, nulos por columna y suma de hashes independiente del orden
+🔤 Cada valor se hashea con su texto canónico según el tipo (como CAST(col AS STRING))
+📝 El pipeline los calcula al vuelo y los guarda como manifiesto JSON
+✅ La validación compara el manifiesto con agregados en el destino (o un fake SQLite)
+"""
+
+import argparse
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+
+import apache_beam as beam
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.options.pipeline_options import PipelineOptions
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HASH_HEX_DIGITS = 15  # 60 bits: cada hash cabe en INT64 positivo
+
+TYPE_ALIASES = {'INT64': 'INTEGER', 'FLOAT64': 'FLOAT', 'BOOL': 'BOOLEAN',
+                'DECIMAL': 'NUMERIC', 'BIGDECIMAL': 'BIGNUMERIC'}
+# Texto SQL por tipo; el resto usa CAST(col AS STRING). FLOAT y los tipos de
+# tiempo usan un formato fijo porque su CAST es aproximado o de precisión variable
+TEXT_SQL = {
+    'FLOAT': "FORMAT('%.17g', {name})",
+    'TIMESTAMP': "FORMAT_TIMESTAMP('%Y-%m-%d %H:%M:%E6S', {name}, 'UTC')",
+    'DATETIME': "FORMAT_DATETIME('%Y-%m-%d %H:%M:%E6S', {name})",
+    'TIME': "FORMAT_TIME('%H:%M:%E6S', {name})",
+}
+UNHASHABLE_TYPES = ('RECORD', 'STRUCT', 'GEOGRAPHY', 'JSON')
+NUMERIC_SCALE = {'NUMERIC': 9, 'BIGNUMERIC': 38}
+# BIGNUMERIC llega a 77 dígitos: el contexto por defecto (28) no puede cuantizarlos
+DECIMAL_CONTEXT = decimal.Context(prec=120)
+TRUE_VALUES = ('true', 't', 'yes', 'y', '1')
+FALSE_VALUES = ('false', 'f', 'no', 'n', '0')
+
+class ChecksumOptions(PipelineOptions):
+    """Opciones de checksums (desactivados si no se indica --checksum_manifest)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--checksum_manifest', default=None,
+                            help='Ruta local o gs:// del manifiesto de checksums de la carga')
+
+def value_hash(value: str) -> int:
+    """Hash de 60 bits de un valor; equivale a MD5 truncado calculable en SQL"""
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:HASH_HEX_DIGITS], 16)
+
+def normalize_type(column_type: Optional[str]) -> str:
+    column_type = (column_type or 'STRING').upper()
+    return TYPE_ALIASES.get(column_type, column_type)
+
+def _parse_datetime(text: str) -> datetime.datetime:
+    if text.endswith('UTC'):
+        text = text[:-3].strip()
+    return datetime.datetime.fromisoformat(text)
+
+def canonical_value(value, column_type: Optional[str] = None) -> str:
+    """
+    Texto con el que el destino representa el valor según el tipo de la columna
+
+    Reproduce las expresiones de BigQueryAggregates (CAST(col AS STRING) o TEXT_SQL);
+    un valor que no se puede interpretar con su tipo se hashea tal cual.
+    """
+    text = str(value).strip()
+    column_type = normalize_type(column_type)
+    try:
+        if column_type == 'INTEGER':
+            return str(int(text))
+        if column_type == 'FLOAT':
+            return '%.17g' % float(text)
+        if column_type in NUMERIC_SCALE:
+            number = decimal.Decimal(text).quantize(decimal.Decimal(1).scaleb(-NUMERIC_SCALE[column_type]),
+                                                    rounding=decimal.ROUND_HALF_UP, context=DECIMAL_CONTEXT)
+            return '0' if number == 0 else format(number.normalize(DECIMAL_CONTEXT), 'f')
+        if column_type == 'BOOLEAN':
+            if text.lower() in TRUE_VALUES:
+                return 'true'
+            if text.lower() in FALSE_VALUES:
+                return 'false'
+        elif column_type == 'DATE':
+            return datetime.date.fromisoformat(text).isoformat()
+        elif column_type == 'TIMESTAMP':
+            moment = _parse_datetime(text)
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=datetime.timezone.utc)
+            return moment.astimezone(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+        elif column_type == 'DATETIME':
+            return _parse_datetime(text).strftime('%Y-%m-%d %H:%M:%S.%f')
+        elif column_type == 'TIME':
+            return datetime.time.fromisoformat(text).strftime('%H:%M:%S.%f')
+    except (ValueError, decimal.InvalidOperation):
+        pass
+    return str(value)
+
+def _is_null(value) -> bool:
+    # BigQuery carga los campos CSV vacíos como NULL
+    return value is None or value == ''
+
+def _widen(accumulator, width: int):
+    """Agrega columnas nuevas; las filas ya vistas cuentan como nulas en ellas"""
+    missing = width - len(accumulator[1])
+    if missing > 0:
+        accumulator[1].extend([accumulator[0]] * missing)
+        accumulator[2].extend([0] * missing)
+
+class ChecksumCombineFn(beam.CombineFn):
+    """Acumula [filas, nulos por columna, suma de hashes por columna]"""
+
+    def __init__(self, num_columns: int = 0, column_types: Optional[List[str]] = None):
+        self.num_columns = num_columns
+        self.column_types = list(column_types or [])
+
+    def create_accumulator(self):
+        return [0, [0] * self.num_columns, [0] * self.num_columns]
+
+    def add_input(self, accumulator, row):
+        _widen(accumulator, len(row))
+        accumulator[0] += 1
+        nulls, sums, types = accumulator[1], accumulator[2], self.column_types
+        for index in range(len(nulls)):
+            value = row[index] if index < len(row) else None
+            if _is_null(value):
+                nulls[index] += 1
+            else:
+                sums[index] += value_hash(canonical_value(value, types[index] if index < len(types) else None))
+        return accumulator
+
+    def merge_accumulators(self, accumulators):
+        accumulators = list(accumulators)
+        width = max(len(accumulator[1]) for accumulator in accumulators)
+        merged = self.create_accumulator()
+        _widen(merged, width)
+        for accumulator in accumulators:
+            _widen(accumulator, width)
+            merged[0] += accumulator[0]
+            for index in range(width):
+                merged[1][index] += accumulator[1][index]
+                merged[2][index] += accumulator[2][index]
+        return merged
+
+    def extract_output(self, accumulator):
+        return accumulator
+
+def build_manifest(accumulator, column_names: List[str],
+                   column_types: Optional[List[str]] = None) -> Dict[str, object]:
+    rows, nulls, sums = accumulator
+    column_names = list(column_names) + [f"col_{index}" for index in range(len(column_names), len(nulls))]
+    column_types = list(column_types or [])
+    column_types += ['STRING'] * (len(column_names) - len(column_types))
+    return {
+        'row_count': rows,
+        'hash': f"md5[:{HASH_HEX_DIGITS}]",
+        # Las sumas exceden INT64: se guardan como texto decimal
+        'columns': [{'name': name, 'type': normalize_type(column_types[index]), 'null_count': nulls[index],
+                     'hash_sum': str(sums[index])}
+                    for index, name in enumerate(column_names)],
+    }
+
+def write_manifest(manifest: Dict[str, object], path: str):
+    with FileSystems.create(path) as f:
+        f.write(json.dumps(manifest, indent=2).encode('utf-8'))
+    logger.info(f"🧮 Manifiesto de checksums: {path} ({manifest['row_count']:,} filas)")
+
+def read_manifest(path: str) -> Dict[str, object]:
+    with FileSystems.open(path) as f:
+        return json.loads(f.read().decode('utf-8'))
+
+class ComputeChecksums(beam.PTransform):
+    """Calcula los checksums de filas (listas de valores) y escribe el manifiesto"""
+
+    def __init__(self, manifest_path: str, column_names: Optional[List[str]] = None,
+                 column_types: Optional[List[str]] = None):
+        super().__init__()
+        self.manifest_path = manifest_path
+        self.column_names = column_names or []
+        self.column_types = column_types or []
+
+    def expand(self, rows):
+        column_names = self.column_names
+        column_types = self.column_types
+        manifest_path = self.manifest_path
+        return (
+            rows
+            | 'CombineChecksums' >> beam.CombineGlobally(ChecksumCombineFn(len(column_names), column_types))
+            | 'WriteManifest' >> beam.Map(lambda accumulator: write_manifest(
+                build_manifest(accumulator, column_names, column_types), manifest_path))
+        )
+
+def column_names_from_schema(schema: Optional[str]) -> List[str]:
+    """Nombres desde un esquema 'campo:TIPO,...' (sin esquema: posicionales col_N)"""
+    return [field.split(':', 1)[0] for field in schema.split(',')] if schema else []
+
+def column_types_from_schema(schema: Optional[str]) -> List[str]:
+    """Tipos desde un esquema 'campo:TIPO,...' (STRING si el campo no lo indica)"""
+    return [normalize_type(field.partition(':')[2] or None) for field in schema.split(',')] if schema else []
+
+def _hash_sum_sql(text_sql: str) -> str:
+    """Suma de los hashes de 60 bits de una expresión de texto (como BIGNUMERIC, sin desbordar)"""
+    return (f"CAST(IFNULL(SUM(CAST(CAST(CONCAT('0x', SUBSTR(TO_HEX(MD5({text_sql})), 1, {HASH_HEX_DIGITS})) "
+            f"AS INT64) AS BIGNUMERIC)), 0) AS STRING)")
+
+class BigQueryAggregates:
+    """
+    Agregados en BigQuery con consultas: COUNT(*) para filas y una consulta para nulos y hashes
+
+    El conteo no usa los metadatos de la tabla (num_rows), que no incluyen las
+    filas aún en el buffer de streaming.
+    """
+
+    def __init__(self, table: str):
+        from google.cloud import bigquery
+
+        self.client = bigquery.Client()
+        self.table = table.replace(':', '.')
+
+    def columns(self) -> List[Dict[str, str]]:
+        return [{'name': field.name, 'type': normalize_type(field.field_type), 'mode': field.mode}
+                for field in self.client.get_table(self.table).schema]
+
+    def row_count(self) -> int:
+        row = list(self.client.query(f"SELECT COUNT(*) AS row_count FROM `{self.table}`").result())[0]
+        return row['row_count']
+
+    def aggregates(self, columns: List[Dict[str, str]]) -> Dict[str, Dict[str, object]]:
+        expressions = []
+        hashed = set()
+        for index, column in enumerate(columns):
+            name = f"`{column['name']}`"
+            expressions.append(f"COUNTIF({name} IS NULL) AS n{index}")
+            if column['type'] in UNHASHABLE_TYPES or column.get('mode') == 'REPEATED':
+                continue
+            text_sql = TEXT_SQL.get(column['type'], 'CAST({name} AS STRING)').format(name=name)
+            expressions.append(f"{_hash_sum_sql(text_sql)} AS h{index}")
+            hashed.add(index)
+        if not expressions:
+            return {}
+        row = list(self.client.query(f"SELECT {', '.join(expressions)} FROM `{self.table}`").result())[0]
+        return {column['name']: {'null_count': row[f"n{index}"],
+                                 'hash_sum': row[f"h{index}"] if index in hashed else None}
+                for index, column in enumerate(columns)}
+
+class _HashSum:
+    """Agregado SQLite que suma hashes del texto canónico sin desbordar INT64"""
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, value, column_type):
+        if value is not None and value != '':
+            self.total += value_hash(canonical_value(value, column_type))
+
+    def finalize(self):
+        return str(self.total)
+
+# Tipo declarado en SQLite (local_warehouse_sink) → tipo BigQuery equivalente
+SQLITE_COLUMN_TYPES = {'INTEGER': 'INTEGER', 'REAL': 'FLOAT', 'BOOLEAN': 'BOOLEAN', 'NUMERIC': 'NUMERIC',
+                       'NUMERIC_TEXT': 'NUMERIC', 'BIGNUMERIC_TEXT': 'BIGNUMERIC', 'BLOB': 'BYTES', 'TEXT': 'STRING'}
+
+class SQLiteAggregates:
+    """Fake local de BigQuery sobre una tabla SQLite (tipos según la declaración de cada columna)"""
+
+    def __init__(self, db_path: str, table: str = 'raw_data'):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.create_aggregate('hash_sum', 2, _HashSum)
+        self.table = table
+
+    def columns(self) -> List[Dict[str, str]]:
+        return [{'name': row[1], 'type': SQLITE_COLUMN_TYPES.get(row[2].upper(), 'STRING')}
+                for row in self.connection.execute(f'PRAGMA table_info("{self.table}")')]
+
+    def row_count(self) -> int:
+        return self.connection.execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]
+
+    def aggregates(self, columns: List[Dict[str, str]]) -> Dict[str, Dict[str, object]]:
+        expressions = []
+        for column in columns:
+            name = f'"{column["name"]}"'
+            expressions.append(f"SUM({name} IS NULL OR {name} = '')")
+            expressions.append(f"hash_sum({name}, '{column['type']}')")
+        row = self.connection.execute(f'SELECT {", ".join(expressions)} FROM "{self.table}"').fetchone()
+        return {column['name']: {'null_count': row[2 * index] or 0, 'hash_sum': row[2 * index + 1]}
+                for index, column in enumerate(columns)}
+
+def make_aggregates(destination: str):
+    """'proyecto:dataset.tabla' → BigQuery; 'ruta.db[:tabla]' → fake SQLite"""
+    if destination.endswith('.db'):
+        return SQLiteAggregates(destination)
+    if '.db:' in destination:
+        db_path, _, table = destination.rpartition(':')
+        return SQLiteAggregates(db_path, table)
+    return BigQueryAggregates(destination)
+
+def validate(manifest: Dict[str, object], aggregates, only_columns: Optional[List[str]] = None) -> List[str]:
+    """Compara el manifiesto con el destino; devuelve la lista de discrepancias"""
+    mismatches = []
+    destination_rows = aggregates.row_count()
+    if destination_rows != manifest['row_count']:
+        mismatches.append(f"filas: manifiesto {manifest['row_count']:,} vs destino {destination_rows:,}")
+
+    destination_columns = aggregates.columns()
+    by_name = {column['name']: column for column in destination_columns}
+    pairs = []
+    for index, expected in enumerate(manifest['columns']):
+        # Por nombre si existe en el destino; si no, por posición
+        column = by_name.get(expected['name'])
+        if column is None and index < len(destination_columns):
+            column = destination_columns[index]
+        if column is None:
+            mismatches.append(f"{expected['name']}: columna ausente en el destino")
+            continue
+        if only_columns and column['name'] not in only_columns:
+            continue
+        pairs.append((expected, column))
+
+    actual = aggregates.aggregates([column for _, column in pairs])
+    for expected, column in pairs:
+        result = actual[column['name']]
+        if int(result['null_count']) != expected['null_count']:
+            mismatches.append(f"{column['name']}: nulos {expected['null_count']:,} vs {int(result['null_count']):,}")
+        expected_type = normalize_type(expected.get('type'))
+        if result['hash_sum'] is None:
+            logger.info(f"ℹ️  {column['name']}: hash omitido (tipo {column['type']}, solo se comparan nulos)")
+        elif expected_type != column['type']:
+            # El texto canónico depende del tipo: sin el mismo tipo las sumas no son comparables
+            logger.info(f"ℹ️  {column['name']}: hash omitido (manifiesto {expected_type}, "
+                        f"destino {column['type']}; solo se comparan nulos)")
+        elif str(result['hash_sum']) != expected['hash_sum']:
+            mismatches.append(f"{column['name']}: suma de hashes distinta")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Validación de cargas con checksums del pipeline")
+    parser.add_argument("--manifest", required=True, help="Manifiesto escrito por el pipeline (local o gs://)")
+    parser.add_argument("--destination", required=True,
+                        help="Tabla proyecto:dataset.tabla o base SQLite local ruta.db[:tabla]")
+    parser.add_argument("--columns", default=None,
+                        help="Validar solo estas columnas (separadas por comas) para escanear menos bytes")
+
+    args = parser.parse_args()
+    manifest = read_manifest(args.manifest)
+    only_columns = [name.strip() for name in args.columns.split(',')] if args.columns else None
+
+    print(f"🧮 Manifiesto: {manifest['row_count']:,} filas, {len(manifest['columns'])} columnas")
+    mismatches = validate(manifest, make_aggregates(args.destination), only_columns)
+    if mismatches:
+        print(f"❌ {len(mismatches)} discrepancias en {args.destination}:")
+        for mismatch in mismatches:
+            print(f"   • {mismatch}")
+        return 1
+
+    print(f"✅ {args.destination} coincide con el manifiesto")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+🏠 Almacén Local Emulado (SQLite) como Sink Sustituto de BigQuery
+🧪 Ejecuciones end-to-end sin acceso a la nube (desarrollo y CI offline)
+📐 Mismas disposiciones CREATE_IF_NEEDED/CREATE_NEVER y WRITE_TRUNCATE/APPEND/EMPTY
+🔎 Archivo consultable con SQL para verificar resultados y medir throughput
+"""
+
+import argparse
+import contextlib
+import csv
+import decimal
+import gzip
+import logging
+import sqlite3
+import sys
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import apache_beam as beam
+from apache_beam.io.gcp.bigquery import BigQueryDisposition
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import PipelineOptions
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SQLITE_TYPES = {
+    'STRING': 'TEXT', 'BYTES': 'BLOB',
+    'INTEGER': 'INTEGER', 'INT64': 'INTEGER',
+    'FLOAT': 'REAL', 'FLOAT64': 'REAL',
+    # Afinidad TEXT: el decimal exacto se guarda como texto y se lee como Decimal (REAL perdería precisión)
+    'NUMERIC': 'NUMERIC_TEXT', 'BIGNUMERIC': 'BIGNUMERIC_TEXT',
+    'BOOLEAN': 'BOOLEAN', 'BOOL': 'BOOLEAN',  # Afinidad NUMERIC en SQLite; se guarda como 0/1
+    'DATE': 'TEXT', 'DATETIME': 'TEXT', 'TIMESTAMP': 'TEXT', 'TIME': 'TEXT',
+}
+# Literales booleanos que acepta una carga CSV de BigQuery (sin distinguir mayúsculas)
+BOOLEAN_VALUES = {'true': 1, 't': 1, 'yes': 1, 'y': 1, '1': 1,
+                  'false': 0, 'f': 0, 'no': 0, 'n': 0, '0': 0}
+MAX_LOGGED_REJECTIONS = 10
+# Decimales de NUMERIC/BIGNUMERIC en BigQuery (redondeo al cargar)
+DECIMAL_SCALE = {'NUMERIC_TEXT': 9, 'BIGNUMERIC_TEXT': 38}
+# BIGNUMERIC llega a 77 dígitos: el contexto por defecto (28) redondearía
+DECIMAL_CONTEXT = decimal.Context(prec=120)
+
+for _declared in DECIMAL_SCALE:
+    sqlite3.register_converter(_declared, lambda value: decimal.Decimal(value.decode('ascii')))
+
+class LocalWarehouseOptions(PipelineOptions):
+    """Opciones del almacén local (si se indica, sustituye a WriteToBigQuery)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--local_warehouse', default=None,
+                            help='Archivo SQLite donde escribir en lugar de BigQuery')
+
+def table_name(table: str) -> str:
+    """'proyecto:dataset.tabla' → 'dataset.tabla' (el proyecto no aplica en local)"""
+    return table.rpartition(':')[2]
+
+def parse_schema(schema: Optional[str]) -> Optional[List[Tuple[str, str]]]:
+    """'campo:TIPO,...' → [(campo, TIPO)]; None para auto-detect"""
+    if not schema:
+        return None
+    fields = []
+    for field in schema.split(','):
+        name, _, field_type = field.strip().partition(':')
+        fields.append((name, (field_type or 'STRING').upper()))
+    return fields
+
+def connect(db_path: str) -> sqlite3.Connection:
+    # PARSE_DECLTYPES: las columnas NUMERIC_TEXT/BIGNUMERIC_TEXT se leen como Decimal
+    connection = sqlite3.connect(db_path, timeout=120, detect_types=sqlite3.PARSE_DECLTYPES)
+    # WAL permite lecturas concurrentes mientras los workers escriben
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+def table_columns(connection: sqlite3.Connection, table: str) -> List[Tuple[str, str]]:
+    return [(row[1], row[2]) for row in connection.execute(f'PRAGMA table_info("{table}")')]
+
+def create_table(connection: sqlite3.Connection, table: str, fields: List[Tuple[str, str]]):
+    columns_sql = ', '.join(f'"{name}" {SQLITE_TYPES.get(field_type, "TEXT")}' for name, field_type in fields)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns_sql})')
+
+def prepare_table(db_path: str, table: str, schema: Optional[str] = None,
+                  create_disposition: str = BigQueryDisposition.CREATE_IF_NEEDED,
+                  write_disposition: str = BigQueryDisposition.WRITE_APPEND) -> bool:
+    """
+    Aplica las disposiciones antes de escribir; devuelve si la tabla ya existe
+
+    Sin esquema y con CREATE_IF_NEEDED la tabla se crea con la primera fila
+    escrita (columnas col_N de texto), como el auto-detect de BigQuery.
+    """
+    table = table_name(table)
+    fields = parse_schema(schema)
+    with contextlib.closing(connect(db_path)) as connection, connection:
+        exists = bool(table_columns(connection, table))
+        if not exists:
+            if create_disposition == BigQueryDisposition.CREATE_NEVER:
+                raise RuntimeError(f"La tabla {table} no existe y la disposición es CREATE_NEVER")
+            if fields:
+                create_table(connection, table, fields)
+                exists = True
+        elif write_disposition == BigQueryDisposition.WRITE_TRUNCATE:
+            connection.execute(f'DELETE FROM "{table}"')
+        elif write_disposition == BigQueryDisposition.WRITE_EMPTY:
+            if connection.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone():
+                raise RuntimeError(f"La tabla {table} no está vacía y la disposición es WRITE_EMPTY")
+    return exists
+
+def _convert(value, field_type: str):
+    """Convierte un valor de texto al tipo de la columna (vacío = NULL)"""
+    if value is None or value == '':
+        return None
+    if field_type == 'INTEGER':
+        return int(value)
+    if field_type == 'REAL':
+        return float(value)
+    if field_type in DECIMAL_SCALE:
+        try:
+            number = decimal.Decimal(str(value).strip()).quantize(
+                decimal.Decimal(1).scaleb(-DECIMAL_SCALE[field_type]), rounding=decimal.ROUND_HALF_UP,
+                context=DECIMAL_CONTEXT)
+        except decimal.InvalidOperation:
+            raise ValueError(f"Valor decimal inválido: {value!r}")
+        if not number.is_finite():
+            raise ValueError(f"Valor decimal inválido: {value!r}")
+        return '0' if number == 0 else format(number.normalize(DECIMAL_CONTEXT), 'f')
+    if field_type == 'BOOLEAN':
+        if isinstance(value, bool):
+            return int(value)
+        flag = BOOLEAN_VALUES.get(str(value).strip().lower())
+        if flag is None:
+            raise ValueError(f"Valor booleano inválido: {value!r}")
+        return flag
+    return value
+
+def _is_batch(element) -> bool:
+    # BatchElements entrega listas de filas; una fila es lista de str, dict o CompactRow
+    return isinstance(element, list) and bool(element) and not isinstance(element[0], str)
+
+class _LocalWarehouseWriteFn(beam.DoFn):
+    """Escribe filas (listas, dicts o lotes de ellas) con executemany por lotes"""
+
+    def __init__(self, db_path: str, table: str, batch_size: int = 10000):
+        self.db_path = db_path
+        self.table = table_name(table)
+        self.batch_size = batch_size
+        self.rows_written = Metrics.counter('local_warehouse', 'rows_written')
+        self.rejected_rows = Metrics.counter('local_warehouse', 'rejected_rows')
+
+    def setup(self):
+        self.connection = connect(self.db_path)
+        self.columns = None
+        self.written = 0
+        self.rejected = 0
+
+    def start_bundle(self):
+        self.buffer = []
+
+    def _load_columns(self, first_row):
+        columns = table_columns(self.connection, self.table)
+        if not columns:
+            # Auto-detect: columnas de texto según la primera fila
+            names = list(first_row) if isinstance(first_row, dict) else [f"col_{i}" for i in range(len(first_row))]
+            with self.connection:
+                create_table(self.connection, self.table, [(name, 'STRING') for name in names])
+            columns = table_columns(self.connection, self.table)
+        self.columns = [(name, declared.upper()) for name, declared in columns]
+        placeholders = ', '.join('?' * len(self.columns))
+        self.insert_sql = f'INSERT INTO "{self.table}" VALUES ({placeholders})'
+
+    def _to_values(self, row) -> Optional[tuple]:
+        try:
+            if isinstance(row, dict):
+                return tuple(_convert(row.get(name), field_type) for name, field_type in self.columns)
+            width = len(row)
+            return tuple(_convert(row[index] if index < width else None, field_type)
+                         for index, (_, field_type) in enumerate(self.columns))
+        except (TypeError, ValueError) as e:
+            self.rejected += 1
+            if self.rejected <= MAX_LOGGED_REJECTIONS:
+                logger.warning(f"⚠️  Fila rechazada en {self.table}: {e}")
+            return None
+
+    def process(self, element, table_ready):
+        for row in (element if _is_batch(element) else [element]):
+            if self.columns is None:
+                self._load_columns(row)
+            values = self._to_values(row)
+            if values is None:
+                self.rejected_rows.inc()
+                continue
+            self.buffer.append(values)
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        with self.connection:
+            self.connection.executemany(self.insert_sql, self.buffer)
+        self.rows_written.inc(len(self.buffer))
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def finish_bundle(self):
+        self._flush()
+
+    def teardown(self):
+        if self.rejected:
+            logger.warning(f"⚠️  {self.rejected:,} filas rechazadas en {self.table} (no convertibles al esquema)")
+        self.connection.close()
+
+class WriteToLocalWarehouse(beam.PTransform):
+    """Sustituto local de WriteToBigQuery con las mismas disposiciones y esquema"""
+
+    def __init__(self, table: str, db_path: str, schema: Optional[str] = None,
+                 create_disposition: str = BigQueryDisposition.CREATE_IF_NEEDED,
+                 write_disposition: str = BigQueryDisposition.WRITE_APPEND,
+                 batch_size: int = 10000):
+        super().__init__()
+        self.table = table
+        self.db_path = db_path
+        self.schema = schema
+        self.create_disposition = create_disposition
+        self.write_disposition = write_disposition
+        self.batch_size = batch_size
+
+    def expand(self, rows):
+        # La preparación (truncate/validaciones) corre una vez antes de cualquier escritura
+        prepared = (
+            rows.pipeline
+            | 'PrepareTable' >> beam.Create([None])
+            | 'ApplyDispositions' >> beam.Map(
+                lambda _, db_path, table, schema, create, write: prepare_table(db_path, table, schema, create, write),
+                self.db_path, self.table, self.schema, self.create_disposition, self.write_disposition)
+        )
+        return rows | 'WriteRows' >> beam.ParDo(
+            _LocalWarehouseWriteFn(self.db_path, self.table, self.batch_size), beam.pvalue.AsSingleton(prepared))
+
+def load_csv(db_path: str, table: str, paths: Iterable[str], schema: Optional[str] = None,
+             create_disposition: str = BigQueryDisposition.CREATE_IF_NEEDED,
+             write_disposition: str = BigQueryDisposition.WRITE_APPEND,
+             skip_leading_rows: int = 1, delimiter: str = ',') -> int:
+    """
+    Equivalente local de 'bq load' para archivos CSV (opcionalmente gzip)
+
+    Devuelve las filas escritas; las que no se pueden convertir al esquema se
+    descartan con un aviso (como max_bad_records en BigQuery).
+    """
+    prepare_table(db_path, table, schema, create_disposition, write_disposition)
+    write_fn = _LocalWarehouseWriteFn(db_path, table)
+    write_fn.setup()
+    try:
+        for path in paths:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', newline='', encoding='utf-8', errors='replace') as f:
+                reader = csv.reader(f, delimiter=delimiter)
+                for _ in range(skip_leading_rows):
+                    next(reader, None)
+                write_fn.start_bundle()
+                for row in reader:
+                    if row:
+                        write_fn.process(row, True)
+                write_fn.finish_bundle()
+    finally:
+        write_fn.teardown()
+    return write_fn.written
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén local emulado (SQLite) sustituto de BigQuery")
+    parser.add_argument("--db", required=True, help="Archivo SQLite del almacén local")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load = subparsers.add_parser("load", help="Cargar archivos CSV (equivalente a bq load)")
+    load.add_argument("table", help="dataset.tabla (o proyecto:dataset.tabla)")
+    load.add_argument("paths", nargs="+", help="Archivos CSV locales")
+    load.add_argument("--schema", default=None, help="Esquema campo:TIPO,... (por defecto auto-detect)")
+    load.add_argument("--replace", action="store_true", help="WRITE_TRUNCATE en lugar de WRITE_APPEND")
+    load.add_argument("--skip_leading_rows", type=int, default=1)
+
+    query = subparsers.add_parser("query", help="Ejecutar una consulta SQL")
+    query.add_argument("sql", help="Consulta (tablas como \"dataset.tabla\")")
+
+    args = parser.parse_args()
+
+    if args.command == "load":
+        write_disposition = BigQueryDisposition.WRITE_TRUNCATE if args.replace else BigQueryDisposition.WRITE_APPEND
+        start_time = time.time()
+        rows = load_csv(args.db, args.table, args.paths, args.schema,
+                        write_disposition=write_disposition, skip_leading_rows=args.skip_leading_rows)
+        duration = max(time.time() - start_time, 1e-9)
+        print(f"✅ {rows:,} filas cargadas en {table_name(args.table)} en {duration:.2f} segundos "
+              f"({rows / duration:,.0f} filas/s)")
+        return 0
+
+    with contextlib.closing(connect(args.db)) as connection:
+        cursor = connection.execute(args.sql)
+        print(" | ".join(column[0] for column in cursor.description or []))
+        for row in cursor:
+            print(" | ".join('NULL' if value is None else str(value) for value in row))
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+🗺️ Lector CSV Zero-Copy con mmap
+⚡ Divide archivos locales sin comprimir en rangos de bytes alineados a registros
+🔀 Cada proceso escanea su rango directamente desde el mapeo de memoria
+💡 Respeta saltos de línea dentro de campos entre comillas (como --allow_quoted_newlines)
+"""
+
+import argparse
+import csv
+import logging
+import mmap
+import os
+import time
+from multiprocessing import Pool
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUOTE = b'"'
+NEWLINE = b'\n'
+COUNT_CHUNK_SIZE = 8 * 1024 * 1024  # Bloques para el conteo de comillas
+
+def open_mmap(path: str) -> Tuple[object, mmap.mmap]:
+    """Abre el archivo y lo mapea en memoria en modo solo lectura"""
+    handle = open(path, 'rb')
+    try:
+        mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Archivo vacío: no se puede mapear
+        handle.close()
+        raise
+    if hasattr(mm, 'madvise'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    return handle, mm
+
+def count_quotes(mm: mmap.mmap, start: int, end: int) -> int:
+    """Cuenta comillas en [start, end) por bloques acotados"""
+    total = 0
+    for chunk_start in range(start, end, COUNT_CHUNK_SIZE):
+        chunk_end = min(chunk_start + COUNT_CHUNK_SIZE, end)
+        total += mm[chunk_start:chunk_end].count(QUOTE)
+    return total
+
+def _quote_parity(mm: mmap.mmap, start: int, end: int) -> int:
+    """Paridad de comillas en un registro corto, sin copiarlo"""
+    parity = 0
+    pos = mm.find(QUOTE, start, end)
+    while pos != -1:
+        parity ^= 1
+        pos = mm.find(QUOTE, pos + 1, end)
+    return parity
+
+def next_record_end(mm: mmap.mmap, pos: int, end: int, inside_quotes: bool = False,
+                    quote_aware: bool = True) -> int:
+    """
+    Devuelve la posición del salto de línea que cierra el registro que empieza en pos
+
+    Las comillas escapadas ("") aportan paridad par, por lo que basta con la
+    paridad acumulada para saber si un salto de línea está dentro de un campo.
+    Retorna end si el registro termina sin salto de línea.
+    """
+    search = pos
+    while True:
+        newline = mm.find(NEWLINE, search, end)
+        if newline == -1:
+            return end
+        if quote_aware and _quote_parity(mm, search, newline):
+            inside_quotes = not inside_quotes
+        if not inside_quotes:
+            return newline
+        search = newline + 1
+
+def _count_quotes_worker(args: Tuple[str, int, int]) -> int:
+    """Cuenta comillas de un segmento crudo en un proceso independiente"""
+    path, start, end = args
+    handle, mm = open_mmap(path)
+    try:
+        return count_quotes(mm, start, end)
+    finally:
+        mm.close()
+        handle.close()
+
+def split_ranges(path: str, num_ranges: int, quote_aware: bool = True,
+                 skip_header_lines: int = 0, processes: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Divide el archivo en rangos [inicio, fin) alineados a límites de registro
+
+    Fase 1: cada proceso cuenta las comillas de su segmento crudo (en paralelo).
+    Fase 2: con la paridad acumulada se conoce el estado de comillas en cada
+    corte y se avanza hasta el primer salto de línea fuera de comillas.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    num_ranges = max(1, num_ranges)
+    raw_cuts = [size * i // num_ranges for i in range(num_ranges + 1)]
+
+    parities = [0] * (num_ranges + 1)
+    if quote_aware and num_ranges > 1:
+        segments = [(path, raw_cuts[i], raw_cuts[i + 1]) for i in range(num_ranges)]
+        with Pool(processes or min(num_ranges, os.cpu_count() or 1)) as pool:
+            counts = pool.map(_count_quotes_worker, segments)
+        running = 0
+        for i, count in enumerate(counts):
+            running += count
+            parities[i + 1] = running % 2
+
+    handle, mm = open_mmap(path)
+    try:
+        start = 0
+        for _ in range(skip_header_lines):
+            start = min(next_record_end(mm, start, size, quote_aware=quote_aware) + 1, size)
+
+        boundaries = [start]
+        for i in range(1, num_ranges):
+            cut = raw_cuts[i]
+            if cut <= boundaries[-1]:
+                continue
+            # Se arranca en cut-1 para detectar si cut ya es inicio de registro
+            inside = bool(parities[i] ^ (mm[cut - 1:cut] == QUOTE))
+            record_end = next_record_end(mm, cut - 1, size, inside_quotes=inside,
+                                         quote_aware=quote_aware)
+            boundary = min(record_end + 1, size)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        boundaries.append(size)
+    finally:
+        mm.close()
+        handle.close()
+
+    return [(boundaries[i], boundaries[i + 1])
+            for i in range(len(boundaries) - 1) if boundaries[i] < boundaries[i + 1]]
+
+def scan_records(mm: mmap.mmap, start: int, end: int, quote_aware: bool = True) -> Iterator[memoryview]:
+    """
+    Genera cada registro del rango como memoryview sobre el mapeo (sin copias)
+
+    Las vistas dejan de ser válidas al cerrar el mapeo: no deben conservarse.
+    """
+    view = memoryview(mm)
+    try:
+        pos = start
+        while pos < end:
+            record_end = next_record_end(mm, pos, end, quote_aware=quote_aware)
+            stop = record_end
+            if stop > pos and view[stop - 1] == 0x0D:  # \r de finales CRLF
+                stop -= 1
+            record = view[pos:stop]
+            try:
+                yield record
+            finally:
+                record.release()
+            pos = record_end + 1
+    finally:
+        view.release()
+
+def parse_record(record: memoryview, delimiter: str = ',') -> List[str]:
+    """Convierte un registro en lista de campos (ruta rápida sin comillas)"""
+    line = bytes(record).decode('utf-8', errors='replace')
+    if '"' not in line:
+        return line.split(delimiter)
+    return next(csv.reader([line], delimiter=delimiter))
+
+def count_records(records: Iterator[memoryview]) -> Tuple[int, int]:
+    """Handler por defecto: cuenta registros y bytes sin decodificar"""
+    rows = 0
+    total_bytes = 0
+    for record in records:
+        if record.nbytes:
+            rows += 1
+            total_bytes += record.nbytes
+    return rows, total_bytes
+
+def count_fields(records: Iterator[memoryview]) -> Tuple[int, int]:
+    """Handler de parseo completo: cuenta registros y campos"""
+    rows = 0
+    fields = 0
+    for record in records:
+        if record.nbytes:
+            rows += 1
+            fields += len(parse_record(record))
+    return rows, fields
+
+def _scan_range_worker(args: Tuple[str, int, int, Callable, bool, Optional[str]]):
+    """Escanea un rango en su propio proceso y aplica el handler"""
+    path, start, end, handler, quote_aware, profile_dir = args
+    handle, mm = open_mmap(path)
+    try:
+        if profile_dir:
+            from pipeline_profiler import profile_stage
+            with profile_stage('mmap_scan', profile_dir):
+                return handler(scan_records(mm, start, end, quote_aware))
+        return handler(scan_records(mm, start, end, quote_aware))
+    finally:
+        mm.close()
+        handle.close()
+
+def parallel_scan(path: str, workers: int, handler: Callable = count_records,
+                  quote_aware: bool = True, skip_header_lines: int = 0,
+                  ranges: Optional[List[Tuple[int, int]]] = None,
+                  profile_dir: Optional[str] = None) -> list:
+    """
+    Escanea el archivo con un proceso por rango y devuelve los resultados en orden
+
+    handler recibe un iterador de memoryview y debe devolver un resultado
+    serializable; debe ser una función de módulo para poder enviarse a los procesos.
+    Con profile_dir se muestrea la pila de cada proceso (ver pipeline_profiler.py).
+    """
+    if path.endswith('.gz'):
+        raise ValueError("El lector mmap requiere archivos sin comprimir")
+
+    if ranges is None:
+        ranges = split_ranges(path, workers, quote_aware=quote_aware,
+                              skip_header_lines=skip_header_lines, processes=workers)
+    if not ranges:
+        return []
+
+    tasks = [(path, start, end, handler, quote_aware, profile_dir) for start, end in ranges]
+    if len(tasks) == 1:
+        return [_scan_range_worker(tasks[0])]
+    with Pool(workers) as pool:
+        return pool.map(_scan_range_worker, tasks)
+
+def cached_split_ranges(path: str, num_ranges: int, quote_aware: bool = True,
+                        skip_header_lines: int = 0, cache_dir: Optional[str] = None) -> List[Tuple[int, int]]:
+    """split_ranges reutilizando límites guardados mientras el archivo no cambie"""
+    if cache_dir is None:
+        return split_ranges(path, num_ranges, quote_aware, skip_header_lines)
+
+    from input_profile_cache import InputProfileCache
+
+    cache = InputProfileCache(cache_dir)
+    key = f"{num_ranges}:{skip_header_lines}:{'quote' if quote_aware else 'plain'}"
+    boundaries = cache.get_shard_boundaries(path, key)
+    if boundaries is not None:
+        return [tuple(bounds) for bounds in boundaries]
+
+    ranges = split_ranges(path, num_ranges, quote_aware, skip_header_lines)
+    cache.store_shard_boundaries(path, key, ranges)
+    return ranges
+
+def benchmark(path: str, worker_counts: List[int], parse: bool = False,
+              quote_aware: bool = True, skip_header_lines: int = 0,
+              profile_dir: Optional[str] = None, cache_dir: Optional[str] = None):
+    """Mide el throughput de lectura para distintos números de procesos"""
+    size = os.path.getsize(path)
+    handler = count_fields if parse else count_records
+    baseline = None
+
+    print(f"📁 Archivo: {path} ({size / (1024**3):.2f} GB)")
+    print(f"{'Procesos':<10} {'Tiempo (s)':<12} {'GB/s':<10} {'Speedup':<10} Registros")
+    print("-" * 60)
+
+    for workers in worker_counts:
+        start_time = time.time()
+        ranges = cached_split_ranges(path, workers, quote_aware, skip_header_lines, cache_dir)
+        results = parallel_scan(path, workers, handler=handler, quote_aware=quote_aware,
+                                skip_header_lines=skip_header_lines, ranges=ranges, profile_dir=profile_dir)
+        duration = max(time.time() - start_time, 1e-9)
+        rows = sum(result[0] for result in results)
+        if baseline is None:
+            baseline = duration
+        print(f"{workers:<10} {duration:<12.2f} {size / duration / (1024**3):<10.2f} "
+              f"{baseline / duration:<10.2f} {rows:,}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Lector CSV zero-copy con mmap y rangos paralelos")
+    parser.add_argument("path", help="Archivo CSV local sin comprimir")
+    parser.add_argument("--workers", default=str(os.cpu_count() or 1),
+                        help="Número de procesos, o lista separada por comas para benchmark (ej. 1,2,4,8)")
+    parser.add_argument("--parse", action="store_true", help="Parsear campos además de delimitar registros")
+    parser.add_argument("--no_quote_aware", action="store_true",
+                        help="Cortar en cualquier salto de línea (más rápido, sin soporte de comillas)")
+    parser.add_argument("--skip_header_lines", type=int, default=1, help="Líneas de encabezado a saltar")
+    parser.add_argument("--profile_dir", default=None,
+                        help="Guardar perfiles de pila por proceso (reporte con pipeline_profiler.py)")
+    parser.add_argument("--cache_dir", default=None,
+                        help="Reutilizar límites de rangos desde la caché de input_profile_cache.py")
+
+    args = parser.parse_args()
+
+    worker_counts = [int(value) for value in args.workers.split(',') if value.strip()]
+    benchmark(args.path, worker_counts, parse=args.parse,
+              quote_aware=not args.no_quote_aware, skip_header_lines=args.skip_header_lines,
+              profile_dir=args.profile_dir, cache_dir=args.cache_dir)
+
+if __name__ == "__main__":
+    main()
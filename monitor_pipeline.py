@@ -2,6 +2,7 @@
 """
 📊 Monitor de Pipeline en Tiempo Real
 🔍 Monitorea el progreso y rendimiento del pipeline de Dataflow
+🐢 Detecta la etapa más lenta (lectura, parseo, reshuffle o escritura) y su backlog
 """
 
 import time
@@ -9,6 +10,20 @@ import subprocess
 import json
 from datetime import datetime, timedelta
 import argparse
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Etapas lógicas del pipeline y los nombres de paso que les corresponden
+STAGE_PATTERNS = [
+    ('read', ('ReadCSV', 'ReadFile', 'Read')),
+    ('parse', ('ProcessCSV', 'FilterEmpty', 'Parse', 'RouteRows', 'Materialize')),
+    ('reshuffle', ('Reshuffle', 'GroupByKey', 'BatchProcess')),
+    ('write', ('WriteToBigQuery', 'WriteToLocalWarehouse', 'Write')),
+    ('aggregate', ('Checksums', 'ColumnProfile', 'KeyAggregates')),
+]
+STAGE_NAMES = [stage for stage, _ in STAGE_PATTERNS]
+# Ramas laterales sobre las filas parseadas: no forman parte de la cadena de backlog
+SIDE_STAGES = ('aggregate',)
 
 def get_pipeline_status(project_id, job_id=None):
     """Obtiene el estado del pipeline de Dataflow"""
@@ -34,7 +49,172 @@ def get_bigquery_stats(project_id, dataset, table):
         print(f"❌ Error obteniendo stats de BigQuery: {e}")
         return None
 
-def monitor_pipeline(project_id, dataset="cdo_challenge", table="raw_data", interval=30):
+class GcloudMetricsSource:
+    """Obtiene las métricas por paso de un job de Dataflow con gcloud"""
+
+    def __init__(self, project_id, region=None, record_path=None):
+        self.project_id = project_id
+        self.region = region
+        self.record_path = record_path
+        self.snapshots = []
+
+    def fetch(self, job_id) -> Optional[Tuple[float, List[dict]]]:
+        cmd = f"gcloud dataflow metrics list {job_id} --project={self.project_id} --source=service --format=json"
+        if self.region:
+            cmd += f" --region={self.region}"
+        try:
+            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+            metrics = json.loads(result.stdout)
+        except Exception as e:
+            print(f"❌ Error obteniendo métricas: {e}")
+            return None
+
+        snapshot = (time.time(), metrics)
+        if self.record_path:
+            # Se guardan las instantáneas para reproducirlas luego (RecordedMetricsSource)
+            self.snapshots.append({'timestamp': snapshot[0], 'metrics': metrics})
+            with open(self.record_path, 'w') as f:
+                json.dump(self.snapshots, f)
+        return snapshot
+
+class RecordedMetricsSource:
+    """Reproduce instantáneas de métricas grabadas en JSON (para pruebas sin GCP)"""
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.snapshots = json.load(f)
+        self.position = 0
+
+    def fetch(self, job_id) -> Optional[Tuple[float, List[dict]]]:
+        if self.position >= len(self.snapshots):
+            return None
+        snapshot = self.snapshots[self.position]
+        self.position += 1
+        return snapshot['timestamp'], snapshot['metrics']
+
+def stage_for_step(step_name: str) -> Optional[str]:
+    """
+    Asigna un nombre de paso de Beam a su etapa lógica
+
+    Se prueba cada componente de la ruta desde la raíz, así los contenedores
+    sin etapa propia se resuelven por sus subpasos (FanOut/Write_mx/... → write,
+    FanOut/RouteRows → parse).
+    """
+    for component in step_name.split('/'):
+        for stage, patterns in STAGE_PATTERNS:
+            if any(component.startswith(pattern) for pattern in patterns):
+                return stage
+    return None
+
+def extract_stage_metrics(metrics: List[dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Agrega las métricas de Dataflow por etapa lógica
+
+    elements: mayor ElementCount de salida entre los pasos de la etapa
+    msecs: suma de los tiempos de ejecución (*-msecs) de sus pasos
+    """
+    stages = {stage: {'elements': 0, 'msecs': 0} for stage in STAGE_NAMES}
+    for metric in metrics:
+        name_info = metric.get('name', {})
+        name = name_info.get('name', '')
+        context = name_info.get('context', {})
+        value = metric.get('scalar', 0)
+        if not isinstance(value, (int, float)):
+            continue
+        if context.get('tentative') == 'true':
+            continue
+
+        if name == 'ElementCount':
+            step = context.get('output_user_name') or context.get('original_name', '')
+            stage = stage_for_step(step)
+            if stage:
+                stages[stage]['elements'] = max(stages[stage]['elements'], value)
+        elif name.lower().endswith('msecs'):
+            # Contexto 'step' o nombres del tipo "s2-ProcessCSV-process-msecs"
+            step = context.get('step') or re.sub(r'^s\d+-', '', name).split('-')[0]
+            stage = stage_for_step(step)
+            if stage:
+                stages[stage]['msecs'] += value
+    return stages
+
+def analyze_bottleneck(previous: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, float]],
+                       seconds: float) -> Dict[str, dict]:
+    """
+    Calcula throughput, tiempo y backlog por etapa entre dos instantáneas
+
+    El backlog de una etapa son los elementos que la etapa anterior ya emitió
+    y ella todavía no; si crece entre instantáneas, la etapa no da abasto.
+    La etapa más lenta es la de mayor tiempo de ejecución en el intervalo, o
+    la de menor throughput si no hay métricas de tiempo.
+    """
+    seconds = max(seconds, 1e-9)
+    analysis = {}
+    upstream = None
+    for stage in STAGE_NAMES:
+        elements = current[stage]['elements']
+        delta = elements - previous[stage]['elements']
+        # Etapas ausentes del job (sin elementos ni tiempo) no acumulan backlog
+        present = elements or current[stage]['msecs']
+        chained = upstream and present and stage not in SIDE_STAGES
+        backlog = current[upstream]['elements'] - elements if chained else 0
+        previous_backlog = previous[upstream]['elements'] - previous[stage]['elements'] if chained else 0
+        analysis[stage] = {
+            'elements': elements,
+            'throughput': delta / seconds,
+            'msecs': current[stage]['msecs'] - previous[stage]['msecs'],
+            'backlog': max(backlog, 0),
+            'backlog_growth': backlog - previous_backlog,
+        }
+        if stage not in SIDE_STAGES and (elements or upstream is None):
+            upstream = stage
+
+    active = [stage for stage in STAGE_NAMES if analysis[stage]['elements'] or analysis[stage]['msecs']]
+    slowest = None
+    if any(analysis[stage]['msecs'] > 0 for stage in active):
+        slowest = max(active, key=lambda stage: analysis[stage]['msecs'])
+    elif active:
+        slowest = min(active, key=lambda stage: analysis[stage]['throughput'])
+    for stage in STAGE_NAMES:
+        analysis[stage]['slowest'] = stage == slowest
+    return analysis
+
+def print_stage_analysis(analysis: Dict[str, dict]):
+    """Muestra la tabla de etapas y marca el cuello de botella"""
+    total_msecs = sum(info['msecs'] for info in analysis.values()) or 1
+    print(f"   {'Etapa':<10} {'Elementos':>14} {'Filas/s':>12} {'% tiempo':>9} {'Backlog':>12}")
+    for stage in STAGE_NAMES:
+        info = analysis[stage]
+        marker = " 🐢" if info['slowest'] else ""
+        trend = ""
+        if info['backlog_growth'] > 0:
+            trend = f" ↑{info['backlog_growth']:,.0f}"
+        print(f"   {stage:<10} {info['elements']:>14,.0f} {info['throughput']:>12,.0f} "
+              f"{info['msecs'] / total_msecs:>9.1%} {info['backlog']:>12,.0f}{trend}{marker}")
+
+    slowest = next((stage for stage in STAGE_NAMES if analysis[stage]['slowest']), None)
+    if slowest:
+        growing = analysis[slowest]['backlog_growth'] > 0
+        status = "acumulando backlog" if growing else "sin backlog creciente"
+        print(f"   🐢 Etapa más lenta: {slowest} ({status})")
+
+def replay_metrics(source, job_id=None):
+    """Analiza una serie de instantáneas (p. ej. grabadas) sin esperar entre ellas"""
+    previous = None
+    while True:
+        snapshot = source.fetch(job_id)
+        if snapshot is None:
+            break
+        timestamp, metrics = snapshot
+        stages = extract_stage_metrics(metrics)
+        if previous is not None:
+            print(f"⏰ {datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')}")
+            analysis = analyze_bottleneck(previous[1], stages, timestamp - previous[0])
+            print_stage_analysis(analysis)
+            print("-" * 60)
+        previous = (timestamp, stages)
+
+def monitor_pipeline(project_id, dataset="cdo_challenge", table="raw_data", interval=30,
+                     metrics_source=None):
     """Monitorea el pipeline continuamente"""
     
     print("🔍 Iniciando monitoreo del pipeline...")
@@ -46,6 +226,7 @@ def monitor_pipeline(project_id, dataset="cdo_challenge", table="raw_data", inte
     
     start_time = datetime.now()
     last_row_count = 0
+    last_stage_metrics = None
     
     while True:
         try:
@@ -63,11 +244,23 @@ def monitor_pipeline(project_id, dataset="cdo_challenge", table="raw_data", inte
                     
                     print(f"⏰ {current_time.strftime('%H:%M:%S')} | 🆔 Job: {job_id[:8]}... | 📊 Estado: {state}")
                     
+                    # Métricas por etapa para localizar el cuello de botella
+                    if metrics_source and job_id != 'N/A':
+                        snapshot = metrics_source.fetch(job_id)
+                        if snapshot:
+                            timestamp, metrics = snapshot
+                            stages = extract_stage_metrics(metrics)
+                            if last_stage_metrics:
+                                analysis = analyze_bottleneck(last_stage_metrics[1], stages,
+                                                              timestamp - last_stage_metrics[0])
+                                print_stage_analysis(analysis)
+                            last_stage_metrics = (timestamp, stages)
+
                     # Obtener estadísticas de BigQuery
                     bq_stats = get_bigquery_stats(project_id, dataset, table)
                     if bq_stats:
-                        current_rows = bq_stats.get('numRows', 0)
-                        current_size = bq_stats.get('numBytes', 0)
+                        current_rows = int(bq_stats.get('numRows', 0))
+                        current_size = int(bq_stats.get('numBytes', 0))
                         
                         if current_rows > last_row_count:
                             rows_added = current_rows - last_row_count
@@ -94,14 +287,30 @@ def monitor_pipeline(project_id, dataset="cdo_challenge", table="raw_data", inte
 
 def main():
     parser = argparse.ArgumentParser(description="Monitor de Pipeline Dataflow")
-    parser.add_argument("--project", required=True, help="ID del proyecto de GCP")
+    parser.add_argument("--project", help="ID del proyecto de GCP")
     parser.add_argument("--dataset", default="cdo_challenge", help="Nombre del dataset")
     parser.add_argument("--table", default="raw_data", help="Nombre de la tabla")
     parser.add_argument("--interval", type=int, default=30, help="Intervalo de monitoreo en segundos")
+    parser.add_argument("--region", default=None, help="Región del job de Dataflow")
+    parser.add_argument("--no_stage_metrics", action="store_true", help="No consultar métricas por etapa")
+    parser.add_argument("--record_metrics", default=None, help="Guardar las instantáneas de métricas en este JSON")
+    parser.add_argument("--replay_metrics", default=None,
+                        help="Analizar instantáneas grabadas en JSON en lugar de consultar GCP")
     
     args = parser.parse_args()
     
-    monitor_pipeline(args.project, args.dataset, args.table, args.interval)
+    if args.replay_metrics:
+        replay_metrics(RecordedMetricsSource(args.replay_metrics))
+        return
+
+    if not args.project:
+        parser.error("--project es obligatorio salvo con --replay_metrics")
+
+    metrics_source = None
+    if not args.no_stage_metrics:
+        metrics_source = GcloudMetricsSource(args.project, args.region, args.record_metrics)
+
+    monitor_pipeline(args.project, args.dataset, args.table, args.interval, metrics_source)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+📤 Subida Concurrente de Shards a Cloud Storage
+🔗 Un único cliente con pool de conexiones compartido por todos los hilos
+🧩 Shards grandes como subida compuesta paralela (partes + compose)
+📊 Reporta el throughput de subida al finalizar
+"""
+
+import abc
+import argparse
+import glob
+import logging
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+MAX_COMPOSE_SOURCES = 32  # Límite de objetos por llamada a compose en GCS
+
+class _RangeReader:
+    """
+    Lector de archivo limitado a un rango de bytes (sin cargarlo en memoria)
+
+    tell() y seek() son relativos al inicio del rango: las subidas reanudables
+    de google-resumable-media (> 8 MB) los usan para fijar y reintentar offsets.
+    """
+
+    def __init__(self, path: str, start: int, length: int):
+        self._handle = open(path, 'rb')
+        self._start = start
+        self._length = length
+        self._position = 0
+        self._handle.seek(start)
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._length - self._position
+        if remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self._handle.read(size)
+        self._position += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._length
+        elif whence != os.SEEK_SET:
+            raise ValueError(f"whence inválido: {whence}")
+        if offset < 0:
+            raise ValueError(f"Posición negativa: {offset}")
+        self._position = min(offset, self._length)
+        self._handle.seek(self._start + self._position)
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StorageBackend(abc.ABC):
+    """Interfaz mínima de almacenamiento usada por el uploader"""
+
+    @abc.abstractmethod
+    def upload(self, local_path: str, name: str, start: int = 0, length: Optional[int] = None):
+        """Sube [start, start+length) del archivo local como el objeto name"""
+
+    @abc.abstractmethod
+    def compose(self, sources: List[str], name: str):
+        """Concatena los objetos sources en el objeto name"""
+
+    @abc.abstractmethod
+    def delete(self, name: str):
+        """Borra el objeto name"""
+
+class GCSBackend(StorageBackend):
+    """Backend de Cloud Storage con un cliente y pool HTTP compartidos"""
+
+    def __init__(self, bucket_name: str, project: Optional[str] = None, pool_size: int = 64):
+        from google.cloud import storage
+        from requests.adapters import HTTPAdapter
+
+        self.client = storage.Client(project=project)
+        # El pool por defecto (10 conexiones) limita las subidas concurrentes
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.client._http.mount('https://', adapter)
+        self.bucket = self.client.bucket(bucket_name)
+
+    def upload(self, local_path: str, name: str, start: int = 0, length: Optional[int] = None):
+        if length is None:
+            length = os.path.getsize(local_path) - start
+        blob = self.bucket.blob(name)
+        with _RangeReader(local_path, start, length) as reader:
+            blob.upload_from_file(reader, size=length, rewind=False)
+
+    def compose(self, sources: List[str], name: str):
+        self.bucket.blob(name).compose([self.bucket.blob(source) for source in sources])
+
+    def delete(self, name: str):
+        self.bucket.blob(name).delete()
+
+class LocalBackend(StorageBackend):
+    """Backend de sistema de archivos local (sustituto de GCS para pruebas)"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def _path(self, name: str) -> str:
+        path = os.path.join(self.root_dir, name)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return path
+
+    def upload(self, local_path: str, name: str, start: int = 0, length: Optional[int] = None):
+        if length is None:
+            length = os.path.getsize(local_path) - start
+        with _RangeReader(local_path, start, length) as reader, open(self._path(name), 'wb') as target:
+            shutil.copyfileobj(reader, target, 8 * MB)
+
+    def compose(self, sources: List[str], name: str):
+        tmp_path = self._path(name) + '.composing'
+        with open(tmp_path, 'wb') as target:
+            for source in sources:
+                with open(self._path(source), 'rb') as part:
+                    shutil.copyfileobj(part, target, 8 * MB)
+        os.replace(tmp_path, self._path(name))
+
+    def delete(self, name: str):
+        os.remove(self._path(name))
+
+class ParallelUploader:
+    """Sube muchos shards en paralelo con un número acotado de peticiones en vuelo"""
+
+    def __init__(self, backend: StorageBackend, max_in_flight: int = 32,
+                 composite_threshold: int = 150 * MB, part_size: int = 64 * MB,
+                 max_attempts: int = 4, retry_base_seconds: float = 1.0):
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.composite_threshold = composite_threshold
+        self.part_size = part_size
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self._lock = threading.Lock()
+        self._uploaded_bytes = 0
+        self._retries = 0
+
+    def _with_retries(self, description: str, fn):
+        """Reintenta fn con backoff exponencial y jitter (las subidas y compose son idempotentes)"""
+        for attempt in range(self.max_attempts):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                delay = random.uniform(0, self.retry_base_seconds * (2 ** attempt))
+                logger.warning(f"⚠️  {description} falló ({e}); reintento {attempt + 1} en {delay:.1f}s")
+                with self._lock:
+                    self._retries += 1
+                time.sleep(delay)
+
+    def _upload_range(self, local_path: str, name: str, start: int, length: int):
+        self._with_retries(f"Subida de {name}",
+                           lambda: self.backend.upload(local_path, name, start, length))
+        with self._lock:
+            self._uploaded_bytes += length
+
+    def _discard(self, names: List[str]):
+        """Borra objetos intermedios sin ocultar el error original"""
+        for name in names:
+            try:
+                self.backend.delete(name)
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo borrar el objeto huérfano {name}: {e}")
+
+    def _compose(self, parts: List[str], name: str):
+        """Compone en niveles de hasta 32 objetos y borra las partes intermedias"""
+        pending = list(parts)  # Objetos intermedios que aún existen
+        try:
+            level = 0
+            while len(parts) > MAX_COMPOSE_SOURCES:
+                grouped = []
+                for index in range(0, len(parts), MAX_COMPOSE_SOURCES):
+                    group_name = f"{name}.compose-{level}-{index // MAX_COMPOSE_SOURCES:04d}"
+                    sources = parts[index:index + MAX_COMPOSE_SOURCES]
+                    self._with_retries(f"Compose de {group_name}",
+                                       lambda: self.backend.compose(sources, group_name))
+                    grouped.append(group_name)
+                    pending.append(group_name)
+                for part in parts:
+                    self.backend.delete(part)
+                    pending.remove(part)
+                parts = grouped
+                level += 1
+            self._with_retries(f"Compose de {name}", lambda: self.backend.compose(parts, name))
+        except Exception:
+            logger.error(f"❌ Falló la composición de {name}; se borran {len(pending)} objetos intermedios")
+            self._discard(pending)
+            raise
+        self._discard(parts)
+
+    def _abort(self, futures, composite_jobs, compose_futures):
+        """Cancela lo pendiente y borra las partes de los archivos que no llegaron a componerse"""
+        pending = futures + [future for _, _, part_futures in composite_jobs for future in part_futures]
+        pending += list(compose_futures.values())
+        for future in pending:
+            future.cancel()
+        # Las subidas en curso terminan antes de decidir qué partes existen
+        wait(pending)
+        for name, parts, part_futures in composite_jobs:
+            compose_future = compose_futures.get(name)
+            if compose_future is not None and not compose_future.cancelled():
+                continue  # _compose ya borró sus partes, con éxito o sin él
+            self._discard([part for part, future in zip(parts, part_futures)
+                           if not future.cancelled() and future.exception() is None])
+
+    def upload_files(self, files: List[Tuple[str, str]]) -> Dict[str, float]:
+        """Sube [(ruta_local, nombre_destino)] y devuelve estadísticas de throughput"""
+        start_time = time.time()
+        self._uploaded_bytes = 0
+        self._retries = 0
+        composite_jobs = []
+        part_count = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = []
+            for local_path, name in files:
+                size = os.path.getsize(local_path)
+                if size <= self.composite_threshold:
+                    futures.append(executor.submit(self._upload_range, local_path, name, 0, size))
+                    continue
+
+                parts = []
+                part_futures = []
+                for index, offset in enumerate(range(0, size, self.part_size)):
+                    part_name = f"{name}.part-{index:05d}"
+                    length = min(self.part_size, size - offset)
+                    part_futures.append(executor.submit(self._upload_range, local_path, part_name, offset, length))
+                    parts.append(part_name)
+                composite_jobs.append((name, parts, part_futures))
+                part_count += len(parts)
+
+            compose_futures = {}
+            try:
+                # Cada archivo grande se compone en cuanto terminan sus partes
+                for name, parts, part_futures in composite_jobs:
+                    error = next((future.exception() for future in part_futures if future.exception()), None)
+                    if error is not None:
+                        raise error
+                    compose_futures[name] = executor.submit(self._compose, parts, name)
+
+                for future in futures + list(compose_futures.values()):
+                    future.result()
+            except Exception:
+                self._abort(futures, composite_jobs, compose_futures)
+                raise
+
+        duration = max(time.time() - start_time, 1e-9)
+        return {
+            'files': len(files),
+            'composite_files': len(composite_jobs),
+            'parts': part_count,
+            'bytes': self._uploaded_bytes,
+            'retries': self._retries,
+            'seconds': duration,
+            'mb_per_second': self._uploaded_bytes / MB / duration,
+        }
+
+def parse_destination(destination: str) -> Tuple[StorageBackend, str]:
+    """Crea el backend adecuado para gs://bucket/prefijo o un directorio local"""
+    if destination.startswith('gs://'):
+        bucket, _, prefix = destination[len('gs://'):].partition('/')
+        return GCSBackend(bucket), prefix.strip('/')
+    return LocalBackend(destination), ''
+
+def main():
+    parser = argparse.ArgumentParser(description="Subida concurrente de shards a Cloud Storage")
+    parser.add_argument("--source", required=True, help="Directorio o patrón glob de shards locales")
+    parser.add_argument("--destination", required=True, help="gs://bucket/prefijo o directorio local")
+    parser.add_argument("--max_in_flight", type=int, default=32, help="Peticiones de subida simultáneas")
+    parser.add_argument("--composite_threshold_mb", type=int, default=150,
+                        help="Tamaño a partir del cual se usa subida compuesta paralela")
+    parser.add_argument("--part_size_mb", type=int, default=64, help="Tamaño de cada parte compuesta")
+    parser.add_argument("--max_attempts", type=int, default=4,
+                        help="Intentos por parte o compose antes de abortar")
+
+    args = parser.parse_args()
+
+    pattern = os.path.join(args.source, '*') if os.path.isdir(args.source) else args.source
+    paths = sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+    if not paths:
+        print(f"❌ No se encontraron archivos en {args.source}")
+        return 1
+
+    backend, prefix = parse_destination(args.destination)
+    files = [(path, '/'.join(filter(None, [prefix, os.path.basename(path)]))) for path in paths]
+    total_size = sum(os.path.getsize(path) for path in paths)
+
+    print(f"📤 Subiendo {len(files)} shards ({total_size / (1024**3):.2f} GB) a {args.destination}")
+    print(f"🔀 Peticiones en vuelo: {args.max_in_flight}")
+
+    uploader = ParallelUploader(backend, args.max_in_flight,
+                                args.composite_threshold_mb * MB, args.part_size_mb * MB,
+                                args.max_attempts)
+    stats = uploader.upload_files(files)
+
+    print(f"✅ {stats['files']} archivos ({stats['composite_files']} compuestos, {stats['parts']} partes, "
+          f"{stats['retries']} reintentos)")
+    print(f"⏱️  Tiempo: {stats['seconds']:.2f} segundos")
+    print(f"🚀 Throughput: {stats['mb_per_second']:.1f} MB/s")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+🔥 Profiling Opcional por DoFn con Salida de Flamegraph
+🎯 Envuelve cada DoFn del pipeline y muestrea una fracción configurable de bundles
+📉 Muestreo de pilas de bajo overhead (hilo muestreador, sin instrumentar llamadas)
+📊 Agrega por etapa: pilas colapsadas, flamegraph SVG y tabla de funciones calientes
+"""
+
+import argparse
+import html
+import logging
+import os
+import random
+import sys
+import threading
+import uuid
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import apache_beam as beam
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.options.pipeline_options import PipelineOptions
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FOLDED_SUFFIX = '.folded'
+
+class DoFnProfilingOptions(PipelineOptions):
+    """Opciones de profiling por DoFn (desactivado si no se indica --dofn_profile_dir)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--dofn_profile_dir', default=None,
+                            help='Directorio local o gs:// donde guardar los perfiles por etapa')
+        parser.add_argument('--dofn_profile_sample_rate', type=float, default=1.0,
+                            help='Fracción de bundles a perfilar (0-1)')
+        parser.add_argument('--dofn_profile_interval_ms', type=float, default=5.0,
+                            help='Intervalo de muestreo de pilas en milisegundos')
+
+def _frame_label(frame) -> str:
+    """Etiqueta de un frame en formato apto para pilas colapsadas"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+class StackSampler:
+    """Muestrea periódicamente la pila de un hilo desde un hilo auxiliar"""
+
+    def __init__(self, interval_ms: float = 5.0, max_depth: int = 128):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self, thread_id: Optional[int] = None):
+        self._thread_id = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(labels))] += 1
+
+def write_folded(path: str, stacks: Counter):
+    """Escribe pilas colapsadas ("a;b;c conteo") en disco local o GCS"""
+    with FileSystems.create(path) as handle:
+        for stack, count in stacks.most_common():
+            handle.write(f"{stack} {count}\n".encode('utf-8'))
+
+def read_folded(path: str) -> Counter:
+    """Lee un archivo de pilas colapsadas"""
+    stacks = Counter()
+    with FileSystems.open(path) as handle:
+        for line in handle.read().decode('utf-8').splitlines():
+            stack, _, count = line.rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+@contextmanager
+def profile_stage(stage: str, profile_dir: Optional[str], interval_ms: float = 5.0):
+    """Perfila el hilo actual durante el bloque (modo local, sin Beam)"""
+    if not profile_dir:
+        yield
+        return
+    sampler = StackSampler(interval_ms)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        if sampler.stacks:
+            write_folded(FileSystems.join(profile_dir, f"{stage}.{os.getpid()}.{uuid.uuid4().hex[:8]}{FOLDED_SUFFIX}"),
+                         sampler.stacks)
+
+class ProfiledDoFn(beam.DoFn):
+    """Envuelve un DoFn y perfila una fracción de sus bundles"""
+
+    def __init__(self, fn: beam.DoFn, stage: str, profile_dir: str,
+                 sample_rate: float = 1.0, interval_ms: float = 5.0):
+        self._fn = fn
+        self._stage = stage
+        self._profile_dir = profile_dir
+        self._sample_rate = sample_rate
+        self._interval_ms = interval_ms
+
+    def setup(self):
+        self._stacks = Counter()
+        self._sampler = None
+        self._output_path = FileSystems.join(
+            self._profile_dir, f"{self._stage}.{os.getpid()}.{uuid.uuid4().hex[:8]}{FOLDED_SUFFIX}")
+        self._fn.setup()
+
+    def start_bundle(self):
+        if random.random() < self._sample_rate:
+            self._sampler = StackSampler(self._interval_ms)
+            self._sampler.start()
+        self._fn.start_bundle()
+
+    def process(self, element, *args, **kwargs):
+        return self._fn.process(element, *args, **kwargs)
+
+    def finish_bundle(self):
+        result = self._fn.finish_bundle()
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._stacks.update(self._sampler.stacks)
+            self._sampler = None
+            # Se reescribe el acumulado del worker para no depender de teardown
+            if self._stacks:
+                write_folded(self._output_path, self._stacks)
+        return result
+
+    def teardown(self):
+        self._fn.teardown()
+
+def profiled(fn: beam.DoFn, stage: str, options: PipelineOptions) -> beam.DoFn:
+    """Devuelve el DoFn envuelto si el profiling está activo en las opciones"""
+    profiling_options = options.view_as(DoFnProfilingOptions)
+    if not profiling_options.dofn_profile_dir:
+        return fn
+    logger.info(f"🔥 Profiling activo para '{stage}' "
+                f"({profiling_options.dofn_profile_sample_rate:.0%} de bundles)")
+    return ProfiledDoFn(fn, stage, profiling_options.dofn_profile_dir,
+                        profiling_options.dofn_profile_sample_rate,
+                        profiling_options.dofn_profile_interval_ms)
+
+def merge_profiles(profile_dir: str) -> Dict[str, Counter]:
+    """Agrega los perfiles de todos los workers por etapa"""
+    pattern = FileSystems.join(profile_dir, f"*{FOLDED_SUFFIX}")
+    merged = {}
+    for metadata in FileSystems.match([pattern])[0].metadata_list:
+        name = os.path.basename(metadata.path)
+        parts = name[:-len(FOLDED_SUFFIX)].split('.')
+        if len(parts) < 3:
+            continue  # Salidas ya agregadas de un reporte previo
+        stage = '.'.join(parts[:-2])
+        merged.setdefault(stage, Counter()).update(read_folded(metadata.path))
+    return merged
+
+def hot_functions(stacks: Counter, top_n: int = 20) -> List[Tuple[str, int, int]]:
+    """Tabla (función, muestras propias, muestras totales) ordenada por propias"""
+    self_samples = Counter()
+    total_samples = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        self_samples[frames[-1]] += count
+        for frame in set(frames):
+            total_samples[frame] += count
+    return [(frame, samples, total_samples[frame]) for frame, samples in self_samples.most_common(top_n)]
+
+def render_flamegraph(stacks: Counter, title: str, width: int = 1200, row_height: int = 18) -> str:
+    """Genera un flamegraph SVG autocontenido a partir de pilas colapsadas"""
+    root = {'children': {}, 'count': 0}
+    for stack, count in stacks.items():
+        node = root
+        node['count'] += count
+        for frame in stack.split(';'):
+            node = node['children'].setdefault(frame, {'children': {}, 'count': 0})
+            node['count'] += count
+
+    total = max(root['count'], 1)
+    rects = []
+    max_depth = 0
+
+    def walk(node, x, depth):
+        nonlocal max_depth
+        max_depth = max(max_depth, depth)
+        for frame, child in sorted(node['children'].items()):
+            child_width = child['count'] / total * width
+            if child_width >= 0.5:
+                rects.append((frame, x, depth, child_width, child['count']))
+                walk(child, x, depth + 1)
+            x += child_width
+
+    walk(root, 0.0, 0)
+    height = (max_depth + 2) * row_height + 30
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'font-family="monospace" font-size="11">',
+             f'<text x="5" y="18" font-size="14">{html.escape(title)} ({total:,} muestras)</text>']
+    for frame, x, depth, rect_width, count in rects:
+        y = height - (depth + 1) * row_height
+        hue = 20 + (zlib.crc32(frame.encode('utf-8')) % 40)
+        label = html.escape(frame)
+        text = label[:int(rect_width / 7)] if rect_width > 21 else ''
+        parts.append(f'<g><title>{label} ({count:,} muestras, {count / total:.1%})</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{rect_width:.1f}" height="{row_height - 1}" '
+                     f'fill="hsl({hue},90%,60%)"/>'
+                     f'<text x="{x + 3:.1f}" y="{y + row_height - 5}">{text}</text></g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def write_report(profile_dir: str, output_dir: Optional[str] = None, top_n: int = 20) -> Dict[str, Counter]:
+    """Escribe por etapa el .folded agregado, el SVG y muestra la tabla de funciones calientes"""
+    output_dir = output_dir or profile_dir
+    merged = merge_profiles(profile_dir)
+    if not merged:
+        print(f"⚠️  No se encontraron perfiles en {profile_dir}")
+        return merged
+
+    if not output_dir.startswith('gs://'):
+        os.makedirs(output_dir, exist_ok=True)
+
+    for stage, stacks in sorted(merged.items()):
+        write_folded(FileSystems.join(output_dir, f"{stage}{FOLDED_SUFFIX}"), stacks)
+        with FileSystems.create(FileSystems.join(output_dir, f"{stage}.svg")) as handle:
+            handle.write(render_flamegraph(stacks, stage).encode('utf-8'))
+
+        total = sum(stacks.values())
+        print(f"🔥 Etapa: {stage} ({total:,} muestras)")
+        print(f"   {'Propio':>8} {'Total':>8}  Función")
+        for frame, own, cumulative in hot_functions(stacks, top_n):
+            print(f"   {own / total:>8.1%} {cumulative / total:>8.1%}  {frame}")
+        print("-" * 60)
+
+    return merged
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte de profiling por etapa del pipeline")
+    parser.add_argument("--profile_dir", required=True, help="Directorio con los perfiles de los workers")
+    parser.add_argument("--output_dir", default=None, help="Directorio de salida (por defecto profile_dir)")
+    parser.add_argument("--top", type=int, default=20, help="Número de funciones calientes a mostrar")
+
+    args = parser.parse_args()
+
+    write_report(args.profile_dir, args.output_dir, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+🚦 Limitador de Tasa Compartido para Sinks con Cuota
+🪣 Token bucket por destino, compartido por todos los hilos del proceso
+📉 AIMD: aumento aditivo sostenido, reducción multiplicativa ante throttling
+🎲 Backoff exponencial con jitter en lugar de reintentos a ciegas
+📊 Eventos de throttling y tasa efectiva exportados como métricas de Beam
+✍️ Inserciones en streaming que se limitan dentro del propio escritor
+"""
+
+import argparse
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import apache_beam as beam
+from apache_beam.io.gcp.bigquery import BigQueryDisposition
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import DebugOptions, PipelineOptions, WorkerOptions
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METRICS_NAMESPACE = 'rate_limiter'
+DEFAULT_MACHINE_VCPUS = 1  # Dataflow batch usa n1-standard-1 si no se indica la máquina
+SHARED_CORE_VCPUS = {'micro': 2, 'small': 2, 'medium': 2}  # e2-micro/small/medium
+THROTTLE_MARKERS = ('quotaexceeded', 'ratelimitexceeded', 'resource_exhausted', 'too many requests',
+                    'exceeded rate limits', 'quota exceeded')
+
+class RateLimitOptions(PipelineOptions):
+    """Opciones del limitador de tasa del sink (desactivado si no se indica el techo)"""
+
+    @classmethod
+    def _add_argparse_args(cls, parser):
+        parser.add_argument('--sink_rows_per_second', type=float, default=None,
+                            help='Techo total de filas/s hacia el sink (se reparte entre procesos SDK)')
+
+class ThrottledError(Exception):
+    """Respuesta de throttling (usada por el simulador local)"""
+
+def is_throttle_error(error: Exception) -> bool:
+    """Detecta respuestas de cuota/throttling (HTTP 429, 403 rateLimitExceeded, RESOURCE_EXHAUSTED)"""
+    if isinstance(error, ThrottledError):
+        return True
+    if getattr(error, 'code', None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+class TokenBucket:
+    """Token bucket thread-safe; acquire bloquea hasta que hay tokens"""
+
+    def __init__(self, rate: float, burst_seconds: float = 1.0):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self.tokens = rate * burst_seconds
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        capacity = self.rate * self.burst_seconds
+        self.tokens = min(capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.tokens = min(self.tokens, rate * self.burst_seconds)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Consume tokens (esperando si hace falta); devuelve los segundos esperados"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                # Un costo mayor que la ráfaga se permite con deuda para no bloquear para siempre
+                if self.tokens >= min(tokens, self.rate * self.burst_seconds):
+                    self.tokens -= tokens
+                    return waited
+                delay = (min(tokens, self.rate * self.burst_seconds) - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class AdaptiveRateLimiter:
+    """Token bucket con ajuste AIMD según las respuestas del destino"""
+
+    def __init__(self, destination: str, initial_rate: float, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, increase_per_second: Optional[float] = None,
+                 decrease_factor: float = 0.7, cooldown_seconds: float = 1.0, burst_seconds: float = 1.0):
+        self.destination = destination
+        self.min_rate = min_rate or max(initial_rate * 0.05, 1.0)
+        self.max_rate = max_rate or initial_rate * 4
+        # Por defecto recupera un 5% de la tasa inicial por segundo sin throttling
+        self.increase_per_second = increase_per_second or initial_rate * 0.05
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.bucket = TokenBucket(initial_rate, burst_seconds)
+        self._lock = threading.Lock()
+        self._last_increase = time.monotonic()
+        self._last_decrease = 0.0
+        self._window_start = time.monotonic()
+        self._window_tokens = 0.0
+        self.throttle_events = 0
+
+        self.throttle_counter = Metrics.counter(METRICS_NAMESPACE, 'throttle_events')
+        self.wait_msecs = Metrics.counter(METRICS_NAMESPACE, 'wait_msecs')
+        self.rate_gauge = Metrics.gauge(METRICS_NAMESPACE, 'current_rate')
+        self.effective_rate = Metrics.distribution(METRICS_NAMESPACE, 'effective_rate')
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self, cost: float = 1.0):
+        waited = self.bucket.acquire(cost)
+        if waited:
+            self.wait_msecs.inc(int(waited * 1000))
+
+    def on_success(self, cost: float = 1.0):
+        """Aumento aditivo proporcional al tiempo transcurrido sin throttling"""
+        with self._lock:
+            now = time.monotonic()
+            self._window_tokens += cost
+            if now - self._window_start >= 1.0:
+                self.effective_rate.update(int(self._window_tokens / (now - self._window_start)))
+                self._window_start, self._window_tokens = now, 0.0
+            if now - self._last_decrease < self.cooldown_seconds:
+                return
+            new_rate = min(self.max_rate, self.rate + self.increase_per_second * (now - self._last_increase))
+            self._last_increase = now
+        if new_rate != self.rate:
+            self.bucket.set_rate(new_rate)
+            self.rate_gauge.set(int(new_rate))
+
+    def on_throttle(self):
+        """Reducción multiplicativa (una por ventana de enfriamiento aunque fallen varios hilos)"""
+        with self._lock:
+            self.throttle_events += 1
+            self.throttle_counter.inc()
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown_seconds:
+                return
+            self._last_decrease = self._last_increase = now
+            new_rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.bucket.set_rate(new_rate)
+        self.rate_gauge.set(int(new_rate))
+
+_registry: Dict[str, AdaptiveRateLimiter] = {}
+_registry_lock = threading.Lock()
+
+def get_limiter(destination: str, initial_rate: float, **kwargs) -> AdaptiveRateLimiter:
+    """Limitador compartido por destino dentro del proceso (todas las instancias de DoFn)"""
+    with _registry_lock:
+        if destination not in _registry:
+            _registry[destination] = AdaptiveRateLimiter(destination, initial_rate, **kwargs)
+        return _registry[destination]
+
+def backoff_delay(attempt: int, base_seconds: float = 0.5, max_seconds: float = 30.0) -> float:
+    """Backoff exponencial con jitter completo (evita reintentos sincronizados)"""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+def rate_limited_call(limiter: AdaptiveRateLimiter, fn: Callable, cost: float = 1.0, max_attempts: int = 8,
+                      base_seconds: float = 0.5, max_seconds: float = 30.0):
+    """Ejecuta fn respetando el limitador; reintenta solo errores de throttling"""
+    for attempt in range(max_attempts):
+        limiter.acquire(cost)
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_throttle_error(e):
+                raise
+            limiter.on_throttle()
+            if attempt == max_attempts - 1:
+                raise
+            time.sleep(backoff_delay(attempt, base_seconds, max_seconds))
+            continue
+        limiter.on_success(cost)
+        return result
+
+def machine_vcpus(machine_type: Optional[str]) -> int:
+    """vCPUs de un tipo de máquina de GCE (n1-standard-4, custom-8-30720, e2-medium, ...)"""
+    if not machine_type:
+        return DEFAULT_MACHINE_VCPUS
+    name = machine_type.rsplit('/', 1)[-1]
+    match = re.search(r'custom-(\d+)-\d+', name) or re.search(r'-(\d+)$', name)
+    if match:
+        return int(match.group(1))
+    return SHARED_CORE_VCPUS.get(name.rsplit('-', 1)[-1], DEFAULT_MACHINE_VCPUS)
+
+def harness_processes(options: PipelineOptions) -> int:
+    """Procesos SDK por worker: Dataflow arranca uno por vCPU salvo con no_use_multiple_sdk_containers"""
+    experiments = options.view_as(DebugOptions).experiments or []
+    if 'no_use_multiple_sdk_containers' in experiments:
+        return 1
+    return machine_vcpus(options.view_as(WorkerOptions).machine_type)
+
+def per_process_rate(options: PipelineOptions) -> Optional[float]:
+    """
+    Techo total de --sink_rows_per_second repartido entre todos los procesos SDK
+
+    El limitador es por proceso (get_limiter), y cada worker ejecuta un proceso
+    por vCPU: el techo se divide entre workers × procesos para que la suma no lo exceda.
+    """
+    total = options.view_as(RateLimitOptions).sink_rows_per_second
+    if not total:
+        return None
+    worker_options = options.view_as(WorkerOptions)
+    workers = max(worker_options.max_num_workers or worker_options.num_workers or 1, 1)
+    return total / (workers * harness_processes(options))
+
+class StreamingInsertClient:
+    """Inserciones en streaming (insertAll) con el cliente de google-cloud-bigquery"""
+
+    def __init__(self):
+        from google.cloud import bigquery
+
+        self.bigquery = bigquery
+        self.client = bigquery.Client()
+
+    def prepare(self, table: str, schema: Optional[str], create_disposition: str, write_disposition: str):
+        """Aplica las disposiciones una vez antes de insertar"""
+        from google.api_core.exceptions import NotFound
+
+        table = table.replace(':', '.')
+        try:
+            existing = self.client.get_table(table)
+        except NotFound:
+            if create_disposition == BigQueryDisposition.CREATE_NEVER:
+                raise RuntimeError(f"La tabla {table} no existe y la disposición es CREATE_NEVER")
+            if not schema:
+                raise RuntimeError(f"La tabla {table} no existe y sin esquema no se puede crear para insertar")
+            fields = [self.bigquery.SchemaField(*field.split(':', 1)) for field in schema.split(',')]
+            self.client.create_table(self.bigquery.Table(table, schema=fields))
+            return
+        if write_disposition == BigQueryDisposition.WRITE_TRUNCATE:
+            self.client.query(f"TRUNCATE TABLE `{table}`").result()
+        elif write_disposition == BigQueryDisposition.WRITE_EMPTY:
+            if next(iter(self.client.list_rows(existing, max_results=1)), None) is not None:
+                raise RuntimeError(f"La tabla {table} no está vacía y la disposición es WRITE_EMPTY")
+
+    def column_names(self, table: str) -> List[str]:
+        return [field.name for field in self.client.get_table(table.replace(':', '.')).schema]
+
+    def insert(self, table: str, rows: List[dict]) -> List[dict]:
+        """Inserta un lote; lanza ante errores HTTP (429/403 de cuota) y devuelve los errores por fila"""
+        return self.client.insert_rows_json(table.replace(':', '.'), rows, row_ids=[None] * len(rows),
+                                            ignore_unknown_values=True)
+
+class _PacedInsertFn(beam.DoFn):
+    """
+    Inserta lotes de filas con el limitador AIMD compartido del proceso
+
+    Al ser el propio escritor, ve las respuestas de cuota de cada inserción:
+    ante un 429 la tasa baja de forma multiplicativa y se recupera de forma
+    aditiva hasta el techo del proceso (nunca por encima).
+    """
+
+    def __init__(self, table: str, schema: Optional[str], rows_per_second: float,
+                 client_factory: Callable[[], StreamingInsertClient] = StreamingInsertClient):
+        self.table = table
+        self.schema = schema
+        self.rows_per_second = rows_per_second
+        self.client_factory = client_factory
+        self.rows_written = Metrics.counter(METRICS_NAMESPACE, 'rows_written')
+        self.rejected_rows = Metrics.counter(METRICS_NAMESPACE, 'rejected_rows')
+
+    def setup(self):
+        self._client = self.client_factory()
+        self._limiter = get_limiter(f"streaming_insert:{self.table}", self.rows_per_second,
+                                    max_rate=self.rows_per_second)
+        self._names = None
+
+    def _to_dict(self, row) -> dict:
+        if isinstance(row, dict):
+            return row
+        # Los campos vacíos se omiten (NULL), como en una carga CSV
+        return {name: value for name, value in zip(self._names, row) if value not in ('', None)}
+
+    def process(self, batch, table_ready):
+        if self._names is None:
+            self._names = ([field.split(':', 1)[0] for field in self.schema.split(',')] if self.schema
+                           else self._client.column_names(self.table))
+        rows = [self._to_dict(row) for row in batch]
+        errors = rate_limited_call(self._limiter, lambda: self._client.insert(self.table, rows), len(rows))
+        rejected = len({error.get('index') for error in errors or []})
+        if rejected:
+            logger.warning(f"⚠️  {rejected} filas rechazadas por {self.table}: {errors[0]}")
+            self.rejected_rows.inc(rejected)
+        self.rows_written.inc(len(rows) - rejected)
+
+class PacedStreamingInserts(beam.PTransform):
+    """
+    Sustituto de WriteToBigQuery(STREAMING_INSERTS) que limita la tasa dentro del escritor
+
+    Un limitador antes de WriteToBigQuery no sirve: su ReshufflePerKey interno
+    rompe la fusión y StreamInsertRows corre a su propio ritmo. Aquí cada lote
+    se inserta desde el DoFn que mantiene el limitador.
+    """
+
+    def __init__(self, table: str, schema: Optional[str], rows_per_second: float,
+                 create_disposition: str = BigQueryDisposition.CREATE_IF_NEEDED,
+                 write_disposition: str = BigQueryDisposition.WRITE_APPEND,
+                 batch_size: int = 500, client_factory: Callable[[], StreamingInsertClient] = StreamingInsertClient):
+        super().__init__()
+        self.table = table
+        self.schema = schema
+        self.rows_per_second = rows_per_second
+        self.create_disposition = create_disposition
+        self.write_disposition = write_disposition
+        self.batch_size = batch_size
+        self.client_factory = client_factory
+
+    def expand(self, rows):
+        client_factory = self.client_factory
+        # Las disposiciones (crear/truncar) se aplican una vez antes de cualquier inserción
+        prepared = (
+            rows.pipeline
+            | 'PrepareTable' >> beam.Create([None])
+            | 'ApplyDispositions' >> beam.Map(
+                lambda _, table, schema, create, write: client_factory().prepare(table, schema, create, write),
+                self.table, self.schema, self.create_disposition, self.write_disposition)
+        )
+        return (
+            rows
+            | 'BatchRows' >> beam.BatchElements(min_batch_size=1, max_batch_size=self.batch_size)
+            | 'InsertRows' >> beam.ParDo(_PacedInsertFn(self.table, self.schema, self.rows_per_second,
+                                                        self.client_factory), beam.pvalue.AsSingleton(prepared))
+        )
+
+class QuotaServer:
+    """Destino simulado con cuota por segundo: rechaza lo que excede la ventana actual"""
+
+    def __init__(self, rows_per_second: float):
+        self.rows_per_second = rows_per_second
+        self._lock = threading.Lock()
+        self._window = int(time.monotonic())
+        self._used = 0.0
+        self.accepted = 0
+        self.rejected = 0
+
+    def insert(self, rows: int):
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._used = window, 0.0
+            if self._used + rows > self.rows_per_second:
+                self.rejected += 1
+                raise ThrottledError("quotaExceeded: too many rows per second")
+            self._used += rows
+            self.accepted += rows
+
+def simulate(quota: float, workers: int, batch_rows: int, seconds: float, limited: bool) -> Dict[str, float]:
+    """Workers en hilos insertando lotes contra una cuota, con o sin limitador"""
+    server = QuotaServer(quota)
+    stop = time.monotonic() + seconds
+    errors = [0]
+    errors_lock = threading.Lock()
+    limiter = AdaptiveRateLimiter('simulado', initial_rate=quota * 1.5, max_rate=quota * 2) if limited else None
+
+    def worker():
+        while time.monotonic() < stop:
+            try:
+                if limiter:
+                    rate_limited_call(limiter, lambda: server.insert(batch_rows), batch_rows, max_attempts=1)
+                else:
+                    server.insert(batch_rows)
+            except ThrottledError:
+                with errors_lock:
+                    errors[0] += 1
+                # Reintento a ciegas del runner: espera fija corta
+                time.sleep(0.01 if not limiter else 0)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start_time = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.monotonic() - start_time
+    return {
+        'rows_per_second': server.accepted / duration,
+        'throttle_errors': server.rejected,
+        'utilization': server.accepted / duration / quota,
+        'final_rate': limiter.rate if limiter else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación de cuota: reintentos a ciegas vs limitador AIMD")
+    parser.add_argument("--quota", type=float, default=20000, help="Cuota del destino en filas/s")
+    parser.add_argument("--workers", type=int, default=32, help="Hilos escritores simulados")
+    parser.add_argument("--batch_rows", type=int, default=500, help="Filas por inserción")
+    parser.add_argument("--seconds", type=float, default=10, help="Duración de cada simulación")
+
+    args = parser.parse_args()
+    print(f"🚦 Cuota {args.quota:,.0f} filas/s, {args.workers} escritores, lotes de {args.batch_rows} filas")
+    print(f"{'Modo':<14} {'Filas/s':>12} {'Uso cuota':>10} {'Throttling':>11} {'Tasa final':>11}")
+    print("-" * 62)
+    for name, limited in (('sin limitador', False), ('AIMD', True)):
+        result = simulate(args.quota, args.workers, args.batch_rows, args.seconds, limited)
+        final_rate = f"{result['final_rate']:,.0f}" if result['final_rate'] else 'N/A'
+        print(f"{name:<14} {result['rows_per_second']:>12,.0f} {result['utilization']:>9.0%} "
+              f"{result['throttle_errors']:>11,} {final_rate:>11}")
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+🗃️ Historial de Ejecuciones con Detección de Regresiones
+💾 Guarda configuración, tamaño de entrada, timeline por etapa y duración en SQLite
+📉 Compara la última ejecución con ejecuciones de configuración similar
+🚨 Marca regresiones de throughput por encima de un umbral
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_DB_PATH = os.environ.get('RUN_HISTORY_DB', os.path.expanduser('~/.ultra_fast_loader/run_history.db'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    script TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    total_seconds REAL NOT NULL,
+    input_bytes INTEGER,
+    status TEXT NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stage_samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    timestamp REAL NOT NULL,
+    stage TEXT NOT NULL,
+    elements REAL NOT NULL,
+    throughput REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_script ON runs(script, started_at);
+"""
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Abre (y crea si hace falta) la base de datos del historial"""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+def get_input_size(path: str) -> Optional[int]:
+    """Tamaño en bytes de un archivo local o de un objeto/prefijo gs://"""
+    if not path.startswith('gs://'):
+        return os.path.getsize(path) if os.path.exists(path) else None
+    try:
+        result = subprocess.run(['gsutil', 'du', '-s', path], capture_output=True, text=True, timeout=60)
+        return int(result.stdout.split()[0]) if result.returncode == 0 else None
+    except Exception:
+        return None
+
+def parse_config(items: List[str]) -> Dict[str, str]:
+    """Convierte ['clave=valor', ...] en diccionario"""
+    config = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        if key:
+            config[key.strip().lstrip('-')] = value.strip()
+    return config
+
+def timeline_from_metrics(path: str) -> List[tuple]:
+    """Extrae (timestamp, etapa, elementos, filas/s) de métricas grabadas por monitor_pipeline.py"""
+    from monitor_pipeline import RecordedMetricsSource, analyze_bottleneck, extract_stage_metrics
+
+    source = RecordedMetricsSource(path)
+    samples = []
+    previous = None
+    while True:
+        snapshot = source.fetch(None)
+        if snapshot is None:
+            break
+        timestamp, metrics = snapshot
+        stages = extract_stage_metrics(metrics)
+        if previous is not None:
+            analysis = analyze_bottleneck(previous[1], stages, timestamp - previous[0])
+            for stage, info in analysis.items():
+                samples.append((timestamp, stage, info['elements'], info['throughput']))
+        previous = (timestamp, stages)
+    return samples
+
+def record_run(connection: sqlite3.Connection, script: str, started_at: float, ended_at: float,
+               config: Dict[str, str], input_bytes: Optional[int] = None, status: str = 'SUCCESS',
+               timeline: Optional[List[tuple]] = None) -> int:
+    """Registra una ejecución y su timeline por etapa; devuelve el id"""
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (script, started_at, ended_at, total_seconds, input_bytes, status, config) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (script, started_at, ended_at, ended_at - started_at, input_bytes, status,
+             json.dumps(config, sort_keys=True)))
+        run_id = cursor.lastrowid
+        if timeline:
+            connection.executemany(
+                "INSERT INTO stage_samples (run_id, timestamp, stage, elements, throughput) VALUES (?, ?, ?, ?, ?)",
+                [(run_id,) + tuple(sample) for sample in timeline])
+    return run_id
+
+def config_similarity(first: Dict[str, str], second: Dict[str, str]) -> float:
+    """Fracción de claves con el mismo valor sobre la unión de claves"""
+    keys = set(first) | set(second)
+    if not keys:
+        return 1.0
+    return sum(1 for key in keys if first.get(key) == second.get(key)) / len(keys)
+
+def run_throughput(run: sqlite3.Row) -> Optional[float]:
+    """Throughput total de la ejecución en MB/s (None si no hay tamaño)"""
+    if not run['input_bytes'] or run['total_seconds'] <= 0:
+        return None
+    return run['input_bytes'] / (1024 * 1024) / run['total_seconds']
+
+def stage_throughputs(connection: sqlite3.Connection, run_id: int) -> Dict[str, float]:
+    """Throughput medio por etapa (solo intervalos con avance)"""
+    rows = connection.execute(
+        "SELECT stage, AVG(throughput) AS throughput FROM stage_samples "
+        "WHERE run_id = ? AND throughput > 0 GROUP BY stage", (run_id,)).fetchall()
+    return {row['stage']: row['throughput'] for row in rows}
+
+def compare_latest(connection: sqlite3.Connection, script: Optional[str] = None,
+                   threshold: float = 0.10, min_similarity: float = 0.8) -> Optional[dict]:
+    """
+    Compara la última ejecución exitosa con las anteriores de configuración similar
+
+    La referencia es la mediana de las ejecuciones similares; hay regresión
+    cuando el throughput cae más que threshold por debajo de ella.
+    """
+    query = "SELECT * FROM runs WHERE status = 'SUCCESS'"
+    params = ()
+    if script:
+        query += " AND script = ?"
+        params = (script,)
+    runs = connection.execute(query + " ORDER BY started_at DESC", params).fetchall()
+    if not runs:
+        return None
+
+    latest = runs[0]
+    latest_config = json.loads(latest['config'])
+    similar = [run for run in runs[1:]
+               if run['script'] == latest['script']
+               and config_similarity(latest_config, json.loads(run['config'])) >= min_similarity]
+
+    result = {'latest': latest, 'similar': similar, 'regressions': []}
+
+    latest_value = run_throughput(latest)
+    baseline_values = [value for value in map(run_throughput, similar) if value]
+    if latest_value and baseline_values:
+        baseline = statistics.median(baseline_values)
+        result['throughput'] = (latest_value, baseline)
+        if latest_value < baseline * (1 - threshold):
+            result['regressions'].append(('total', latest_value, baseline))
+
+    latest_stages = stage_throughputs(connection, latest['id'])
+    for stage, value in latest_stages.items():
+        baseline_stage = [stage_throughputs(connection, run['id']).get(stage) for run in similar]
+        baseline_stage = [item for item in baseline_stage if item]
+        if baseline_stage:
+            baseline = statistics.median(baseline_stage)
+            if value < baseline * (1 - threshold):
+                result['regressions'].append((stage, value, baseline))
+    return result
+
+def print_report(result: Optional[dict], threshold: float):
+    """Muestra la comparación de la última ejecución"""
+    if not result:
+        print("⚠️  No hay ejecuciones registradas")
+        return
+
+    latest = result['latest']
+    started = datetime.fromtimestamp(latest['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+    print(f"🗃️ Última ejecución: #{latest['id']} {latest['script']} ({started})")
+    print(f"⏱️  Duración: {latest['total_seconds'] / 60:.1f} minutos")
+    print(f"⚙️  Configuración: {latest['config']}")
+    print(f"🔁 Ejecuciones similares: {len(result['similar'])}")
+
+    if 'throughput' in result:
+        latest_value, baseline = result['throughput']
+        change = (latest_value - baseline) / baseline
+        print(f"🚀 Throughput: {latest_value:.1f} MB/s (referencia {baseline:.1f} MB/s, {change:+.1%})")
+
+    if result['regressions']:
+        print(f"🚨 REGRESIONES (umbral {threshold:.0%}):")
+        for name, value, baseline in result['regressions']:
+            print(f"   • {name}: {value:,.1f} vs {baseline:,.1f} ({(value - baseline) / baseline:+.1%})")
+    elif result['similar']:
+        print("✅ Sin regresiones de throughput")
+
+def print_runs(connection: sqlite3.Connection, limit: int = 20):
+    """Lista las últimas ejecuciones"""
+    print(f"{'ID':<5} {'Script':<28} {'Inicio':<20} {'Min':>7} {'MB/s':>8}  Configuración")
+    print("-" * 100)
+    for run in connection.execute("SELECT * FROM runs ORDER BY started_at DESC LIMIT ?", (limit,)):
+        throughput = run_throughput(run)
+        started = datetime.fromtimestamp(run['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{run['id']:<5} {run['script']:<28} {started:<20} {run['total_seconds'] / 60:>7.1f} "
+              f"{(f'{throughput:.1f}' if throughput else 'N/A'):>8}  {run['config']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Historial de ejecuciones y regresiones de throughput")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Ruta de la base SQLite del historial")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="Registrar una ejecución")
+    record.add_argument("--script", required=True, help="Nombre del script/pipeline ejecutado")
+    record.add_argument("--start", type=float, required=True, help="Inicio (epoch en segundos)")
+    record.add_argument("--end", type=float, default=None, help="Fin (epoch en segundos, por defecto ahora)")
+    record.add_argument("--input_bytes", type=int, default=None, help="Tamaño de la entrada en bytes")
+    record.add_argument("--input_path", default=None, help="Ruta local o gs:// para medir el tamaño")
+    record.add_argument("--status", default="SUCCESS", help="Estado final de la ejecución")
+    record.add_argument("--timeline", default=None, help="Métricas grabadas con monitor_pipeline.py --record_metrics")
+    record.add_argument("--config", nargs="*", default=[], help="Parámetros clave=valor de la ejecución")
+
+    report = subparsers.add_parser("report", help="Comparar la última ejecución con las similares")
+    report.add_argument("--script", default=None, help="Filtrar por script")
+    report.add_argument("--threshold", type=float, default=0.10, help="Caída de throughput considerada regresión")
+    report.add_argument("--similarity", type=float, default=0.8, help="Similitud mínima de configuración (0-1)")
+
+    listing = subparsers.add_parser("list", help="Listar las últimas ejecuciones")
+    listing.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    connection = connect(args.db)
+
+    if args.command == "record":
+        input_bytes = args.input_bytes
+        if input_bytes is None and args.input_path:
+            input_bytes = get_input_size(args.input_path)
+        timeline = timeline_from_metrics(args.timeline) if args.timeline and os.path.exists(args.timeline) else None
+        run_id = record_run(connection, args.script, args.start, args.end or time.time(),
+                            parse_config(args.config), input_bytes, args.status, timeline)
+        print(f"🗃️ Ejecución registrada: #{run_id}")
+    elif args.command == "report":
+        result = compare_latest(connection, args.script, args.threshold, args.similarity)
+        print_report(result, args.threshold)
+        if result and result['regressions']:
+            return 2
+    else:
+        print_runs(connection, args.limit)
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
@@ -7,6 +7,7 @@ set -e
 
 echo "🚀 Iniciando carga ultra-rápida de 136GB en BigQuery..."
 echo "⏰ Inicio: $(date)"
+START_EPOCH=$(date +%s)
 
 # Configurar variables de entorno
 export PROJECT_ID=$(gcloud config get-value project)
@@ -15,6 +16,24 @@ export BUCKET_NAME="desafio-deacero-143d30a0-d8f8-4154-b7df-1773cf286d32"
 export DATASET_NAME="cdo_challenge"
 export TABLE_NAME="raw_data"
 
+# Parámetros de ajuste del job (sobrescribibles por entorno). Los mismos flags se pasan
+# al pipeline y se registran en el historial, para relacionar throughput y configuración
+NUM_WORKERS=${NUM_WORKERS:-50}
+MAX_NUM_WORKERS=${MAX_NUM_WORKERS:-100}
+MACHINE_TYPE=${MACHINE_TYPE:-n1-standard-4}
+DISK_SIZE_GB=${DISK_SIZE_GB:-100}
+MIN_BUNDLE_SIZE=${MIN_BUNDLE_SIZE:-0}
+JOB_FLAGS=(
+    --num_workers=$NUM_WORKERS
+    --max_num_workers=$MAX_NUM_WORKERS
+    --machine_type=$MACHINE_TYPE
+    --disk_size_gb=$DISK_SIZE_GB
+    --min_bundle_size=$MIN_BUNDLE_SIZE
+)
+# Flags adicionales del pipeline (ej. "--input_pattern=gs://... --sink_rows_per_second=50000")
+read -r -a EXTRA_FLAGS <<< "${EXTRA_PIPELINE_ARGS:-}"
+JOB_FLAGS+=("${EXTRA_FLAGS[@]}")
+
 # Crear bucket temporal si no existe
 echo "📦 Configurando bucket temporal..."
 gsutil mb -p $PROJECT_ID -c STANDARD -l $REGION gs://$PROJECT_ID-temp 2>/dev/null || true
@@ -33,6 +52,15 @@ gsutil -m rm -r $STAGING_LOCATION 2>/dev/null || true
 gsutil mb -p $PROJECT_ID -c STANDARD -l $REGION $TEMP_LOCATION 2>/dev/null || true
 gsutil mb -p $PROJECT_ID -c STANDARD -l $REGION $STAGING_LOCATION 2>/dev/null || true
 
+# Subir shards locales (opcional) con el uploader concurrente
+if [ -n "$LOCAL_SHARDS_DIR" ]; then
+    echo "📤 Subiendo shards locales desde $LOCAL_SHARDS_DIR..."
+    python3 parallel_uploader.py \
+        --source="$LOCAL_SHARDS_DIR" \
+        --destination="gs://$BUCKET_NAME/shards" \
+        --max_in_flight=${UPLOAD_MAX_IN_FLIGHT:-32}
+fi
+
 echo "🔧 Variables configuradas:"
 echo "PROJECT_ID: $PROJECT_ID"
 echo "REGION: $REGION"
@@ -41,6 +69,7 @@ echo "DATASET: $DATASET_NAME"
 echo "TABLA: $TABLE_NAME"
 echo "TEMP_LOCATION: $TEMP_LOCATION"
 echo "STAGING_LOCATION: $STAGING_LOCATION"
+echo "JOB_FLAGS: ${JOB_FLAGS[*]}"
 
 # Actualizar el script Python con las variables correctas
 echo "📝 Actualizando configuración del pipeline..."
@@ -57,17 +86,25 @@ python3 ultra_fast_loader.py \
     --temp_location=$TEMP_LOCATION \
     --staging_location=$STAGING_LOCATION \
     --runner=DataflowRunner \
-    --num_workers=50 \
-    --max_num_workers=100 \
-    --machine_type=n1-standard-4 \
-    --disk_size_gb=100 \
     --worker_region=$REGION \
     --setup_file=./setup.py \
-    --save_main_session=False
+    --save_main_session=False \
+    "${JOB_FLAGS[@]}"
 
 echo "✅ Pipeline completado!"
 echo "⏰ Fin: $(date)"
 
+# Registrar la ejecución en el historial y buscar regresiones de throughput
+echo "🗃️ Registrando ejecución en el historial..."
+python3 run_history.py record \
+    --script=run_ultra_fast_loader \
+    --start=$START_EPOCH \
+    --end=$(date +%s) \
+    --input_path=gs://$BUCKET_NAME/cdo_challenge.csv.gz \
+    ${METRICS_FILE:+--timeline=$METRICS_FILE} \
+    --config region=$REGION "${JOB_FLAGS[@]#--}" || true
+python3 run_history.py report --script=run_ultra_fast_loader || true
+
 # Limpiar recursos temporales
 echo "🧹 Limpiando recursos temporales..."
 gsutil -m rm -r $TEMP_LOCATION 2>/dev/null || true
@@ -1,25 +1,40 @@
 #!/usr/bin/env python3
 """
 📦 Archivo de configuración para Dataflow Pipeline
-🔧 Instala todas las dependencias necesarias
+🔧 Solo dependencias base; cada perfil del pipeline añade las suyas como extra
 """
 
 from setuptools import setup, find_packages
 
+from dependency_profiles import BEAM_REQUIREMENT, extras_require
+
 setup(
     name="ultra-fast-loader",
     version="1.0.0",
     description="Pipeline ultra-rápido para carga de 136GB en BigQuery",
     packages=find_packages(),
-    install_requires=[
-        'apache-beam[gcp]==2.48.0',
-        'google-cloud-bigquery==3.11.4',
-        'google-cloud-storage==2.10.0',
-        'pandas==2.1.1',
-        'numpy==1.24.3',
-        'pyarrow==13.0.0',
-        'fastparquet==2023.10.1',
+    # Módulos auxiliares importados por los DoFns en los workers
+    py_modules=[
+        'mmap_csv_reader',
+        'quoted_csv_source',
+        'pipeline_profiler',
+        'parallel_uploader',
+        'storage_write_sink',
+        'input_profile_cache',
+        'input_scheduler',
+        'load_checksums',
+        'compact_row',
+        'local_warehouse_sink',
+        'rate_limiter',
+        'fan_out_router',
+        'dependency_profiles',
+        'column_sketches',
+        'key_aggregates',
     ],
+    # El contenedor del SDK ya trae Beam con GCP: los workers no instalan nada más
+    # salvo el lock de su perfil (ver dependency_profiles.py)
+    install_requires=[BEAM_REQUIREMENT],
+    extras_require=extras_require(),
     python_requires='>=3.8',
     author="Deacero Team",
     author_email="team@deacero.com",
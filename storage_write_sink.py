@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+✍️ Sink de BigQuery Storage Write API para Apache Beam
+🔗 Pool de streams de escritura de larga duración abiertos una vez en setup()
+🏹 Lotes serializados en Arrow (mucho más compactos que JSON de STREAMING_INSERTS)
+🎯 Modos COMMITTED (visible al instante) y PENDING (exactly-once con commit final)
+"""
+
+import abc
+import decimal
+import functools
+import itertools
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import apache_beam as beam
+import pyarrow as pa
+from apache_beam.metrics import Metrics
+from apache_beam.transforms.window import GlobalWindow
+from apache_beam.utils.timestamp import MIN_TIMESTAMP
+from apache_beam.utils.windowed_value import WindowedValue
+
+from rate_limiter import get_limiter, rate_limited_call
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COMMITTED = 'COMMITTED'
+PENDING = 'PENDING'
+
+# Tipos de BigQuery -> tipos Arrow
+ARROW_TYPES = {
+    'STRING': pa.string(),
+    'INTEGER': pa.int64(),
+    'INT64': pa.int64(),
+    'FLOAT': pa.float64(),
+    'FLOAT64': pa.float64(),
+    'NUMERIC': pa.decimal128(38, 9),
+    'BIGNUMERIC': pa.decimal256(76, 38),
+    'BOOLEAN': pa.bool_(),
+    'BOOL': pa.bool_(),
+}
+
+# Errores de conversión de texto a tipo (la fila se rechaza, no el bundle)
+CONVERSION_ERRORS = (pa.ArrowInvalid, decimal.InvalidOperation)
+
+def parse_schema(schema: str) -> pa.Schema:
+    """Convierte 'campo1:STRING,campo2:INTEGER' en un esquema Arrow"""
+    fields = []
+    for column in schema.split(','):
+        name, _, column_type = column.strip().partition(':')
+        fields.append(pa.field(name.strip(), ARROW_TYPES.get(column_type.strip().upper() or 'STRING', pa.string())))
+    return pa.schema(fields)
+
+def parse_table_spec(table: str) -> Tuple[str, str, str]:
+    """Separa 'proyecto:dataset.tabla' en sus tres partes"""
+    project, _, rest = table.partition(':')
+    dataset, _, table_name = rest.partition('.')
+    if not (project and dataset and table_name):
+        raise ValueError(f"Tabla inválida '{table}', se espera proyecto:dataset.tabla")
+    return project, dataset, table_name
+
+def _column_array(values: List[Optional[str]], arrow_type: pa.DataType) -> pa.Array:
+    """Convierte una columna de texto; los decimales con más escala se redondean como en BigQuery"""
+    array = pa.array(values, type=pa.string())
+    if arrow_type == pa.string():
+        return array
+    try:
+        return array.cast(arrow_type)
+    except pa.ArrowInvalid:
+        if not pa.types.is_decimal(arrow_type):
+            raise
+    quantum = decimal.Decimal(1).scaleb(-arrow_type.scale)
+    return pa.array([None if value is None else decimal.Decimal(value).quantize(quantum, decimal.ROUND_HALF_UP)
+                     for value in values], type=arrow_type)
+
+def rows_to_record_batch(rows: List[List[str]], schema: pa.Schema) -> pa.RecordBatch:
+    """Convierte filas (listas de str, salida de ProcessCSV) en un RecordBatch Arrow"""
+    arrays = []
+    for index, field in enumerate(schema):
+        column = [row[index] if index < len(row) and row[index] != '' else None for row in rows]
+        arrays.append(_column_array(column, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def convert_rows(rows: List[List[str]], schema: pa.Schema) -> Tuple[Optional[pa.RecordBatch], List[List[str]]]:
+    """
+    Como rows_to_record_batch, pero separa las filas que no se pueden convertir
+
+    La conversión es vectorizada; solo si falla se prueba fila por fila para
+    aislar las inválidas. Retorna (lote con las válidas o None, filas rechazadas).
+    """
+    try:
+        return rows_to_record_batch(rows, schema), []
+    except CONVERSION_ERRORS:
+        pass
+    valid = []
+    rejected = []
+    for row in rows:
+        try:
+            rows_to_record_batch([row], schema)
+        except CONVERSION_ERRORS:
+            rejected.append(row)
+            continue
+        valid.append(row)
+    return (rows_to_record_batch(valid, schema) if valid else None), rejected
+
+class WriteTransport(abc.ABC):
+    """Interfaz del transporte de la Storage Write API (inyectable)"""
+
+    @abc.abstractmethod
+    def create_stream(self, table: str, mode: str) -> str:
+        """Crea un stream (PENDING o COMMITTED) y devuelve su nombre"""
+
+    @abc.abstractmethod
+    def append(self, stream: str, serialized_schema: bytes, serialized_batch: bytes,
+               offset: int, num_rows: int):
+        """Agrega un lote Arrow serializado en el offset indicado"""
+
+    @abc.abstractmethod
+    def finalize(self, stream: str) -> int:
+        """Cierra el stream y devuelve las filas escritas"""
+
+    @abc.abstractmethod
+    def commit(self, table: str, streams: List[str]):
+        """Confirma atómicamente los streams PENDING"""
+
+    def close(self):
+        pass
+
+class BigQueryWriteTransport(WriteTransport):
+    """Transporte real sobre BigQueryWriteClient con un AppendRowsStream por stream"""
+
+    def __init__(self):
+        from google.cloud import bigquery_storage_v1
+
+        self._client = bigquery_storage_v1.BigQueryWriteClient()
+        self._append_streams = {}
+
+    def _parent(self, table: str) -> str:
+        return self._client.table_path(*parse_table_spec(table))
+
+    def create_stream(self, table: str, mode: str) -> str:
+        from google.cloud.bigquery_storage_v1 import types
+
+        stream_type = types.WriteStream.Type.PENDING if mode == PENDING else types.WriteStream.Type.COMMITTED
+        stream = self._client.create_write_stream(
+            parent=self._parent(table), write_stream=types.WriteStream(type_=stream_type))
+        return stream.name
+
+    def append(self, stream: str, serialized_schema: bytes, serialized_batch: bytes,
+               offset: int, num_rows: int):
+        from google.cloud.bigquery_storage_v1 import types, writer
+
+        if stream not in self._append_streams:
+            template = types.AppendRowsRequest(
+                write_stream=stream,
+                arrow_rows=types.AppendRowsRequest.ArrowData(
+                    writer_schema=types.ArrowSchema(serialized_schema=serialized_schema)))
+            self._append_streams[stream] = writer.AppendRowsStream(self._client, template)
+
+        request = types.AppendRowsRequest(
+            offset=offset,
+            arrow_rows=types.AppendRowsRequest.ArrowData(
+                rows=types.ArrowRecordBatch(serialized_record_batch=serialized_batch, row_count=num_rows)))
+        # El offset explícito hace que los reintentos no dupliquen filas
+        self._append_streams[stream].send(request).result()
+
+    def finalize(self, stream: str) -> int:
+        append_stream = self._append_streams.pop(stream, None)
+        if append_stream is not None:
+            append_stream.close()
+        return self._client.finalize_write_stream(name=stream).row_count
+
+    def commit(self, table: str, streams: List[str]):
+        from google.cloud.bigquery_storage_v1 import types
+
+        response = self._client.batch_commit_write_streams(
+            types.BatchCommitWriteStreamsRequest(parent=self._parent(table), write_streams=streams))
+        if response.stream_errors:
+            raise RuntimeError(f"Error en commit de streams: {list(response.stream_errors)}")
+
+    def close(self):
+        for append_stream in self._append_streams.values():
+            append_stream.close()
+        self._append_streams = {}
+
+class LocalWriteServer(WriteTransport):
+    """
+    Servidor local en memoria que imita la Storage Write API
+
+    Valida offsets como el servicio real, hace visibles las filas de streams
+    COMMITTED al instante y las de streams PENDING solo tras el commit.
+    Las instancias se comparten por nombre dentro del proceso (DirectRunner).
+    """
+
+    _servers = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self.streams = {}
+        self.tables = {}
+        self.appends = 0
+        self.bytes_received = 0
+
+    @classmethod
+    def get(cls, name: str = 'default') -> 'LocalWriteServer':
+        with cls._servers_lock:
+            if name not in cls._servers:
+                cls._servers[name] = cls()
+            return cls._servers[name]
+
+    @classmethod
+    def factory(cls, name: str = 'default') -> Callable[[], 'LocalWriteServer']:
+        """Fábrica serializable para StorageWriteFn"""
+        return functools.partial(cls.get, name)
+
+    def create_stream(self, table: str, mode: str) -> str:
+        with self._lock:
+            stream = f"{table}/streams/{next(self._ids)}"
+            self.streams[stream] = {'table': table, 'mode': mode, 'rows': [],
+                                    'batches': 0, 'finalized': False}
+            self.tables.setdefault(table, [])
+            return stream
+
+    def append(self, stream: str, serialized_schema: bytes, serialized_batch: bytes,
+               offset: int, num_rows: int):
+        schema = pa.ipc.read_schema(pa.py_buffer(serialized_schema))
+        batch = pa.ipc.read_record_batch(pa.py_buffer(serialized_batch), schema)
+        rows = batch.to_pylist()
+        with self._lock:
+            state = self.streams[stream]
+            if state['finalized']:
+                raise RuntimeError(f"Stream finalizado: {stream}")
+            if offset != len(state['rows']):
+                raise RuntimeError(f"Offset {offset} inválido para {stream} (esperado {len(state['rows'])})")
+            state['rows'].extend(rows)
+            state['batches'] += 1
+            self.appends += 1
+            self.bytes_received += len(serialized_batch)
+            if state['mode'] == COMMITTED:
+                self.tables[state['table']].extend(rows)
+
+    def finalize(self, stream: str) -> int:
+        with self._lock:
+            self.streams[stream]['finalized'] = True
+            return len(self.streams[stream]['rows'])
+
+    def commit(self, table: str, streams: List[str]):
+        with self._lock:
+            for stream in streams:
+                state = self.streams[stream]
+                if state['mode'] != PENDING or not state['finalized']:
+                    raise RuntimeError(f"Stream no apto para commit: {stream}")
+                self.tables[table].extend(state['rows'])
+                state['mode'] = 'COMMITTED_PENDING'
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {'streams': len(self.streams), 'appends': self.appends,
+                    'bytes': self.bytes_received,
+                    'rows': sum(len(rows) for rows in self.tables.values())}
+
+class StorageWriteFn(beam.DoFn):
+    """
+    Escribe lotes de filas en un pool de streams de la Storage Write API
+
+    El pool se abre una vez en setup() y se reutiliza entre bundles en ambos
+    modos. En PENDING cada bundle emite (stream, offset_final) de los streams
+    que usó; el commit final verifica que cada stream contenga exactamente las
+    filas de bundles completados (ver _CommitStreamsFn).
+    """
+
+    def __init__(self, table: str, schema: str, mode: str = COMMITTED, streams_per_worker: int = 4,
+                 transport_factory: Optional[Callable[[], WriteTransport]] = None,
+                 rows_per_second: Optional[float] = None):
+        if mode not in (COMMITTED, PENDING):
+            raise ValueError(f"Modo no soportado: {mode}")
+        self.table = table
+        self.schema = schema
+        self.mode = mode
+        self.streams_per_worker = streams_per_worker
+        self.transport_factory = transport_factory or BigQueryWriteTransport
+        self.rows_per_second = rows_per_second
+        self.rows_written = Metrics.counter(self.__class__, 'rows_written')
+        self.batches_written = Metrics.counter(self.__class__, 'batches_written')
+        self.bytes_written = Metrics.counter(self.__class__, 'bytes_written')
+        self.rejected_rows = Metrics.counter(self.__class__, 'rejected_rows')
+
+    def setup(self):
+        self._transport = self.transport_factory()
+        self._arrow_schema = parse_schema(self.schema)
+        self._serialized_schema = self._arrow_schema.serialize().to_pybytes()
+        # Pool de streams de larga duración reutilizado entre bundles
+        self._open_streams()
+        self._next_stream = itertools.cycle(self._streams)
+        # Limitador AIMD compartido por todas las instancias del proceso para esta tabla
+        self._limiter = get_limiter(f"storage_write:{self.table}", self.rows_per_second) if self.rows_per_second else None
+
+    def _open_streams(self):
+        self._streams = [self._transport.create_stream(self.table, self.mode)
+                         for _ in range(self.streams_per_worker)]
+        self._offsets = {stream: 0 for stream in self._streams}
+
+    def start_bundle(self):
+        self._bundle_streams = set()
+
+    def process(self, batch):
+        if not batch:
+            return
+        record_batch, rejected = convert_rows(batch, self._arrow_schema)
+        if rejected:
+            self.rejected_rows.inc(len(rejected))
+            logger.warning(f"⚠️  {len(rejected)} filas rechazadas por valores incompatibles con el esquema "
+                           f"(ej. {rejected[0]})")
+        if record_batch is None:
+            return
+        stream = next(self._next_stream)
+        serialized = record_batch.serialize().to_pybytes()
+        append = functools.partial(self._transport.append, stream, self._serialized_schema, serialized,
+                                   self._offsets[stream], record_batch.num_rows)
+        if self._limiter:
+            # Reintentar con el mismo offset no duplica filas
+            rate_limited_call(self._limiter, append, record_batch.num_rows)
+        else:
+            append()
+        self._offsets[stream] += record_batch.num_rows
+        self._bundle_streams.add(stream)
+        self.rows_written.inc(record_batch.num_rows)
+        self.batches_written.inc()
+        self.bytes_written.inc(len(serialized))
+
+    def finish_bundle(self):
+        if self.mode != PENDING:
+            return
+        # Solo se emiten offsets de bundles completados; lo que escriba un bundle
+        # fallido queda por encima del último offset emitido de su stream
+        for stream in sorted(self._bundle_streams):
+            yield WindowedValue((stream, self._offsets[stream]), MIN_TIMESTAMP, [GlobalWindow()])
+
+    def teardown(self):
+        transport = getattr(self, '_transport', None)
+        if transport is not None:
+            transport.close()
+
+class _CommitStreamsFn(beam.DoFn):
+    """
+    Finaliza y confirma de forma atómica todos los streams PENDING
+
+    Recibe (stream, offset_final) de cada bundle completado. Si un stream tiene
+    más filas que el mayor offset emitido, contiene filas de un bundle que
+    falló (y se reintentó en otro worker): confirmarlo duplicaría esas filas,
+    así que no se confirma nada y el job falla con la tabla intacta.
+    """
+
+    def __init__(self, table: str, transport_factory: Callable[[], WriteTransport]):
+        self.table = table
+        self.transport_factory = transport_factory
+
+    def process(self, segments):
+        if not segments:
+            return
+        expected = {}
+        for stream, offset in segments:
+            expected[stream] = max(offset, expected.get(stream, 0))
+        transport = self.transport_factory()
+        try:
+            mismatched = []
+            for stream in sorted(expected):
+                row_count = transport.finalize(stream)
+                if row_count != expected[stream]:
+                    mismatched.append(f"{stream} ({row_count:,} filas, {expected[stream]:,} confirmables)")
+            if mismatched:
+                raise RuntimeError(f"Streams con filas de bundles fallidos; no se confirma nada: {mismatched}")
+            transport.commit(self.table, sorted(expected))
+            logger.info(f"✅ Commit de {len(expected)} streams en {self.table}")
+        finally:
+            transport.close()
+        yield len(expected)
+
+class WriteToBigQueryStorage(beam.PTransform):
+    """
+    Escribe filas (listas de str) mediante la Storage Write API
+
+    mode=COMMITTED: filas visibles al instante, streams de larga duración por worker.
+    mode=PENDING: carga masiva exactly-once; todo se confirma en un único commit final.
+    Las filas con valores incompatibles con el esquema se descartan (métrica rejected_rows).
+    rows_per_second: techo inicial por proceso; se ajusta con AIMD ante respuestas de cuota.
+    """
+
+    def __init__(self, table: str, schema: str, mode: str = COMMITTED, streams_per_worker: int = 4,
+                 min_batch_size: int = 1000, max_batch_size: int = 10000,
+                 transport_factory: Optional[Callable[[], WriteTransport]] = None,
+                 rows_per_second: Optional[float] = None):
+        super().__init__()
+        self.table = table
+        self.schema = schema
+        self.mode = mode
+        self.streams_per_worker = streams_per_worker
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.transport_factory = transport_factory or BigQueryWriteTransport
+        self.rows_per_second = rows_per_second
+
+    def expand(self, rows):
+        written = (
+            rows
+            | 'BatchRows' >> beam.BatchElements(min_batch_size=self.min_batch_size,
+                                                max_batch_size=self.max_batch_size)
+            | 'AppendRows' >> beam.ParDo(StorageWriteFn(self.table, self.schema, self.mode,
+                                                        self.streams_per_worker, self.transport_factory,
+                                                        self.rows_per_second))
+        )
+        if self.mode != PENDING:
+            return written
+        return (
+            written
+            | 'CollectStreams' >> beam.combiners.ToList()
+            | 'CommitStreams' >> beam.ParDo(_CommitStreamsFn(self.table, self.transport_factory))
+        )
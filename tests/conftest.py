@@ -0,0 +1,13 @@
+"""
+🧪 Configuración común de pytest
+📂 Los módulos viven en la raíz del repositorio y en Sinaumentarcouta/ (sin paquete)
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, 'Sinaumentarcouta')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,106 @@
+"""
+🧪 Pruebas del perfil de columnas: HyperLogLog, cuantiles KLL, Misra-Gries y combinación entre shards
+"""
+
+import random
+
+import apache_beam as beam
+import pytest
+from apache_beam.testing.test_pipeline import TestPipeline
+
+from column_sketches import (ColumnSketchCombineFn, ComputeColumnProfile, HyperLogLog, KLLSketch, MisraGries,
+                             build_profile, read_profile)
+
+def test_hyperloglog_estimates_within_error():
+    sketch = HyperLogLog()
+    for index in range(50000):
+        sketch.add(f'cliente-{index}')
+        sketch.add(f'cliente-{index}')  # Los repetidos no cuentan
+    assert abs(sketch.estimate() - 50000) / 50000 < 3 * sketch.relative_error()
+
+    small = HyperLogLog()
+    for index in range(100):
+        small.add(str(index))
+    assert abs(small.estimate() - 100) <= 2
+
+def test_hyperloglog_merge_equals_single_pass_and_roundtrips():
+    left, right, whole = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for index in range(5000):
+        (left if index % 2 else right).add(str(index))
+        whole.add(str(index))
+    left.merge(right)
+    assert left.registers == whole.registers
+    assert HyperLogLog.from_text(whole.to_text()).registers == whole.registers
+
+def test_kll_quantiles_rank_error_and_merge():
+    random.seed(7)
+    values = [random.random() for _ in range(100000)]
+    shards = [KLLSketch() for _ in range(8)]
+    for index, value in enumerate(values):
+        shards[index % 8].add(value)
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+
+    ordered = sorted(values)
+    assert merged.count == len(values)
+    assert (merged.min, merged.max) == (ordered[0], ordered[-1])
+    assert merged.size < 2000  # Memoria acotada, no proporcional a las filas
+    for name, estimate in merged.quantiles().items():
+        fraction = int(name[1:]) / 100
+        rank = sum(1 for value in ordered if value <= estimate) / len(ordered)
+        assert abs(rank - fraction) < 0.02, name
+    assert KLLSketch().quantiles() == {}
+
+def test_misra_gries_bounds_counts():
+    random.seed(3)
+    stream = ['MX'] * 3000 + ['US'] * 2000 + [f'raro-{index}' for index in range(5000)]
+    random.shuffle(stream)
+    left, right = MisraGries(k=8), MisraGries(k=8)
+    for index, value in enumerate(stream):
+        (left if index % 2 else right).add(value)
+    left.merge(right)
+
+    top = left.top(2)
+    assert [item['value'] for item in top] == ['MX', 'US']
+    for item, exact in zip(top, (3000, 2000)):
+        assert item['count'] <= exact <= item['count'] + left.error
+
+def test_combine_counts_nulls_and_widens_columns():
+    combine = ColumnSketchCombineFn(1)
+    first = combine.create_accumulator()
+    combine.add_input(first, ['1'])
+    combine.add_input(first, [''])
+    second = combine.create_accumulator()
+    combine.add_input(second, ['3', 'a', 'b'])
+    merged = combine.merge_accumulators([first, second])
+
+    profile = build_profile(merged, ['id'])
+    assert profile['row_count'] == 3
+    assert [column['name'] for column in profile['columns']] == ['id', 'col_1', 'col_2']
+    assert [column['null_count'] for column in profile['columns']] == [1, 2, 2]
+    assert profile['columns'][0]['quantiles']['p50'] in (1.0, 3.0)
+    assert 'quantiles' not in profile['columns'][1]
+
+def test_pipeline_writes_profile(tmp_path):
+    profile_path = str(tmp_path / 'perfil.json')
+    rows = [[str(index), 'MX' if index % 3 else 'US', ''] for index in range(300)]
+    with TestPipeline() as pipeline:
+        _ = (pipeline
+             | beam.Create(rows)
+             | ComputeColumnProfile(profile_path, ['id', 'pais', 'nota']))
+
+    profile = read_profile(profile_path)
+    assert profile['row_count'] == 300
+    id_column, country, note = profile['columns']
+    assert abs(id_column['distinct_estimate'] - 300) <= 3
+    assert (id_column['min'], id_column['max']) == (0, 299)
+    assert country['top_values'][:2] == [{'value': 'MX', 'count': 200}, {'value': 'US', 'count': 100}]
+    assert note['null_count'] == 300 and note['distinct_estimate'] == 0
+    assert HyperLogLog.from_text(country['hll_registers']).estimate() == 2
+
+@pytest.mark.parametrize('value, is_numeric', [('12.5', True), ('inf', False), ('abc', False)])
+def test_numeric_detection(value, is_numeric):
+    combine = ColumnSketchCombineFn(1)
+    accumulator = combine.add_input(combine.create_accumulator(), [value])
+    assert (accumulator[1][0].numeric.count == 1) is is_numeric
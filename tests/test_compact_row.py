@@ -0,0 +1,70 @@
+"""
+🧪 Pruebas de CompactRow: delimitación como el módulo csv, coder y reshuffle codificado
+"""
+
+import csv
+import pickle
+import random
+
+import apache_beam as beam
+import pytest
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from compact_row import CompactRow, CompactRowCoder, ReshuffleCompactRows, shuffle_coder
+
+@pytest.mark.parametrize('line', [
+    'a,b,c',
+    'ab"c,d,e',
+    '5" pipe,10,"x,y"',
+    '"ab"c,d',
+    '"a""b",c',
+    'a,""',
+    '"""",x',
+    '"abc,d',
+    'x,"y',
+    ',,',
+    '"a,b",,"c""d""e",f"g"h',
+])
+def test_fields_match_csv(line):
+    assert CompactRow.from_line(line).to_list() == next(csv.reader([line]))
+
+def test_random_lines_match_csv():
+    rng = random.Random(7)
+    alphabet = ['a', 'b', ',', '"', ' ', 'ñ']
+    for _ in range(5000):
+        line = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 20)))
+        assert CompactRow.from_line(line).to_list() == next(csv.reader([line])), line
+
+def test_multibyte_delimiter_and_indexing():
+    row = CompactRow.from_line('uno¦"dos¦tres"¦cuatro', '¦')
+    assert list(row) == ['uno', 'dos¦tres', 'cuatro']
+    assert row[-1] == 'cuatro' and row[0:2] == ['uno', 'dos¦tres']
+    with pytest.raises(IndexError):
+        row[3]
+
+def test_coder_and_pickle_roundtrip():
+    coder = CompactRowCoder()
+    row = CompactRow.from_line('1,"a,b",ab"c', ',')
+    assert coder.decode(coder.encode(row)).to_list() == row.to_list()
+    assert pickle.loads(pickle.dumps(row)) == row
+
+def test_encoded_rows_shuffle_smaller_than_pickled():
+    lines = [f'{index},cliente {index},{index * 1.5:.2f},"texto, con coma",MX' for index in range(200)]
+    value_coder = shuffle_coder()
+    row_coder = CompactRowCoder()
+    pickled = sum(len(value_coder.encode(CompactRow.from_line(line))) for line in lines)
+    encoded = sum(len(value_coder.encode(row_coder.encode(CompactRow.from_line(line)))) for line in lines)
+    as_list = sum(len(value_coder.encode(next(csv.reader([line])))) for line in lines)
+    assert encoded < as_list < pickled
+
+def test_reshuffle_compact_rows_pipeline():
+    lines = ['1,a,b', '2,"x,y",z', '3,5" pipe,w']
+    with TestPipeline() as pipeline:
+        rows = (pipeline
+                | beam.Create(lines)
+                | beam.Map(CompactRow.from_line).with_output_types(CompactRow))
+        shuffled = rows | 'Reshuffle' >> ReshuffleCompactRows()
+        assert shuffled.element_type is CompactRow
+        assert_that(shuffled | beam.Map(lambda row: tuple(row.to_list())),
+                    equal_to([tuple(next(csv.reader([line]))) for line in lines]))
@@ -0,0 +1,118 @@
+"""
+🧪 Pruebas de la ingesta continua: micro-lotes, registro at-most-once y sink SQLite local
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import time
+
+from continuous_ingest import (MB, IngestLedger, LocalDirectoryLister, MicroBatcher, SQLiteAppendSink,
+                               make_sink, process_batch, watch)
+
+def write_csv(directory, name, rows, age_seconds=10.0):
+    path = os.path.join(str(directory), name)
+    data = 'id,nombre\n' + ''.join(f'{index},"fila {index}"\n' for index in range(rows))
+    if name.endswith('.gz'):
+        with gzip.open(path, 'wt', newline='') as f:
+            f.write(data)
+    else:
+        with open(path, 'w', newline='') as f:
+            f.write(data)
+    modified = time.time() - age_seconds
+    os.utime(path, (modified, modified))
+    return path
+
+def count_rows(db_path, table='raw_data'):
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+def test_lister_skips_recent_and_unmatched_files(tmp_path):
+    old = write_csv(tmp_path, 'a.csv', 1, age_seconds=30)
+    write_csv(tmp_path, 'b.csv', 1, age_seconds=0)
+    write_csv(tmp_path, 'notas.txt', 1, age_seconds=30)
+    entries = LocalDirectoryLister(str(tmp_path), '*.csv*', min_age_seconds=5).list_files()
+    assert [path for path, _, _ in entries] == [old]
+
+def test_micro_batcher_limits():
+    batcher = MicroBatcher(max_bytes=10 * MB, max_files=3, max_wait_seconds=3600)
+    assert not batcher.ready()
+    batcher.add([(f'f{index}', 4 * MB, 0.0) for index in range(5)])
+    assert batcher.ready()
+    assert [path for path, _, _ in batcher.take()] == ['f0', 'f1']
+    assert [path for path, _, _ in batcher.take()] == ['f2', 'f3']
+    assert not batcher.ready()
+    assert batcher.ready(force=True)
+    # Un archivo mayor que max_bytes forma su propio lote
+    batcher.add([('grande', 50 * MB, 0.0)])
+    assert [path for path, _, _ in batcher.take()] == ['f4']
+    assert [path for path, _, _ in batcher.take()] == ['grande']
+
+def test_watch_loads_each_file_once(tmp_path):
+    source = tmp_path / 'entrada'
+    source.mkdir()
+    write_csv(source, 'a.csv', 5)
+    write_csv(source, 'b.csv.gz', 7)
+    db_path = str(tmp_path / 'warehouse.db')
+    ledger = IngestLedger(str(tmp_path / 'ledger.db'))
+    metrics_file = str(tmp_path / 'metrics.json')
+
+    def run():
+        watch(LocalDirectoryLister(str(source), '*.csv*', min_age_seconds=1), ledger,
+              make_sink(db_path), MicroBatcher(max_files=1), once=True, metrics_file=metrics_file)
+
+    run()
+    assert count_rows(db_path) == 12
+    run()
+    assert count_rows(db_path) == 12
+
+    write_csv(source, 'c.csv', 3)
+    run()
+    assert count_rows(db_path) == 15
+
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+    assert metrics['files'] == 3 and metrics['rows'] == 15 and metrics['failed_files'] == 0
+    assert metrics['latency_p50_seconds'] >= 1
+
+def test_failed_batch_is_atomic_and_not_retried(tmp_path):
+    good = write_csv(tmp_path, 'a.csv', 4)
+    bad = os.path.join(str(tmp_path), 'roto.csv.gz')
+    with open(bad, 'wb') as f:
+        f.write(b'no es gzip')
+    db_path = str(tmp_path / 'warehouse.db')
+    ledger = IngestLedger(str(tmp_path / 'ledger.db'))
+    sink = SQLiteAppendSink(db_path)
+
+    files = [(good, os.path.getsize(good), time.time()), (bad, os.path.getsize(bad), time.time())]
+    batch_id = process_batch(ledger, sink, files)
+    assert count_rows(db_path) == 0
+    statuses = {row['path']: row['status'] for row in ledger.connection.execute(
+        "SELECT path, status FROM ingested_files WHERE batch_id = ?", (batch_id,))}
+    assert statuses == {good: 'FAILED', bad: 'FAILED'}
+
+    # Reclamados una vez: un segundo intento no los vuelve a cargar
+    assert process_batch(ledger, sink, files) is None
+    assert ledger.metrics()['failed_files'] == 2
+
+def test_make_sink_table_suffix(tmp_path):
+    sink = make_sink(str(tmp_path / 'warehouse.db') + ':extractos', skip_header_lines=0)
+    assert isinstance(sink, SQLiteAppendSink)
+    assert sink.table == 'extractos' and sink.skip_header_lines == 0
+
+def test_empty_file_does_not_fail_its_batch(tmp_path):
+    empty = os.path.join(str(tmp_path), 'vacio.csv')
+    open(empty, 'w').close()
+    header_only = write_csv(tmp_path, 'encabezado.csv', 0)
+    good = write_csv(tmp_path, 'a.csv', 4)
+    db_path = str(tmp_path / 'warehouse.db')
+    ledger = IngestLedger(str(tmp_path / 'ledger.db'))
+
+    # El archivo vacío llega primero, antes de que exista la tabla
+    files = [(path, os.path.getsize(path), time.time()) for path in (empty, header_only, good)]
+    batch_id = process_batch(ledger, SQLiteAppendSink(db_path), files)
+    assert count_rows(db_path) == 4
+    statuses = {row['path']: (row['status'], row['rows']) for row in ledger.connection.execute(
+        "SELECT path, status, rows FROM ingested_files WHERE batch_id = ?", (batch_id,))}
+    assert statuses == {empty: ('LOADED', 0), header_only: ('LOADED', 0), good: ('LOADED', 4)}
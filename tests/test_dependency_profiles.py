@@ -0,0 +1,95 @@
+"""
+🧪 Pruebas de los perfiles de dependencias: extras, cobertura de importaciones, lock y staging del job
+"""
+
+import ast
+import os
+
+from apache_beam.options.pipeline_options import PipelineOptions, SetupOptions
+
+import dependency_profiles
+from dependency_profiles import (LOCAL_REQUIREMENTS, PROFILES, ROOT, SETUP_FILE, apply_profile, build, check,
+                                 extras_require, read_pins, requirement_name, requirements_path,
+                                 required_distributions)
+
+def test_requirement_names_are_normalized():
+    assert requirement_name('Google_Cloud.BigQuery-Storage>=2.27.0') == 'google-cloud-bigquery-storage'
+    assert requirement_name('apache-beam[gcp]==2.48.0') == 'apache-beam'
+    assert read_pins(['# comentario', '-e .', 'PyArrow==11.0.0', 'x==1 ; python_version>"3"']) == {
+        'pyarrow': '11.0.0', 'x': '1'}
+
+def test_extras_keep_heavy_packages_local():
+    extras = extras_require()
+    assert set(extras) == set(PROFILES) | {'local'}
+    assert extras['split'] == []
+    assert extras['local'] == LOCAL_REQUIREMENTS
+    assert not any(requirement_name(requirement) in ('pandas', 'fastparquet', 'pyarrow')
+                   for name in PROFILES for requirement in extras[name])
+
+def test_every_profile_covers_its_imports():
+    assert check()
+    assert 'google-cloud-bigquery-storage' in required_distributions('storage_write_sink')
+    assert required_distributions('ultra_fast_loader') == {}
+
+def test_loader_modules_are_packaged_for_workers():
+    with open(SETUP_FILE, encoding='utf-8') as f:
+        setup_call = next(node for node in ast.walk(ast.parse(f.read()))
+                          if isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'setup')
+    py_modules = ast.literal_eval(next(keyword.value for keyword in setup_call.keywords if keyword.arg == 'py_modules'))
+    local_imports = set()
+    for name in PROFILES['split']['modules'] + PROFILES['arrow']['modules']:
+        with open(os.path.join(ROOT, f'{name}.py'), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        local_imports |= {node.module for node in ast.walk(tree) if isinstance(node, ast.ImportFrom)
+                          and node.module and os.path.exists(os.path.join(ROOT, f'{node.module}.py'))}
+    assert local_imports <= set(py_modules)
+
+def test_build_drops_wheels_the_container_provides(tmp_path, monkeypatch):
+    base = tmp_path / 'sdk_freeze.txt'
+    base.write_text('protobuf==4.23.4\ngoogle-api-core==2.11.1\n')
+    commands = []
+
+    def fake_run(command, check):
+        commands.append(command)
+        target = command[command.index('--dest') + 1]
+        for filename in ('google_cloud_bigquery_storage-2.27.0-py2.py3-none-any.whl',
+                         'protobuf-4.23.4-cp37-abi3-manylinux2014_x86_64.whl'):
+            with open(os.path.join(target, filename), 'wb'):
+                pass
+
+    monkeypatch.setattr(dependency_profiles.subprocess, 'run', fake_run)
+    wheelhouse = str(tmp_path / 'wheelhouse')
+    lock = build('arrow', wheelhouse, base_constraints=str(base), python_version='311')
+
+    assert lock == {'google-cloud-bigquery-storage': '2.27.0'}
+    assert os.listdir(os.path.join(wheelhouse, 'arrow')) == ['google_cloud_bigquery_storage-2.27.0-py2.py3-none-any.whl']
+    with open(requirements_path(wheelhouse, 'arrow')) as f:
+        assert f.read() == 'google-cloud-bigquery-storage==2.27.0\n'
+    command = commands[0]
+    assert command[command.index('--platform') + 1] == 'manylinux2014_x86_64'
+    assert command[command.index('--python-version') + 1] == '311'
+    # Las versiones del contenedor se fijan salvo la del paquete pedido
+    assert '--constraint' in command
+
+def test_apply_profile_stages_the_lock(tmp_path):
+    wheelhouse = str(tmp_path)
+    options = PipelineOptions([f'--wheelhouse={wheelhouse}'])
+    assert apply_profile(options, 'split') == 'split'
+    setup_options = options.view_as(SetupOptions)
+    assert setup_options.setup_file == SETUP_FILE
+    assert setup_options.requirements_file is None
+
+    with open(requirements_path(wheelhouse, 'arrow'), 'w') as f:
+        f.write('google-cloud-bigquery-storage==2.27.0\n')
+    options = PipelineOptions([f'--wheelhouse={wheelhouse}', '--dependency_profile=arrow'])
+    assert apply_profile(options, 'split') == 'arrow'
+    setup_options = options.view_as(SetupOptions)
+    assert setup_options.requirements_file == requirements_path(wheelhouse, 'arrow')
+    assert setup_options.requirements_cache == os.path.join(wheelhouse, 'arrow')
+
+def test_stdlib_fallback_without_stdlib_module_names(monkeypatch):
+    monkeypatch.delattr(dependency_profiles.sys, 'stdlib_module_names', raising=False)
+    modules = dependency_profiles._stdlib_modules()
+    # Como en Python 3.8/3.9: paquetes, módulos .py, extensiones de lib-dynload e integrados
+    assert {'json', 'sqlite3', 'csv', 'argparse', 'zlib', 'sys'} <= modules
+    assert not {'apache_beam', 'pyarrow', 'google', 'site-packages'} & modules
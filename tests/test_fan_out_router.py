@@ -0,0 +1,74 @@
+"""
+🧪 Pruebas del fan-out: especificación de rutas, filtros, proyección y salidas etiquetadas
+"""
+
+import json
+
+import apache_beam as beam
+import pytest
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from fan_out_router import FanOut, Route, describe, load_spec
+
+HEADER = ['id', 'pais', 'monto', 'nota']
+
+def write_spec(tmp_path, routes, header=HEADER):
+    path = tmp_path / 'rutas.json'
+    path.write_text(json.dumps({'header': header, 'routes': routes}))
+    return str(path)
+
+def test_load_spec_resolves_columns_by_name(tmp_path):
+    routes = load_spec(write_spec(tmp_path, [
+        {'name': 'raw', 'table': 'p:ds.crudo'},
+        {'name': 'mx', 'table': 'p:ds.mx', 'where': {'column': 'pais', 'in': ['MX']},
+         'columns': ['id', 'monto'], 'strip': True},
+    ]))
+    assert [route.name for route in routes] == ['raw', 'mx']
+    assert routes[1].where_column == 1 and routes[1].columns == [0, 2]
+    assert 'mx → p:ds.mx' in describe(routes)
+
+@pytest.mark.parametrize('routes', [
+    [{'name': 'a', 'table': 'p:ds.a'}, {'name': 'a', 'table': 'p:ds.b'}],
+    [{'name': 'a-b', 'table': 'p:ds.a'}],
+    [{'name': 'a', 'table': 'p:ds.a', 'columns': ['falta']}],
+])
+def test_load_spec_rejects_invalid_routes(tmp_path, routes):
+    with pytest.raises(ValueError):
+        load_spec(write_spec(tmp_path, routes))
+
+def test_shared_table_requires_append(tmp_path):
+    shared = [{'name': 'mx', 'table': 'p:ds.ventas', 'where': {'column': 'pais', 'in': ['MX']}},
+              {'name': 'us', 'table': 'p.ds.ventas', 'where': {'column': 'pais', 'in': ['US']}}]
+    with pytest.raises(ValueError, match='WRITE_APPEND'):
+        load_spec(write_spec(tmp_path, shared))
+
+    shared[0]['write_disposition'] = 'WRITE_APPEND'
+    with pytest.raises(ValueError, match='WRITE_APPEND'):
+        load_spec(write_spec(tmp_path, shared))
+
+    shared[1]['write_disposition'] = 'WRITE_APPEND'
+    assert len(load_spec(write_spec(tmp_path, shared))) == 2
+
+def test_matches_and_project():
+    route = Route({'name': 'r', 'table': 't', 'where': {'column': 3, 'not_empty': True},
+                   'columns': [0, 3, 9], 'strip': True})
+    assert route.matches(['1', 'MX', '5', ' ok '])
+    assert not route.matches(['1', 'MX', '5', ''])
+    assert not route.matches(['1'])
+    assert route.project(['1', 'MX', '5', ' ok ']) == ['1', 'ok', '']
+
+def test_fan_out_pipeline_routes_each_row_to_every_match():
+    routes = [Route({'name': 'raw', 'table': 't.raw'}),
+              Route({'name': 'mx', 'table': 't.mx', 'where': {'column': 'pais', 'in': ['MX']},
+                     'columns': ['id', 'monto']}, HEADER),
+              Route({'name': 'notas', 'table': 't.notas', 'columns': ['nota'], 'skip_empty': True}, HEADER)]
+    rows = [['1', 'MX', '10', ''], ['2', 'US', '20', 'hola'], ['3', 'MX', '30', 'x']]
+
+    with TestPipeline() as pipeline:
+        outputs = (pipeline
+                   | beam.Create(rows)
+                   | FanOut(routes, lambda route: beam.Map(tuple)))
+        assert_that(outputs['raw'], equal_to([tuple(row) for row in rows]), label='CheckRaw')
+        assert_that(outputs['mx'], equal_to([('1', '10'), ('3', '30')]), label='CheckMx')
+        assert_that(outputs['notas'], equal_to([('hola',), ('x',)]), label='CheckNotas')
@@ -0,0 +1,101 @@
+"""
+🧪 Pruebas de la caché de esquema y perfil de entrada (huella, invalidación y límites de shards)
+"""
+
+import gzip
+import os
+
+import input_profile_cache
+from input_profile_cache import InputProfileCache, cached_schema, fingerprint, infer_profile
+
+CSV = (b"id,precio,activo,nombre,1dato\n"
+       b"1,2.5,true,Ana,x\n"
+       b"2,3,false,\"Luis, Jr\",\n"
+       b"3,,TRUE,Eva,y\n")
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+def test_infer_profile_complete_file(tmp_path):
+    path = write(tmp_path / 'datos.csv', CSV)
+    profile = infer_profile(path, CSV, len(CSV))
+    assert profile['schema'] == 'id:INTEGER,precio:FLOAT,activo:BOOLEAN,nombre:STRING,col_4_1dato:STRING'
+    assert profile['row_count_estimate'] == 3
+    columns = {column['name']: column for column in profile['columns']}
+    assert columns['precio']['null_fraction'] == 1 / 3
+    assert columns['nombre']['max_length'] == len('Luis, Jr')
+
+def test_infer_profile_extrapolates_from_prefix(tmp_path):
+    data = b"a,b\n" + b"".join(b"%d,xx\n" % (index % 10) for index in range(1000))
+    prefix = data[:1000]
+    profile = infer_profile(str(tmp_path / 'x.csv'), prefix, len(data))
+    # La última línea truncada se descarta y el conteo se escala al tamaño total
+    sample = prefix[:prefix.rfind(b'\n') + 1].count(b'\n') - 1
+    assert profile['sample_rows'] == sample
+    assert profile['row_count_estimate'] == int(sample * len(data) / len(prefix))
+
+def test_infer_profile_gzip_prefix(tmp_path):
+    data = CSV + b"".join(b"%d,%d.5,false,n%d,v\n" % (index, index, index) for index in range(4, 5000))
+    compressed = gzip.compress(data)
+    path = write(tmp_path / 'datos.csv.gz', compressed)
+    # El prefijo comprimido se descomprime sin el resto del archivo
+    profile = infer_profile(path, compressed[:len(compressed) // 2], len(compressed))
+    assert profile['schema'].startswith('id:INTEGER,precio:FLOAT,activo:BOOLEAN')
+    assert 0 < profile['sample_rows'] < 5000
+    full = infer_profile(path, compressed, len(compressed))
+    assert full['row_count_estimate'] == 4999
+
+def test_cache_hit_and_invalidation(tmp_path):
+    path = write(tmp_path / 'datos.csv', CSV)
+    cache = InputProfileCache(str(tmp_path / 'cache'))
+
+    profile, hit = cache.get_or_build_profile(path)
+    assert not hit
+    cached, hit = cache.get_or_build_profile(path)
+    assert hit and cached['schema'] == profile['schema']
+
+    # Cambia el contenido (y la huella): se vuelve a inferir
+    write(tmp_path / 'datos.csv', CSV.replace(b'nombre', b'alias') + b"4,1.0,false,Sol,z\n")
+    profile, hit = cache.get_or_build_profile(path)
+    assert not hit
+    assert 'alias:STRING' in profile['schema']
+
+def test_fingerprint_tracks_header(tmp_path):
+    path = write(tmp_path / 'datos.csv', CSV)
+    first = fingerprint(path)
+    write(tmp_path / 'datos.csv', CSV.replace(b'id,', b'ID,'))
+    second = fingerprint(path)
+    assert first['size'] == second['size']
+    assert first['header_hash'] != second['header_hash']
+
+def test_shard_boundaries_roundtrip(tmp_path):
+    path = write(tmp_path / 'datos.csv', CSV)
+    cache = InputProfileCache(str(tmp_path / 'cache'))
+    assert cache.get_shard_boundaries(path, '2:1:quote') is None
+
+    cache.store_shard_boundaries(path, '2:1:quote', [(0, 40), (40, len(CSV))])
+    assert cache.get_shard_boundaries(path, '2:1:quote') == [[0, 40], [40, len(CSV)]]
+
+    cache.invalidate(path)
+    assert cache.get_shard_boundaries(path, '2:1:quote') is None
+
+def test_corrupt_entry_is_rebuilt(tmp_path):
+    path = write(tmp_path / 'datos.csv', CSV)
+    cache = InputProfileCache(str(tmp_path / 'cache'))
+    cache.get_or_build_profile(path)
+    with open(cache._entry_path(path), 'w') as f:
+        f.write('{no es json')
+    _, hit = cache.get_or_build_profile(path)
+    assert not hit
+
+def test_cached_schema_falls_back_to_none(tmp_path, monkeypatch):
+    assert cached_schema(str(tmp_path / 'no_existe.csv'), str(tmp_path / 'cache')) is None
+
+    path = write(tmp_path / 'datos.csv', CSV)
+    assert cached_schema(path, str(tmp_path / 'cache')).startswith('id:INTEGER')
+    # El segundo acceso no vuelve a leer la muestra
+    monkeypatch.setattr(input_profile_cache, 'infer_profile', None)
+    assert cached_schema(path, str(tmp_path / 'cache')).startswith('id:INTEGER')
+    assert os.listdir(str(tmp_path / 'cache'))
@@ -0,0 +1,95 @@
+"""
+🧪 Pruebas de la planificación de entrada y de la lectura por rangos con comillas multilínea
+"""
+
+import csv
+import gzip
+import io
+import random
+
+import apache_beam as beam
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from input_scheduler import (MB, ReadScheduledFiles, discover_files, keyed_work_items, makespan, read_work_item,
+                             schedule_files, split_large_files)
+
+def random_csv(seed, rows=300):
+    """CSV con encabezado, comillas, comillas escapadas y saltos de línea dentro de campos"""
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(['id', 'texto', 'valor'])
+    records = []
+    for index in range(rows):
+        text = rng.choice(['simple', 'con, coma', 'dos\nlíneas', 'comilla "dentro"', 'x' * rng.randint(1, 40)])
+        record = [f'{seed}-{index}', text, str(rng.randint(0, 1000))]
+        writer.writerow(record)
+        records.append(record)
+    return buffer.getvalue().encode('utf-8'), records
+
+def parse(records):
+    return [next(csv.reader([record])) for record in records]
+
+def test_balanced_beats_naive():
+    files = [('big.csv', 900 * MB)] + [(f'small_{index}.csv', 10 * MB) for index in range(9)]
+    naive = makespan(schedule_files(files, 4, 'naive'))
+    lpt = makespan(schedule_files(files, 4, 'lpt'))
+    balanced = makespan(schedule_files(files, 4, 'balanced'))
+    assert balanced['max_bytes'] < lpt['max_bytes'] <= naive['max_bytes']
+    assert balanced['imbalance'] < 1.1
+
+def test_compressed_files_are_not_split():
+    items = split_large_files([('a.csv.gz', 100 * MB), ('b.csv', 100 * MB)], 30 * MB)
+    assert [item for item, _ in items if item[0] == 'a.csv.gz'] == [('a.csv.gz', 0, None)]
+    ranges = [item for item, _ in items if item[0] == 'b.csv']
+    assert len(ranges) == 4 and ranges[0][1] == 0 and ranges[-1][2] == 100 * MB
+
+def test_keyed_work_items_follow_the_plan():
+    files = [('a.csv.gz', 300 * MB), ('b.csv.gz', 200 * MB), ('c.csv.gz', 200 * MB), ('d.csv.gz', 100 * MB)]
+    groups = schedule_files(files, 2, 'lpt')
+    loads = {}
+    for group, (item, size) in keyed_work_items(groups):
+        loads[group] = loads.get(group, 0) + size
+    # Los .gz se colocan enteros por tamaño: 300+100 y 200+200
+    assert sorted(loads.values()) == [400 * MB, 400 * MB]
+    assert max(loads.values()) == makespan(groups)['max_bytes']
+
+def test_ranges_read_quoted_records_exactly_once(tmp_path):
+    for seed in range(5):
+        data, records = random_csv(seed)
+        path = tmp_path / f'datos_{seed}.csv'
+        path.write_bytes(data)
+        for target in (97, 500, 2048, len(data)):
+            items = split_large_files([(str(path), len(data))], target)
+            lines = [line for item, _ in items for line in read_work_item(item, skip_header_lines=1)]
+            assert parse(lines) == records, (seed, target)
+
+def test_manifest_with_sizes(tmp_path):
+    first = tmp_path / 'a.csv'
+    first.write_bytes(b'x\n1\n')
+    second = tmp_path / 'b.csv'
+    second.write_bytes(b'x\n1\n2\n')
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text(f'# comentario\n{first},4\n\n{second}\n')
+    assert discover_files(manifest=str(manifest)) == [(str(first), 4), (str(second), 6)]
+
+def test_pipeline_reads_scheduled_groups(tmp_path):
+    expected = []
+    for seed in range(3):
+        data, records = random_csv(seed, rows=400)
+        (tmp_path / f'datos_{seed}.csv').write_bytes(data)
+        expected.extend(records)
+    data, records = random_csv(99, rows=100)
+    (tmp_path / 'comprimido.csv.gz').write_bytes(gzip.compress(data))
+    expected.extend(records)
+
+    # 'balanced' con 8 grupos divide cada archivo sin comprimir en rangos de bytes
+    files = discover_files(str(tmp_path / '*'))
+    assert len(split_large_files(files, sum(size for _, size in files) // 8)) > len(files)
+    for strategy in ('balanced', 'lpt', 'naive'):
+        with TestPipeline() as pipeline:
+            lines = pipeline | ReadScheduledFiles(str(tmp_path / '*'), num_groups=8, strategy=strategy,
+                                                  skip_header_lines=1)
+            assert_that(lines | beam.Map(lambda line: tuple(next(csv.reader([line])))),
+                        equal_to([tuple(record) for record in expected]))
@@ -0,0 +1,83 @@
+"""
+🧪 Pruebas de los agregados por clave: detección de claves calientes, salting y reporte de carga
+"""
+
+import csv
+import glob
+import json
+import random
+
+import apache_beam as beam
+import pytest
+from apache_beam.testing.test_pipeline import TestPipeline
+
+from key_aggregates import (BUCKET_MODEL, MIN_HOT_KEY_SAMPLES, ComputeKeyAggregates, HotKeysCombineFn,
+                            column_index, fanout_for_share)
+
+def hot_keys_for(keys, num_workers=8):
+    combine = HotKeysCombineFn(num_workers)
+    accumulators = [combine.create_accumulator() for _ in range(4)]
+    for index, key in enumerate(keys):
+        combine.add_input(accumulators[index % 4], key)
+    return combine.extract_output(combine.merge_accumulators(accumulators))
+
+def test_small_sample_salts_nothing():
+    # 20 claves muestreadas: cada clave repetida parecería tener el 10% de las filas
+    random.seed(1)
+    keys = [f'cliente-{random.randrange(10)}' for _ in range(20)]
+    assert hot_keys_for(keys) == {}
+
+def test_hot_key_needs_share_and_min_sample():
+    random.seed(2)
+    keys = ['MX'] * 5000 + [f'cliente-{random.randrange(1000)}' for _ in range(5000)]
+    hot_keys = hot_keys_for(keys)
+    assert list(hot_keys) == ['MX'] and hot_keys['MX'] == fanout_for_share(0.5, 8)
+
+    # Límite de la muestra: min_samples / umbral = 20 · 2 · 2 workers = 80 claves
+    required = MIN_HOT_KEY_SAMPLES * 2 * 2
+    assert hot_keys_for(['MX'] * (required - 1), num_workers=2) == {}
+    assert hot_keys_for(['MX'] * required, num_workers=2) == {'MX': 4}
+
+def test_fanout_and_column_index():
+    assert fanout_for_share(0.01, 8) == 2
+    assert fanout_for_share(0.5, 8) == 8
+    assert fanout_for_share(1.0, 2) == 4
+    assert column_index('2', []) == 2
+    assert column_index('monto', ['id', 'monto']) == 1
+    with pytest.raises(ValueError):
+        column_index('falta', ['id'])
+
+def run_aggregates(tmp_path, rows, sample_rate, num_workers=8):
+    prefix = str(tmp_path / 'agregados')
+    with TestPipeline() as pipeline:
+        _ = (pipeline
+             | beam.Create(rows)
+             | ComputeKeyAggregates(prefix, 0, [1], ['monto'], num_workers, sample_rate))
+    aggregates = {}
+    for path in glob.glob(f'{prefix}-*.csv'):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            assert next(reader) == ['key', 'rows', 'sum_monto']
+            aggregates.update({key: (int(count), float(total)) for key, count, total in reader})
+    with open(f'{prefix}.load.json') as f:
+        return aggregates, json.load(f)
+
+def test_skewed_keys_are_salted_and_sums_are_exact(tmp_path):
+    rows = [['MX', '1.5']] * 3000 + [[f'c{index % 50}', '2'] for index in range(1000)]
+    aggregates, report = run_aggregates(tmp_path, rows, sample_rate=1.0)
+
+    assert aggregates['MX'] == (3000, 4500.0)
+    assert aggregates['c7'] == (20, 40.0)
+    assert len(aggregates) == 51
+    assert [item['key'] for item in report['hot_keys']] == ['MX']
+    assert report['imbalance_after'] < report['imbalance_before']
+    assert report['bucket_model'] == BUCKET_MODEL
+    assert sum(report['rows_per_worker_before']) == sum(report['rows_per_worker_after']) == 4000
+
+def test_two_thousand_uniform_rows_have_no_spurious_hot_keys(tmp_path):
+    random.seed(4)
+    rows = [[f'cliente-{random.randrange(200)}', '1'] for _ in range(2000)]
+    aggregates, report = run_aggregates(tmp_path, rows, sample_rate=0.01)
+    assert report['hot_keys'] == []
+    assert report['rows_per_worker_before'] == report['rows_per_worker_after']
+    assert sum(count for count, _ in aggregates.values()) == 2000
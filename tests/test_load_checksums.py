@@ -0,0 +1,128 @@
+"""
+🧪 Pruebas de los checksums de carga: texto canónico por tipo, fake SQLite y consultas de BigQuery
+"""
+
+import sqlite3
+from types import SimpleNamespace
+
+import apache_beam as beam
+import pytest
+from apache_beam.testing.test_pipeline import TestPipeline
+
+from load_checksums import (BigQueryAggregates, ComputeChecksums, SQLiteAggregates, canonical_value,
+                            column_types_from_schema, read_manifest, validate)
+
+SCHEMA = 'id:INTEGER,precio:FLOAT,activo:BOOLEAN,fecha:DATE,nombre:STRING'
+ROWS = [
+    ['007', '2.50', 'TRUE', '2024-01-05', 'Ana'],
+    ['8', '1e3', '0', '2024-02-29', ''],
+    ['9', '', 'yes', '', 'Luis, Jr'],
+]
+# Como quedan en el destino tras la conversión de tipos
+LOADED = [
+    (7, 2.5, 1, '2024-01-05', 'Ana'),
+    (8, 1000.0, 0, '2024-02-29', None),
+    (9, None, 1, None, 'Luis, Jr'),
+]
+
+@pytest.mark.parametrize('value, column_type, expected', [
+    ('007', 'INTEGER', '7'),
+    (7, 'INT64', '7'),
+    ('2.50', 'FLOAT', '2.5'),
+    (1000.0, 'FLOAT64', '1000'),
+    ('0.1', 'FLOAT', '0.10000000000000001'),
+    ('1.50', 'NUMERIC', '1.5'),
+    ('2.0000000005', 'NUMERIC', '2.000000001'),
+    ('-0.000', 'NUMERIC', '0'),
+    ('12345678901234567890.1234567895', 'NUMERIC', '12345678901234567890.12345679'),
+    ('1' * 38 + '.' + '5' * 40, 'BIGNUMERIC', '1' * 38 + '.' + '5' * 37 + '6'),
+    ('TRUE', 'BOOLEAN', 'true'),
+    (0, 'BOOL', 'false'),
+    ('2024-01-05', 'DATE', '2024-01-05'),
+    ('2024-01-05T10:00:00-06:00', 'TIMESTAMP', '2024-01-05 16:00:00.000000'),
+    ('2024-01-05 16:00:00 UTC', 'TIMESTAMP', '2024-01-05 16:00:00.000000'),
+    ('2024-01-05T10:00:00.5', 'DATETIME', '2024-01-05 10:00:00.500000'),
+    ('no-numero', 'INTEGER', 'no-numero'),
+    (' texto ', 'STRING', ' texto '),
+])
+def test_canonical_value(value, column_type, expected):
+    assert canonical_value(value, column_type) == expected
+
+def write_manifest(tmp_path, rows=ROWS, schema=SCHEMA):
+    manifest_path = str(tmp_path / 'manifest.json')
+    names = [field.split(':')[0] for field in schema.split(',')]
+    with TestPipeline() as pipeline:
+        _ = (pipeline
+             | 'Rows' >> beam.Create(rows)
+             | ComputeChecksums(manifest_path, names, column_types_from_schema(schema)))
+    return read_manifest(manifest_path)
+
+def load_sqlite(tmp_path, rows=LOADED,
+                columns='id INTEGER, precio REAL, activo BOOLEAN, fecha TEXT, nombre TEXT'):
+    db_path = str(tmp_path / 'almacen.db')
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(f'CREATE TABLE raw_data ({columns})')
+        connection.executemany('INSERT INTO raw_data VALUES (?, ?, ?, ?, ?)', rows)
+    return db_path
+
+def test_manifest_matches_typed_destination(tmp_path):
+    manifest = write_manifest(tmp_path)
+    assert manifest['row_count'] == 3
+    assert [column['type'] for column in manifest['columns']] == ['INTEGER', 'FLOAT', 'BOOLEAN', 'DATE', 'STRING']
+    assert validate(manifest, SQLiteAggregates(load_sqlite(tmp_path))) == []
+
+def test_detects_changed_value_and_missing_row(tmp_path):
+    manifest = write_manifest(tmp_path)
+    changed = [(7, 2.5, 0, '2024-01-05', 'Ana')] + LOADED[1:]
+    mismatches = validate(manifest, SQLiteAggregates(load_sqlite(tmp_path, changed)))
+    assert mismatches == ['activo: suma de hashes distinta']
+
+    (tmp_path / 'almacen.db').unlink()
+    mismatches = validate(manifest, SQLiteAggregates(load_sqlite(tmp_path, LOADED[:2])))
+    assert mismatches[0] == 'filas: manifiesto 3 vs destino 2'
+
+def test_type_mismatch_only_compares_nulls(tmp_path):
+    # Sin esquema en el pipeline todo es STRING; el destino tiene tipos
+    manifest = write_manifest(tmp_path, schema='id,precio,activo,fecha,nombre')
+    assert validate(manifest, SQLiteAggregates(load_sqlite(tmp_path))) == []
+
+class FakeBigQueryClient:
+    """Cliente mínimo que registra las consultas y devuelve filas fijas"""
+
+    def __init__(self, schema, result):
+        self.schema = schema
+        self.result = result
+        self.queries = []
+
+    def get_table(self, table):
+        return SimpleNamespace(schema=self.schema, num_rows=0)
+
+    def query(self, sql):
+        self.queries.append(sql)
+        return SimpleNamespace(result=lambda: [self.result])
+
+def make_bigquery(schema, result):
+    aggregates = BigQueryAggregates.__new__(BigQueryAggregates)
+    aggregates.client = FakeBigQueryClient(schema, result)
+    aggregates.table = 'proyecto.dataset.tabla'
+    return aggregates
+
+def test_bigquery_counts_with_query_and_hashes_every_type():
+    schema = [SimpleNamespace(name='id', field_type='INT64', mode='NULLABLE'),
+              SimpleNamespace(name='precio', field_type='FLOAT', mode='NULLABLE'),
+              SimpleNamespace(name='etiquetas', field_type='STRING', mode='REPEATED')]
+    aggregates = make_bigquery(schema, {'row_count': 42, 'n0': 0, 'h0': '5', 'n1': 1, 'h1': '6', 'n2': 0})
+
+    # El conteo sale de una consulta (incluye el buffer de streaming), no de num_rows
+    assert aggregates.row_count() == 42
+    assert aggregates.client.queries[0] == 'SELECT COUNT(*) AS row_count FROM `proyecto.dataset.tabla`'
+
+    columns = aggregates.columns()
+    assert [column['type'] for column in columns] == ['INTEGER', 'FLOAT', 'STRING']
+    result = aggregates.aggregates(columns)
+    sql = aggregates.client.queries[1]
+    assert 'MD5(CAST(`id` AS STRING))' in sql
+    assert "MD5(FORMAT('%.17g', `precio`))" in sql
+    assert 'h2' not in sql
+    assert result == {'id': {'null_count': 0, 'hash_sum': '5'}, 'precio': {'null_count': 1, 'hash_sum': '6'},
+                      'etiquetas': {'null_count': 0, 'hash_sum': None}}
@@ -0,0 +1,108 @@
+"""
+🧪 Pruebas del almacén local SQLite: conversión de tipos, filas rechazadas y disposiciones
+"""
+
+import decimal
+import logging
+import sqlite3
+
+import apache_beam as beam
+import pytest
+from apache_beam.io.gcp.bigquery import BigQueryDisposition
+from apache_beam.testing.test_pipeline import TestPipeline
+
+from load_checksums import ChecksumCombineFn, SQLiteAggregates, build_manifest, column_types_from_schema, validate
+from local_warehouse_sink import WriteToLocalWarehouse, _convert, connect, load_csv
+
+SCHEMA = 'id:INTEGER,precio:FLOAT,activo:BOOLEAN,nombre:STRING'
+CSV = ('id,precio,activo,nombre\n'
+       '1,2.5,true,Ana\n'
+       '2,3,FALSE,"Luis, Jr"\n'
+       '3,,1,\n'
+       'x,1.0,true,Mal\n'
+       '4,1.0,quizás,Mal\n'
+       '5,0.5,no,Sol\n')
+
+def query(db_path, sql):
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute(sql).fetchall()
+
+@pytest.mark.parametrize('value, field_type, expected', [
+    ('true', 'BOOLEAN', 1), ('F', 'BOOLEAN', 0), ('Yes', 'BOOLEAN', 1), ('0', 'BOOLEAN', 0), (True, 'BOOLEAN', 1),
+    ('7', 'INTEGER', 7), ('2.5', 'REAL', 2.5), ('', 'BOOLEAN', None), ('texto', 'TEXT', 'texto'),
+    ('0.10', 'NUMERIC_TEXT', '0.1'), ('2.0000000005', 'NUMERIC_TEXT', '2.000000001'), ('-0.0', 'NUMERIC_TEXT', '0'),
+    ('12345678901234567890.123456789', 'NUMERIC_TEXT', '12345678901234567890.123456789'),
+])
+def test_convert(value, field_type, expected):
+    assert _convert(value, field_type) == expected
+
+@pytest.mark.parametrize('value, field_type', [('quizás', 'BOOLEAN'), ('1,5', 'NUMERIC_TEXT'), ('NaN', 'NUMERIC_TEXT')])
+def test_convert_rejects_invalid_values(value, field_type):
+    with pytest.raises(ValueError):
+        _convert(value, field_type)
+
+def test_numeric_keeps_exact_decimals(tmp_path):
+    csv_path = tmp_path / 'montos.csv'
+    csv_path.write_text('id,monto\n1,0.1\n2,0.2\n3,12345678901234567890.123456789\n')
+    db_path = str(tmp_path / 'almacen.db')
+    schema = 'id:INTEGER,monto:NUMERIC'
+    load_csv(db_path, 'd.montos', [str(csv_path)], schema)
+
+    with connect(db_path) as connection:
+        values = [row[0] for row in connection.execute('SELECT monto FROM "d.montos" ORDER BY id')]
+    connection.close()
+    assert values == [decimal.Decimal('0.1'), decimal.Decimal('0.2'),
+                      decimal.Decimal('12345678901234567890.123456789')]
+    assert sum(values[:2]) == decimal.Decimal('0.3')
+
+    # Los checksums comparan el decimal exacto del destino
+    combine = ChecksumCombineFn(2, column_types_from_schema(schema))
+    accumulator = combine.create_accumulator()
+    for row in (['1', '0.10'], ['2', '0.2'], ['3', '12345678901234567890.123456789']):
+        accumulator = combine.add_input(accumulator, row)
+    manifest = build_manifest(accumulator, ['id', 'monto'], column_types_from_schema(schema))
+    assert validate(manifest, SQLiteAggregates(db_path, 'd.montos')) == []
+
+def test_load_csv_counts_written_rows_and_warns(tmp_path, caplog):
+    csv_path = tmp_path / 'datos.csv'
+    csv_path.write_text(CSV)
+    db_path = str(tmp_path / 'almacen.db')
+
+    with caplog.at_level(logging.WARNING, logger='local_warehouse_sink'):
+        written = load_csv(db_path, 'proyecto:dataset.tabla', [str(csv_path)], SCHEMA)
+    assert written == 4
+    assert query(db_path, 'SELECT id, precio, activo, nombre FROM "dataset.tabla" ORDER BY id') == [
+        (1, 2.5, 1, 'Ana'), (2, 3.0, 0, 'Luis, Jr'), (3, None, 1, None), (5, 0.5, 0, 'Sol')]
+    assert '2 filas rechazadas' in caplog.text
+
+def test_dispositions(tmp_path):
+    csv_path = tmp_path / 'datos.csv'
+    csv_path.write_text('id\n1\n2\n')
+    db_path = str(tmp_path / 'almacen.db')
+
+    with pytest.raises(RuntimeError):
+        load_csv(db_path, 'd.t', [str(csv_path)], 'id:INTEGER', create_disposition=BigQueryDisposition.CREATE_NEVER)
+    assert load_csv(db_path, 'd.t', [str(csv_path)], 'id:INTEGER') == 2
+    assert load_csv(db_path, 'd.t', [str(csv_path)], 'id:INTEGER') == 2
+    assert query(db_path, 'SELECT COUNT(*) FROM "d.t"') == [(4,)]
+    with pytest.raises(RuntimeError):
+        load_csv(db_path, 'd.t', [str(csv_path)], write_disposition=BigQueryDisposition.WRITE_EMPTY)
+    load_csv(db_path, 'd.t', [str(csv_path)], write_disposition=BigQueryDisposition.WRITE_TRUNCATE)
+    assert query(db_path, 'SELECT COUNT(*) FROM "d.t"') == [(2,)]
+
+def test_pipeline_write_and_checksums(tmp_path):
+    db_path = str(tmp_path / 'almacen.db')
+    rows = [['1', '2.5', 'true', 'Ana'], ['2', '3', 'n', ''], ['3', '', 'Y', 'Eva']]
+    with TestPipeline() as pipeline:
+        _ = (pipeline
+             | beam.Create([rows[:2], rows[2]])  # Un lote de BatchElements y una fila suelta
+             | WriteToLocalWarehouse('dataset.tabla', db_path, SCHEMA))
+    assert query(db_path, 'SELECT activo FROM "dataset.tabla" ORDER BY id') == [(1,), (0,), (1,)]
+
+    # Los checksums del pipeline validan contra la tabla con tipos (booleanos incluidos)
+    combine = ChecksumCombineFn(4, column_types_from_schema(SCHEMA))
+    accumulator = combine.create_accumulator()
+    for row in rows:
+        accumulator = combine.add_input(accumulator, row)
+    manifest = build_manifest(accumulator, ['id', 'precio', 'activo', 'nombre'], column_types_from_schema(SCHEMA))
+    assert validate(manifest, SQLiteAggregates(db_path, 'dataset.tabla')) == []
@@ -0,0 +1,105 @@
+"""
+🧪 Pruebas del lector mmap: los rangos alineados reproducen exactamente el CSV
+"""
+
+import csv
+import io
+import random
+
+import pytest
+
+import mmap_csv_reader
+from mmap_csv_reader import open_mmap, parse_record, scan_records, split_ranges
+
+FIELD_PIECES = ['abc', '12', '', ' ', ',', '"', '""', '\n', 'x\ny', 'ñ', 'a,b', '"q"']
+
+def random_rows(rng: random.Random, count: int, width: int = 4):
+    return [[''.join(rng.choice(FIELD_PIECES) for _ in range(rng.randint(0, 3)))
+             for _ in range(width)] for _ in range(count)]
+
+def write_csv(path, rows, lineterminator='\n', header=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=lineterminator)
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    path.write_bytes(buffer.getvalue().encode('utf-8'))
+
+def read_ranges(path, ranges):
+    handle, mm = open_mmap(str(path))
+    try:
+        return [[parse_record(record) for record in scan_records(mm, start, end)]
+                for start, end in ranges]
+    finally:
+        mm.close()
+        handle.close()
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('num_ranges', [1, 2, 3, 7, 16])
+def test_ranges_reproduce_csv_module(tmp_path, seed, num_ranges):
+    rng = random.Random(seed)
+    rows = random_rows(rng, 200)
+    path = tmp_path / 'data.csv'
+    write_csv(path, rows, lineterminator=rng.choice(['\n', '\r\n']))
+
+    ranges = split_ranges(str(path), num_ranges, processes=1)
+    chunks = read_ranges(path, ranges)
+
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == path.stat().st_size
+    assert all(ranges[i][1] == ranges[i + 1][0] for i in range(len(ranges) - 1))
+    assert [row for chunk in chunks for row in chunk] == rows
+
+def test_every_cut_position_lands_on_record_start(tmp_path):
+    rows = [['1', 'a\n"b"\nc', 'x'], ['2', '""', 'y,z'], ['3', '\n\n', '']]
+    path = tmp_path / 'data.csv'
+    write_csv(path, rows * 5)
+    size = path.stat().st_size
+
+    for num_ranges in range(2, size + 1, 3):
+        ranges = split_ranges(str(path), num_ranges, processes=1)
+        assert [row for chunk in read_ranges(path, ranges) for row in chunk] == rows * 5
+
+def test_skip_header_lines_with_quoted_newline_in_header(tmp_path):
+    rows = [['1', 'a'], ['2', 'b\nc']]
+    path = tmp_path / 'data.csv'
+    write_csv(path, rows, header=['id', 'nota\nlarga'])
+
+    ranges = split_ranges(str(path), 3, skip_header_lines=1, processes=1)
+
+    assert [row for chunk in read_ranges(path, ranges) for row in chunk] == rows
+
+def test_quote_unaware_splits_on_every_newline(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(b'1,"a\nb"\n2,c\n')
+
+    ranges = split_ranges(str(path), 1, quote_aware=False)
+    handle, mm = open_mmap(str(path))
+    try:
+        records = [bytes(record) for record in scan_records(mm, *ranges[0], quote_aware=False)]
+    finally:
+        mm.close()
+        handle.close()
+
+    assert records == [b'1,"a', b'b"', b'2,c']
+
+def test_empty_file_has_no_ranges(tmp_path):
+    path = tmp_path / 'empty.csv'
+    path.write_bytes(b'')
+
+    assert split_ranges(str(path), 4) == []
+
+def test_parallel_scan_counts_records(tmp_path):
+    rows = random_rows(random.Random(42), 300)
+    path = tmp_path / 'data.csv'
+    write_csv(path, rows, header=['a', 'b', 'c', 'd'])
+
+    results = mmap_csv_reader.parallel_scan(str(path), 3, handler=mmap_csv_reader.count_fields,
+                                            skip_header_lines=1)
+
+    assert sum(result[0] for result in results) == len(rows)
+    assert sum(result[1] for result in results) == 4 * len(rows)
+
+def test_parallel_scan_rejects_gzip():
+    with pytest.raises(ValueError):
+        mmap_csv_reader.parallel_scan('datos.csv.gz', 2)
@@ -0,0 +1,68 @@
+"""
+🧪 Pruebas del análisis por etapa del monitor sobre un job grabado (ejecución con FanOut)
+"""
+
+import os
+
+import pytest
+
+from monitor_pipeline import (RecordedMetricsSource, analyze_bottleneck, extract_stage_metrics,
+                              replay_metrics, stage_for_step)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'recorded_job.json')
+
+@pytest.mark.parametrize('step, stage', [
+    ('ReadCSV/Read/Map(<lambda at iobase.py:908>)', 'read'),
+    ('ProcessCSV', 'parse'),
+    ('FanOut/RouteRows.mx', 'parse'),
+    ('Materialize', 'parse'),
+    ('Reshuffle/ReshufflePerKey/GroupByKey', 'reshuffle'),
+    ('Write/WriteToBigQuery/_StreamToBigQuery/StreamInsertRows', 'write'),
+    ('FanOut/Write_mx/WriteToBigQuery/_StreamToBigQuery/CommitInsertIds/ReshufflePerKey', 'write'),
+    ('FanOut/Write_raw/WriteToLocalWarehouse/WriteRows', 'write'),
+    ('Checksums/WriteManifest', 'aggregate'),
+    ('ColumnProfile/CombineSketches', 'aggregate'),
+    ('KeyAggregates/WriteAggregates/Write/WriteImpl', 'aggregate'),
+    ('Desconocido', None),
+])
+def test_stage_for_step(step, stage):
+    assert stage_for_step(step) == stage
+
+def load_snapshots():
+    source = RecordedMetricsSource(FIXTURE)
+    snapshots = []
+    while True:
+        snapshot = source.fetch(None)
+        if snapshot is None:
+            return snapshots
+        snapshots.append((snapshot[0], extract_stage_metrics(snapshot[1])))
+
+def test_routed_writes_are_counted():
+    snapshots = load_snapshots()
+    stages = snapshots[-1][1]
+
+    assert len(snapshots) == 4
+    # Se ignoran los valores tentativos y se toma el mayor ElementCount por etapa
+    assert stages['read']['elements'] == 14_000_000
+    assert stages['write']['elements'] == 5_600_000
+    assert stages['write']['msecs'] == 3 * 190_000
+    assert stages['aggregate']['elements'] == 13_700_000
+    assert stages['reshuffle'] == {'elements': 0, 'msecs': 0}
+
+def test_bottleneck_is_the_routed_sink():
+    (first_time, first), (second_time, second) = load_snapshots()[2:]
+
+    analysis = analyze_bottleneck(first, second, second_time - first_time)
+
+    assert analysis['write']['slowest']
+    assert analysis['write']['backlog'] == 13_700_000 - 5_600_000
+    assert analysis['write']['backlog_growth'] > 0
+    # Las etapas ausentes y las ramas laterales no acumulan backlog
+    assert analysis['reshuffle']['backlog'] == 0
+    assert analysis['aggregate']['backlog'] == 0
+
+def test_replay_prints_every_interval(capsys):
+    replay_metrics(RecordedMetricsSource(FIXTURE))
+
+    output = capsys.readouterr().out
+    assert output.count('🐢 Etapa más lenta: write (acumulando backlog)') == 3
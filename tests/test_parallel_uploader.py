@@ -0,0 +1,192 @@
+"""
+🧪 Pruebas de la subida concurrente con el backend local y subidas reanudables
+"""
+
+import os
+
+import pytest
+import requests
+
+import parallel_uploader
+from parallel_uploader import MB, LocalBackend, ParallelUploader, _RangeReader
+
+class FlakyBackend(LocalBackend):
+    """Backend local que falla las primeras llamadas indicadas por nombre"""
+
+    def __init__(self, root_dir, upload_failures=None, compose_failures=None):
+        super().__init__(root_dir)
+        self.upload_failures = dict(upload_failures or {})
+        self.compose_failures = dict(compose_failures or {})
+        self.uploads = []
+
+    def upload(self, local_path, name, start=0, length=None):
+        self.uploads.append(name)
+        if self.upload_failures.get(name, 0) > 0:
+            self.upload_failures[name] -= 1
+            raise ConnectionError(f"fallo simulado en {name}")
+        super().upload(local_path, name, start, length)
+
+    def compose(self, sources, name):
+        if self.compose_failures.get(name, 0) > 0:
+            self.compose_failures[name] -= 1
+            raise ConnectionError(f"fallo simulado en compose de {name}")
+        super().compose(sources, name)
+
+class FakeResumableTransport:
+    """Servidor de subida reanudable mínimo que pierde un chunk una vez (HTTP 503)"""
+
+    def __init__(self):
+        self.received = bytearray()
+        self.fail_pending = True
+
+    def request(self, method, url, data=None, headers=None, timeout=None, **kwargs):
+        response = requests.Response()
+        response._content = b'{}'
+        if method == 'POST':
+            response.status_code = 200
+            response.headers['location'] = 'http://fake/upload?upload_id=1'
+            return response
+
+        span, _, total = headers['content-range'].split(' ')[1].partition('/')
+        if span != '*':
+            first, _, last = span.partition('-')
+            if self.fail_pending and int(first) > 0:
+                self.fail_pending = False
+                response.status_code = 503
+                return response
+            payload = data if isinstance(data, bytes) else data.read()
+            del self.received[int(first):]
+            self.received += payload
+            if int(last) + 1 == int(total):
+                response.status_code = 200
+                return response
+        response.status_code = 308
+        response.headers['range'] = f"bytes=0-{len(self.received) - 1}"
+        return response
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / 'shard.csv'
+    path.write_bytes(os.urandom(3 * MB + 12345))
+    return str(path)
+
+def test_range_reader_tell_and_seek_are_relative(source_file):
+    data = open(source_file, 'rb').read()
+
+    with _RangeReader(source_file, 100, 50) as reader:
+        assert reader.tell() == 0
+        assert reader.read(10) == data[100:110]
+        assert reader.tell() == 10
+        assert reader.seek(0, os.SEEK_END) == 50
+        assert reader.read() == b''
+        reader.seek(-5, os.SEEK_CUR)
+        assert reader.read() == data[145:150]
+        reader.seek(20)
+        assert reader.read(1000) == data[120:150]
+
+def test_range_reader_drives_resumable_upload(source_file):
+    from google.resumable_media.requests import ResumableUpload
+
+    data = open(source_file, 'rb').read()
+    start, length = 4321, 2 * MB + 7
+    transport = FakeResumableTransport()
+    upload = ResumableUpload('http://fake/upload', 256 * 1024)
+
+    with _RangeReader(source_file, start, length) as reader:
+        upload.initiate(transport, reader, {'name': 'part'}, 'application/octet-stream',
+                        total_bytes=length, stream_final=False)
+        while not upload.finished:
+            try:
+                upload.transmit_next_chunk(transport)
+            except Exception:
+                # recover() consulta el offset confirmado y hace seek() sobre el lector
+                upload.recover(transport)
+
+    assert not transport.fail_pending
+    assert bytes(transport.received) == data[start:start + length]
+
+def test_small_and_composite_files_round_trip(tmp_path, source_file):
+    small = tmp_path / 'small.csv'
+    small.write_bytes(b'a,b\n1,2\n')
+    destination = tmp_path / 'bucket'
+    uploader = ParallelUploader(LocalBackend(str(destination)), max_in_flight=4,
+                                composite_threshold=1 * MB, part_size=256 * 1024)
+
+    stats = uploader.upload_files([(str(small), 'out/small.csv'), (source_file, 'out/big.csv')])
+
+    assert stats['files'] == 2 and stats['composite_files'] == 1
+    assert stats['parts'] == 13
+    assert (destination / 'out' / 'small.csv').read_bytes() == small.read_bytes()
+    assert (destination / 'out' / 'big.csv').read_bytes() == open(source_file, 'rb').read()
+    assert sorted(os.listdir(destination / 'out')) == ['big.csv', 'small.csv']
+
+def test_multi_level_compose_leaves_no_intermediate_objects(tmp_path, source_file):
+    destination = tmp_path / 'bucket'
+    uploader = ParallelUploader(LocalBackend(str(destination)), max_in_flight=8,
+                                composite_threshold=1, part_size=64 * 1024)
+
+    stats = uploader.upload_files([(source_file, 'big.csv')])
+
+    assert stats['parts'] > parallel_uploader.MAX_COMPOSE_SOURCES
+    assert os.listdir(destination) == ['big.csv']
+    assert (destination / 'big.csv').read_bytes() == open(source_file, 'rb').read()
+
+def test_failed_parts_are_retried(tmp_path, source_file):
+    destination = tmp_path / 'bucket'
+    backend = FlakyBackend(str(destination), upload_failures={'big.csv.part-00002': 2})
+    uploader = ParallelUploader(backend, max_in_flight=4, composite_threshold=1 * MB,
+                                part_size=1 * MB, retry_base_seconds=0.0)
+
+    stats = uploader.upload_files([(source_file, 'big.csv')])
+
+    assert stats['retries'] == 2
+    assert backend.uploads.count('big.csv.part-00002') == 3
+    assert (destination / 'big.csv').read_bytes() == open(source_file, 'rb').read()
+
+def test_parts_are_deleted_when_a_part_keeps_failing(tmp_path, source_file):
+    destination = tmp_path / 'bucket'
+    backend = FlakyBackend(str(destination), upload_failures={'big.csv.part-00001': 10})
+    uploader = ParallelUploader(backend, max_in_flight=4, composite_threshold=1 * MB,
+                                part_size=1 * MB, max_attempts=2, retry_base_seconds=0.0)
+
+    with pytest.raises(ConnectionError):
+        uploader.upload_files([(source_file, 'big.csv')])
+
+    assert os.listdir(destination) == []
+
+def test_orphans_are_deleted_when_compose_fails(tmp_path, source_file):
+    destination = tmp_path / 'bucket'
+    backend = FlakyBackend(str(destination), compose_failures={'big.csv': 10})
+    uploader = ParallelUploader(backend, max_in_flight=8, composite_threshold=1,
+                                part_size=64 * 1024, max_attempts=2, retry_base_seconds=0.0)
+
+    with pytest.raises(ConnectionError):
+        uploader.upload_files([(source_file, 'big.csv')])
+
+    # Ni partes ni grupos intermedios de compose quedan en el destino
+    assert os.listdir(destination) == []
+
+def test_other_files_parts_are_deleted_when_one_file_fails(tmp_path, source_file):
+    other = tmp_path / 'other.csv'
+    other.write_bytes(os.urandom(4 * MB))
+    destination = tmp_path / 'bucket'
+    backend = FlakyBackend(str(destination), upload_failures={'big.csv.part-00000': 10})
+    uploader = ParallelUploader(backend, max_in_flight=2, composite_threshold=1 * MB,
+                                part_size=512 * 1024, max_attempts=2, retry_base_seconds=0.0)
+
+    with pytest.raises(ConnectionError):
+        uploader.upload_files([(source_file, 'big.csv'), (str(other), 'other.csv')])
+
+    # Las partes de other.csv (subidas o canceladas) no quedan huérfanas
+    assert os.listdir(destination) == []
+
+def test_incomplete_backend_fails_at_construction(tmp_path):
+    class NoDelete(parallel_uploader.StorageBackend):
+        def upload(self, local_path, name, start=0, length=None):
+            pass
+
+        def compose(self, sources, name):
+            pass
+
+    with pytest.raises(TypeError):
+        NoDelete()
@@ -0,0 +1,95 @@
+"""
+🧪 Pruebas del profiling por DoFn: muestreo, pilas colapsadas y reporte
+"""
+
+import os
+import time
+from collections import Counter
+
+import apache_beam as beam
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+import pipeline_profiler
+from pipeline_profiler import (ProfiledDoFn, hot_functions, merge_profiles, profile_stage,
+                               profiled, read_folded, render_flamegraph, write_folded)
+
+def busy_loop(seconds: float):
+    deadline = time.time() + seconds
+    total = 0
+    while time.time() < deadline:
+        total += 1
+    return total
+
+class SlowDoubleFn(beam.DoFn):
+    def process(self, element):
+        busy_loop(0.01)
+        yield element * 2
+
+def test_folded_round_trip(tmp_path):
+    stacks = Counter({'main;parse;split': 5, 'main;write': 2})
+    path = str(tmp_path / 'etapa.1.abcd.folded')
+
+    write_folded(path, stacks)
+
+    assert read_folded(path) == stacks
+
+def test_profile_stage_samples_current_thread(tmp_path):
+    with profile_stage('escaneo', str(tmp_path), interval_ms=1.0):
+        busy_loop(0.1)
+
+    merged = merge_profiles(str(tmp_path))
+    assert list(merged) == ['escaneo']
+    assert any('busy_loop' in stack for stack in merged['escaneo'])
+
+def test_profile_stage_is_noop_without_directory(tmp_path):
+    with profile_stage('escaneo', None):
+        busy_loop(0.01)
+
+    assert os.listdir(tmp_path) == []
+
+def test_hot_functions_self_and_total():
+    stacks = Counter({'a;b;c': 3, 'a;b': 1, 'a;d': 2})
+
+    table = hot_functions(stacks)
+
+    assert table[0] == ('c', 3, 3)
+    assert ('b', 1, 4) in table
+    assert ('d', 2, 2) in table
+
+def test_flamegraph_is_escaped_svg():
+    svg = render_flamegraph(Counter({'<main>;f&g': 4}), 'etapa <x>')
+
+    assert svg.startswith('<svg') and svg.endswith('</svg>')
+    assert '&lt;main&gt;' in svg and 'f&amp;g' in svg
+
+def test_profiled_returns_original_fn_when_disabled():
+    fn = SlowDoubleFn()
+
+    assert profiled(fn, 'etapa', PipelineOptions([])) is fn
+
+def test_profiled_dofn_in_pipeline_writes_stage_profile(tmp_path):
+    options = PipelineOptions([f'--dofn_profile_dir={tmp_path}', '--dofn_profile_interval_ms=1'])
+    fn = profiled(SlowDoubleFn(), 'Duplicar', options)
+    assert isinstance(fn, ProfiledDoFn)
+
+    with TestPipeline(options=options) as pipeline:
+        output = pipeline | beam.Create(range(20)) | beam.ParDo(fn)
+        assert_that(output, equal_to([value * 2 for value in range(20)]))
+
+    merged = merge_profiles(str(tmp_path))
+    assert 'Duplicar' in merged
+    assert any('busy_loop' in stack for stack in merged['Duplicar'])
+
+def test_write_report_aggregates_workers(tmp_path, capsys):
+    write_folded(str(tmp_path / 'Parse.100.aaaa.folded'), Counter({'main;parse': 3}))
+    write_folded(str(tmp_path / 'Parse.200.bbbb.folded'), Counter({'main;parse': 2, 'main;io': 1}))
+    output_dir = tmp_path / 'reporte'
+
+    merged = pipeline_profiler.write_report(str(tmp_path), str(output_dir))
+
+    assert merged == {'Parse': Counter({'main;parse': 5, 'main;io': 1})}
+    assert read_folded(str(output_dir / 'Parse.folded')) == merged['Parse']
+    assert (output_dir / 'Parse.svg').exists()
+    assert 'Parse (6 muestras)' in capsys.readouterr().out
@@ -0,0 +1,103 @@
+"""
+🧪 Pruebas de QuotedCSVSource sobre archivos sintéticos
+📄 Saltos de línea dentro de campos, comillas escapadas ("") y finales CRLF
+"""
+
+import csv
+import io
+import random
+
+import pytest
+
+from apache_beam.io import source_test_utils
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from quoted_csv_source import QuotedCSVSource, ReadQuotedCSV, find_record_start, iter_records
+
+FIELD_PIECES = ['abc', '7', '', ' ', ',', '"', '""', '\n', 'x\ny', 'ñ', 'a,b', '"q"', '\n"\n']
+
+def synthetic_rows(seed: int, count: int, width: int = 3):
+    rng = random.Random(seed)
+    return [[str(index)] + [''.join(rng.choice(FIELD_PIECES) for _ in range(rng.randint(0, 3)))
+                            for _ in range(width - 1)] for index in range(count)]
+
+def write_csv(path, rows, lineterminator='\n', header=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=lineterminator)
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    path.write_bytes(buffer.getvalue().encode('utf-8'))
+    return str(path)
+
+@pytest.fixture
+def multiline_csv(tmp_path):
+    rows = synthetic_rows(7, 40)
+    return write_csv(tmp_path / 'multiline.csv', rows, header=['id', 'nota', 'texto']), rows
+
+def test_read_back_matches_csv_module(multiline_csv):
+    path, rows = multiline_csv
+
+    records = source_test_utils.read_from_source(QuotedCSVSource(path, skip_header_lines=1))
+
+    assert records == rows
+
+def test_read_back_crlf_and_escaped_quotes(tmp_path):
+    rows = [['1', 'dijo ""hola""', 'x'], ['2', 'línea\r\notra', '"'], ['3', '', '""""']]
+    path = write_csv(tmp_path / 'crlf.csv', rows, lineterminator='\r\n')
+
+    assert source_test_utils.read_from_source(QuotedCSVSource(path)) == rows
+
+@pytest.mark.parametrize('desired_bundle_size', [1, 7, 64, 500])
+def test_splits_cover_every_record_once(multiline_csv, desired_bundle_size):
+    path, _ = multiline_csv
+    source = QuotedCSVSource(path, skip_header_lines=1)
+    splits = [(split.source, split.start_position, split.stop_position)
+              for split in source.split(desired_bundle_size=desired_bundle_size)]
+
+    assert len(splits) > 1 or desired_bundle_size == 500
+    source_test_utils.assert_sources_equal_reference_source(
+        (source, None, None), splits)
+
+def test_split_at_fraction_exhaustive(tmp_path):
+    rows = synthetic_rows(3, 12)
+    path = write_csv(tmp_path / 'small.csv', rows, header=['id', 'a', 'b'])
+    source = QuotedCSVSource(path, skip_header_lines=1)
+
+    source_test_utils.assert_split_at_fraction_exhaustive(source)
+
+def test_split_at_fraction_exhaustive_on_sub_ranges(tmp_path):
+    rows = synthetic_rows(11, 20)
+    path = write_csv(tmp_path / 'ranges.csv', rows, lineterminator='\r\n')
+    source = QuotedCSVSource(path)
+
+    for split in source.split(desired_bundle_size=60):
+        source_test_utils.assert_split_at_fraction_exhaustive(
+            split.source, split.start_position, split.stop_position)
+
+def test_resync_from_inside_quoted_field():
+    data = b'1,"a\nb,c\n2,d"\n3,e\n'
+    # Corte justo después de la comilla de apertura: el primer registro real empieza en "3,e"
+    assert find_record_start(data[3:], 3, at_eof=True) == data.index(b'3,e')
+    # Corte en un inicio de registro
+    assert find_record_start(data[13:], 13, at_eof=True) == 14
+
+def test_resync_near_eof_rejects_unterminated_quote():
+    data = b'39,"77\n","\n\n,"\n'
+    cut = data.index(b'\n,"\n')
+    # Cerca del final ambas hipótesis son válidas, pero solo una cierra sus comillas
+    assert find_record_start(data[cut:], cut, at_eof=True) == len(data)
+
+def test_iter_records_keeps_quoted_newlines_together():
+    data = b'1,"x\ny"\n2,"""\n"""\n3'
+    records = list(iter_records(io.BytesIO(data), 0, read_size=3))
+
+    assert records == [(0, b'1,"x\ny"'), (8, b'2,"""\n"""'), (18, b'3')]
+
+def test_read_quoted_csv_transform(multiline_csv):
+    path, rows = multiline_csv
+
+    with TestPipeline() as pipeline:
+        output = pipeline | ReadQuotedCSV(path, skip_header_lines=1)
+        assert_that(output, equal_to(rows))
@@ -0,0 +1,135 @@
+"""
+🧪 Pruebas del limitador de tasa: cuota simulada, AIMD, reparto por proceso SDK e inserciones limitadas
+"""
+
+import time
+
+import apache_beam as beam
+import pytest
+from apache_beam.metrics import MetricsFilter
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+
+import rate_limiter
+from rate_limiter import (AdaptiveRateLimiter, PacedStreamingInserts, QuotaServer, ThrottledError,
+                          is_throttle_error, machine_vcpus, per_process_rate, rate_limited_call, simulate)
+
+def test_quota_server_rejects_over_window(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: 100.5)
+    server = QuotaServer(100)
+    server.insert(60)
+    with pytest.raises(ThrottledError):
+        server.insert(60)
+    server.insert(40)
+    assert (server.accepted, server.rejected) == (100, 1)
+
+def test_simulated_limiter_throttles_less_than_blind_retries():
+    blind = simulate(quota=2000, workers=8, batch_rows=50, seconds=1.5, limited=False)
+    limited = simulate(quota=2000, workers=8, batch_rows=50, seconds=1.5, limited=True)
+    assert limited['throttle_errors'] < blind['throttle_errors']
+    assert limited['final_rate'] <= 4000
+
+def test_aimd_decreases_once_per_cooldown_and_recovers_to_ceiling():
+    limiter = AdaptiveRateLimiter('prueba_aimd', initial_rate=100, max_rate=100,
+                                  increase_per_second=10000, cooldown_seconds=0.05)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(70)
+    assert limiter.throttle_events == 2
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(70)  # Todavía en enfriamiento
+    time.sleep(0.06)
+    limiter.on_success()
+    assert limiter.rate == 100
+
+def test_rate_limited_call_retries_only_throttles():
+    limiter = AdaptiveRateLimiter('prueba_reintentos', initial_rate=1000)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ThrottledError('quotaExceeded')
+        return 'ok'
+
+    assert rate_limited_call(limiter, flaky, base_seconds=0) == 'ok'
+    assert len(calls) == 2 and limiter.throttle_events == 1
+
+    def broken():
+        calls.append(1)
+        raise ValueError('esquema inválido')
+
+    with pytest.raises(ValueError):
+        rate_limited_call(limiter, broken, base_seconds=0)
+    assert len(calls) == 3
+
+class TooManyRequests(Exception):
+    code = 429
+
+def test_is_throttle_error():
+    assert is_throttle_error(TooManyRequests())
+    assert is_throttle_error(Exception('403 rateLimitExceeded'))
+    assert not is_throttle_error(ValueError('no existe la columna'))
+
+@pytest.mark.parametrize('machine_type, vcpus', [
+    (None, 1), ('n1-standard-4', 4), ('n1-standard-16', 16), ('custom-8-30720', 8),
+    ('zones/us-central1-a/machineTypes/n2-highmem-32', 32), ('e2-medium', 2),
+])
+def test_machine_vcpus(machine_type, vcpus):
+    assert machine_vcpus(machine_type) == vcpus
+
+def test_per_process_rate_divides_by_workers_and_sdk_processes():
+    args = ['--sink_rows_per_second=80000', '--max_num_workers=10', '--machine_type=n1-standard-4']
+    assert per_process_rate(PipelineOptions(args)) == 2000
+    single = PipelineOptions(args + ['--experiments=no_use_multiple_sdk_containers'])
+    assert per_process_rate(single) == 8000
+    assert per_process_rate(PipelineOptions(['--max_num_workers=10'])) is None
+
+class FakeInsertClient:
+    """Cliente de inserciones en memoria: un 429 en la primera inserción y rechazo de filas con id 'x'"""
+
+    events = []
+    throttles_left = 0
+
+    def prepare(self, table, schema, create_disposition, write_disposition):
+        FakeInsertClient.events.append(('prepare', write_disposition))
+
+    def column_names(self, table):
+        raise AssertionError('con esquema no se consulta la tabla')
+
+    def insert(self, table, rows):
+        if FakeInsertClient.throttles_left:
+            FakeInsertClient.throttles_left -= 1
+            raise TooManyRequests('429 Too Many Requests')
+        FakeInsertClient.events.append(('insert', rows))
+        return [{'index': index, 'errors': [{'reason': 'invalid'}]}
+                for index, row in enumerate(rows) if row.get('id') == 'x']
+
+def test_paced_inserts_back_off_inside_the_writer():
+    FakeInsertClient.events = []
+    FakeInsertClient.throttles_left = 1
+    rows = [['1', 'Ana'], ['2', ''], ['x', 'Mal'], ['3', 'Eva']]
+
+    pipeline = TestPipeline()
+    _ = (pipeline
+         | beam.Create(rows)
+         | PacedStreamingInserts('proyecto:dataset.pruebas_paced', 'id:INTEGER,nombre:STRING', 1000,
+                                 write_disposition='WRITE_TRUNCATE', batch_size=10,
+                                 client_factory=FakeInsertClient))
+    result = pipeline.run()
+    result.wait_until_finish()
+
+    assert FakeInsertClient.events[0] == ('prepare', 'WRITE_TRUNCATE')
+    inserted = [row for kind, batch in FakeInsertClient.events[1:] for row in batch]
+    assert sorted(inserted, key=str) == sorted([{'id': '1', 'nombre': 'Ana'}, {'id': '2'},
+                                                {'id': 'x', 'nombre': 'Mal'}, {'id': '3', 'nombre': 'Eva'}], key=str)
+
+    limiter = rate_limiter.get_limiter('streaming_insert:proyecto:dataset.pruebas_paced', 1000)
+    assert limiter.throttle_events == 1 and limiter.max_rate == 1000
+
+    def counter(name):
+        metrics = result.metrics().query(MetricsFilter().with_namespace('rate_limiter').with_name(name))
+        return sum(metric.committed for metric in metrics['counters'])
+
+    assert counter('rows_written') == 3
+    assert counter('rejected_rows') == 1
@@ -0,0 +1,93 @@
+"""
+🧪 Pruebas del historial de ejecuciones y de la configuración que registran los scripts de lanzamiento
+"""
+
+import os
+import shutil
+import stat
+import subprocess
+
+import pytest
+
+from run_history import compare_latest, connect, parse_config, record_run, timeline_from_metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'recorded_job.json')
+MB = 1024 * 1024
+
+def test_parse_config_strips_dashes():
+    config = parse_config(['--num_workers=9', 'region=us-central1', '=sin_clave', 'input_pattern=gs://b/*.csv'])
+    assert config == {'num_workers': '9', 'region': 'us-central1', 'input_pattern': 'gs://b/*.csv'}
+
+def test_compare_latest_flags_regression(tmp_path):
+    connection = connect(str(tmp_path / 'history.db'))
+    config = {'num_workers': '50', 'min_bundle_size': '0'}
+    for index, seconds in enumerate([100, 110, 105]):
+        record_run(connection, 'loader', index * 1000, index * 1000 + seconds, config, input_bytes=1000 * MB)
+    # Configuración distinta: no entra en la referencia
+    record_run(connection, 'loader', 3500, 3510, {'num_workers': '5', 'min_bundle_size': '9'}, input_bytes=1000 * MB)
+    record_run(connection, 'loader', 4000, 4200, config, input_bytes=1000 * MB)
+
+    result = compare_latest(connection, 'loader')
+    assert len(result['similar']) == 3
+    latest, baseline = result['throughput']
+    assert latest == pytest.approx(5.0)
+    assert baseline == pytest.approx(1000 / 105)
+    assert [name for name, _, _ in result['regressions']] == ['total']
+
+def test_timeline_from_recorded_job():
+    samples = timeline_from_metrics(FIXTURE)
+    stages = {stage for _, stage, _, _ in samples}
+    assert {'read', 'parse', 'write'} <= stages
+    assert all(elements >= 0 for _, _, elements, _ in samples)
+
+def _stub(directory, name, body):
+    path = directory / name
+    path.write_text('#!/bin/bash\n' + body)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+def _run_script(tmp_path, script, env_overrides):
+    """Ejecuta el script con gcloud/gsutil/bq/sed/python3 simulados y devuelve las llamadas a python3"""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'python3.log'
+    _stub(bin_dir, 'gcloud', 'echo proyecto-prueba\n')
+    for name in ('gsutil', 'bq', 'sed'):
+        _stub(bin_dir, name, 'exit 0\n')
+    _stub(bin_dir, 'python3', f'printf "%s\\n" "$@" >> "{log}"\necho "---" >> "{log}"\n')
+
+    work_dir = tmp_path / 'repo' / os.path.dirname(script)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copy(os.path.join(ROOT, script), work_dir)
+
+    env = dict(os.environ, PATH=f"{bin_dir}:{os.environ['PATH']}", **env_overrides)
+    subprocess.run(['bash', os.path.basename(script)], cwd=work_dir, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    calls = [call.strip('\n').split('\n') for call in log.read_text().split('---\n') if call.strip()]
+    return calls
+
+@pytest.mark.skipif(shutil.which('bash') is None, reason='requiere bash')
+@pytest.mark.parametrize('script, pipeline, defaults', [
+    ('run_ultra_fast_loader.sh', 'ultra_fast_loader.py',
+     {'max_num_workers': '100', 'machine_type': 'n1-standard-4', 'disk_size_gb': '100'}),
+    ('Sinaumentarcouta/run_8ips_optimized.sh', 'ultra_optimized_8ips.py',
+     {'max_num_workers': '8', 'machine_type': 'n1-standard-16', 'disk_size_gb': '500'}),
+])
+def test_recorded_config_matches_launch_flags(tmp_path, script, pipeline, defaults):
+    calls = _run_script(tmp_path, script, {
+        'NUM_WORKERS': '9',
+        'MIN_BUNDLE_SIZE': '2000000',
+        'EXTRA_PIPELINE_ARGS': '--input_pattern=gs://b/*.csv --input_schedule=lpt',
+    })
+    launch = next(call for call in calls if call[0] == pipeline)
+    record = next(call for call in calls if call[0].endswith('run_history.py') and call[1] == 'record')
+
+    launch_flags = parse_config([arg for arg in launch[1:] if arg.startswith('--') and '=' in arg])
+    recorded = parse_config(record[record.index('--config') + 1:])
+
+    expected = dict(defaults, num_workers='9', min_bundle_size='2000000',
+                    input_pattern='gs://b/*.csv', input_schedule='lpt', region='us-central1')
+    assert recorded == expected
+    for key, value in recorded.items():
+        assert launch_flags[key] == value
@@ -0,0 +1,133 @@
+"""
+🧪 Pruebas del sink de Storage Write API contra LocalWriteServer
+"""
+
+import decimal
+import uuid
+
+import pyarrow as pa
+import pytest
+
+import apache_beam as beam
+from apache_beam.testing.test_pipeline import TestPipeline
+
+from storage_write_sink import (COMMITTED, PENDING, LocalWriteServer, StorageWriteFn, WriteToBigQueryStorage,
+                                WriteTransport, _CommitStreamsFn, convert_rows, parse_schema, rows_to_record_batch)
+
+SCHEMA = 'id:INTEGER,nombre:STRING,monto:NUMERIC,activo:BOOLEAN,ratio:FLOAT'
+TABLE = 'p:ds.t'
+
+def make_rows(count: int):
+    return [[str(i), f'n{i}', f'{i}.123456789', 'true' if i % 2 else 'false', f'{i / 4}'] for i in range(count)]
+
+@pytest.fixture
+def server_name():
+    return f'test-{uuid.uuid4().hex}'
+
+def test_numeric_keeps_decimal_precision():
+    schema = parse_schema(SCHEMA)
+    batch = rows_to_record_batch([['1', 'a', '12345678901234567890.123456789', 'true', '0.5']], schema)
+
+    assert schema.field('monto').type == pa.decimal128(38, 9)
+    assert batch.column(2)[0].as_py() == decimal.Decimal('12345678901234567890.123456789')
+
+def test_numeric_rounds_extra_scale():
+    batch = rows_to_record_batch([['1', 'a', '0.0000000005', '', '']], parse_schema(SCHEMA))
+
+    assert batch.column(2)[0].as_py() == decimal.Decimal('0.000000001')
+
+def test_convert_rows_isolates_invalid_rows():
+    rows = make_rows(4)
+    rows[1][0] = 'uno'
+    rows[2][2] = 'abc'
+
+    batch, rejected = convert_rows(rows, parse_schema(SCHEMA))
+
+    assert batch.num_rows == 2
+    assert batch.column(0).to_pylist() == [0, 3]
+    assert rejected == [rows[1], rows[2]]
+
+def test_committed_mode_writes_through_pooled_streams(server_name):
+    rows = make_rows(250)
+    factory = LocalWriteServer.factory(server_name)
+
+    with TestPipeline() as pipeline:
+        _ = (pipeline | beam.Create(rows)
+             | WriteToBigQueryStorage(TABLE, SCHEMA, mode=COMMITTED, streams_per_worker=2,
+                                      min_batch_size=10, max_batch_size=10, transport_factory=factory))
+
+    server = LocalWriteServer.get(server_name)
+    assert sorted(row['id'] for row in server.tables[TABLE]) == list(range(250))
+    assert server.stats()['appends'] >= 25
+
+def test_pending_mode_commits_once_at_the_end(server_name):
+    rows = make_rows(120)
+    factory = LocalWriteServer.factory(server_name)
+
+    with TestPipeline() as pipeline:
+        _ = (pipeline | beam.Create(rows)
+             | WriteToBigQueryStorage(TABLE, SCHEMA, mode=PENDING, streams_per_worker=3,
+                                      min_batch_size=7, max_batch_size=7, transport_factory=factory))
+
+    server = LocalWriteServer.get(server_name)
+    assert sorted(row['id'] for row in server.tables[TABLE]) == list(range(120))
+    assert all(state['mode'] == 'COMMITTED_PENDING' for state in server.streams.values())
+
+def run_bundle(fn, batches, finish=True):
+    fn.start_bundle()
+    for batch in batches:
+        fn.process(batch)
+    return [value.value for value in fn.finish_bundle()] if finish else []
+
+def test_pending_streams_are_opened_once_in_setup(server_name):
+    factory = LocalWriteServer.factory(server_name)
+    fn = StorageWriteFn(TABLE, SCHEMA, PENDING, streams_per_worker=2, transport_factory=factory)
+    fn.setup()
+    rows = make_rows(40)
+
+    segments = []
+    for start in range(0, 40, 10):
+        segments += run_bundle(fn, [rows[start:start + 5], rows[start + 5:start + 10]])
+
+    server = LocalWriteServer.get(server_name)
+    assert len(server.streams) == 2
+    assert {stream for stream, _ in segments} == set(server.streams)
+
+    list(_CommitStreamsFn(TABLE, factory).process(segments))
+    assert len(server.tables[TABLE]) == 40
+
+def test_pending_commit_refuses_rows_from_failed_bundle(server_name):
+    factory = LocalWriteServer.factory(server_name)
+    fn = StorageWriteFn(TABLE, SCHEMA, PENDING, streams_per_worker=1, transport_factory=factory)
+    fn.setup()
+    rows = make_rows(20)
+
+    segments = run_bundle(fn, [rows[:10]])
+    # El bundle siguiente escribe y falla antes de terminar (el runner lo reintenta en otro worker)
+    run_bundle(fn, [rows[10:]], finish=False)
+
+    with pytest.raises(RuntimeError, match='bundles fallidos'):
+        list(_CommitStreamsFn(TABLE, factory).process(segments))
+    assert LocalWriteServer.get(server_name).tables[TABLE] == []
+
+def test_invalid_rows_do_not_fail_the_bundle(server_name):
+    factory = LocalWriteServer.factory(server_name)
+    fn = StorageWriteFn(TABLE, SCHEMA, COMMITTED, streams_per_worker=1, transport_factory=factory)
+    fn.setup()
+    rows = make_rows(5)
+    rows[3][3] = 'quizás'
+
+    run_bundle(fn, [rows])
+
+    assert [row['id'] for row in LocalWriteServer.get(server_name).tables[TABLE]] == [0, 1, 2, 4]
+
+def test_incomplete_transport_fails_at_construction():
+    class AppendOnly(WriteTransport):
+        def create_stream(self, table, mode):
+            return 'stream'
+
+        def append(self, stream, serialized_schema, serialized_batch, offset, num_rows):
+            pass
+
+    with pytest.raises(TypeError):
+        AppendOnly()
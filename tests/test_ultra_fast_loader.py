@@ -0,0 +1,24 @@
+"""
+🧪 Pruebas del loader: esquema de la entrada real del job
+"""
+
+from apache_beam.options.pipeline_options import PipelineOptions
+
+import ultra_fast_loader
+from ultra_fast_loader import INPUT_FILE, input_schema
+
+def test_schema_comes_from_the_job_input(tmp_path, monkeypatch):
+    requested = []
+    monkeypatch.setattr(ultra_fast_loader, 'cached_schema', lambda path: requested.append(path) or 'id:INTEGER')
+
+    assert input_schema(PipelineOptions([])) == 'id:INTEGER'
+    assert requested == [INPUT_FILE]
+
+    (tmp_path / 'a.csv').write_text('id\n1\n')
+    requested.clear()
+    assert input_schema(PipelineOptions([f'--input_pattern={tmp_path / "*.csv"}'])) == 'id:INTEGER'
+    assert requested == [str(tmp_path / 'a.csv')]
+
+    requested.clear()
+    assert input_schema(PipelineOptions([f'--input_pattern={tmp_path / "*.gz"}'])) is None
+    assert requested == []
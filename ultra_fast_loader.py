@@ -13,19 +13,31 @@ import logging
 import json
 import time
 
+from column_sketches import ColumnProfileOptions, ComputeColumnProfile
+from dependency_profiles import apply_profile
+from fan_out_router import FanOut, RoutingOptions, describe, load_spec
+from input_profile_cache import cached_schema
+from load_checksums import ChecksumOptions, ComputeChecksums, column_names_from_schema, column_types_from_schema
+from local_warehouse_sink import LocalWarehouseOptions, WriteToLocalWarehouse
+from input_scheduler import ReadScheduledFiles, ScheduledInputOptions, discover_files
+from key_aggregates import ComputeKeyAggregates, KeyAggregateOptions
+from pipeline_profiler import profiled
+from rate_limiter import PacedStreamingInserts, per_process_rate
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+INPUT_FILE = 'gs://desafio-deacero-143d30a0-d8f8-4154-b7df-1773cf286d32/cdo_challenge.csv.gz'
+
 class UltraFastLoaderOptions(PipelineOptions):
     """Opciones optimizadas para carga ultra-rápida"""
     
     @classmethod
     def _add_argparse_args(cls, parser):
-        parser.add_value_provider_argument('--input_file', type=str, required=True)
-        parser.add_value_provider_argument('--output_table', type=str, required=True)
-        parser.add_value_provider_argument('--temp_location', type=str, required=True)
-        parser.add_value_provider_argument('--staging_location', type=str, required=True)
+        parser.add_value_provider_argument('--input_file', type=str)
+        parser.add_value_provider_argument('--output_table', type=str)
+        # --temp_location y --staging_location ya los define GoogleCloudOptions
 
 class CSVProcessor(beam.DoFn):
     """Procesador optimizado de CSV con manejo de errores"""
@@ -46,6 +58,55 @@ class CSVProcessor(beam.DoFn):
                 logger.warning(f"Error procesando línea: {e}")
             return []
 
+def input_schema(options):
+    """Esquema en caché de la entrada real del job (None = auto-detect)"""
+    input_options = options.view_as(ScheduledInputOptions)
+    if input_options.input_pattern or input_options.input_manifest:
+        # Los archivos de un patrón comparten formato: el esquema sale del primero descubierto
+        files = discover_files(input_options.input_pattern, input_options.input_manifest)
+        return cached_schema(files[0][0]) if files else None
+    return cached_schema(INPUT_FILE)
+
+@beam.ptransform_fn
+def WriteTable(rows, options, table, schema, write_disposition=BigQueryDisposition.WRITE_TRUNCATE):
+    """Sink de una tabla: almacén local o BigQuery (con techo de filas/s por tabla)"""
+    local_warehouse = options.view_as(LocalWarehouseOptions).local_warehouse
+    if local_warehouse:
+        # Almacén local emulado: ejecución end-to-end sin GCP
+        logger.info(f"💾 Cargando {table} al almacén local {local_warehouse}...")
+        return rows | 'WriteToLocalWarehouse' >> WriteToLocalWarehouse(
+            table,
+            local_warehouse,
+            schema=schema,
+            create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
+            write_disposition=write_disposition
+        )
+    
+    # Con 100 workers los streaming inserts chocan con la cuota por tabla:
+    # cada proceso SDK inserta con su parte del techo y reduce la tasa ante 429
+    rows_per_second = per_process_rate(options)
+    if rows_per_second:
+        logger.info(f"🚦 Limitando {table} a {rows_per_second:,.0f} filas/s por proceso SDK")
+        return rows | 'WriteToBigQuery' >> PacedStreamingInserts(
+            table,
+            schema,
+            rows_per_second,
+            create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
+            write_disposition=write_disposition
+        )
+    
+    # Cargar a BigQuery con configuración optimizada
+    logger.info(f"💾 Cargando a BigQuery ({table})...")
+    return rows | 'WriteToBigQuery' >> WriteToBigQuery(
+        table,
+        schema=schema,
+        create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
+        write_disposition=write_disposition,
+        ignore_unknown_values=True,
+        ignore_insert_ids=True,
+        method='STREAMING_INSERTS'  # Más rápido que batch
+    )
+
 def create_optimized_pipeline():
     """Crea pipeline ultra-optimizado para carga rápida"""
     
@@ -61,19 +122,21 @@ def create_optimized_pipeline():
     
     # Configuración de workers optimizada para velocidad
     worker_options = options.view_as(WorkerOptions)
-    worker_options.num_workers = 50  # Máximo número de workers
-    worker_options.max_num_workers = 100  # Escalado automático
-    worker_options.machine_type = 'n1-standard-4'  # Máquina potente
-    worker_options.disk_size_gb = 100  # Disco grande para procesamiento
+    # Los flags de run_ultra_fast_loader.sh tienen prioridad (y son los que registra el historial)
+    worker_options.num_workers = worker_options.num_workers or 50  # Máximo número de workers
+    worker_options.max_num_workers = worker_options.max_num_workers or 100  # Escalado automático
+    worker_options.machine_type = worker_options.machine_type or 'n1-standard-4'  # Máquina potente
+    worker_options.disk_size_gb = worker_options.disk_size_gb or 100  # Disco grande para procesamiento
     worker_options.worker_region = 'us-central1'
     
     # Configuración de streaming para mejor rendimiento
     standard_options = options.view_as(StandardOptions)
-    standard_options.runner = 'DataflowRunner'
+    standard_options.runner = standard_options.runner or 'DataflowRunner'  # --runner=DirectRunner para local
     
     # Configuraciones adicionales para velocidad
     options.view_as(beam.options.pipeline_options.SetupOptions).save_main_session = False
-    options.view_as(beam.options.pipeline_options.SetupOptions).setup_file = None
+    # setup.py solo empaqueta los módulos del repo; las dependencias salen del perfil
+    apply_profile(options, 'split')
     
     return options
 
@@ -86,39 +149,72 @@ def run_pipeline():
     # Configuración del pipeline
     options = create_optimized_pipeline()
     
+    schema = input_schema(options)  # None = auto-detect si no hay perfil
+    
     # Crear pipeline
     with beam.Pipeline(options=options) as pipeline:
         
         # Leer archivo comprimido con procesamiento paralelo
-        logger.info("📖 Leyendo archivo comprimido...")
-        raw_data = (
-            pipeline 
-            | 'ReadCSV' >> ReadFromText(
-                'gs://desafio-deacero-143d30a0-d8f8-4154-b7df-1773cf286d32/cdo_challenge.csv.gz',
-                compression_type='gzip',
-                strip_trailing_newlines=True
+        input_options = options.view_as(ScheduledInputOptions)
+        if input_options.input_pattern or input_options.input_manifest:
+            # Muchos archivos: reparto por tamaño entre workers
+            logger.info("📖 Leyendo archivos de entrada con planificación por tamaño...")
+            raw_data = pipeline | 'ReadCSV' >> ReadScheduledFiles.from_options(options, skip_header_lines=1)
+        else:
+            logger.info("📖 Leyendo archivo comprimido...")
+            raw_data = (
+                pipeline 
+                | 'ReadCSV' >> ReadFromText(
+                    INPUT_FILE,
+                    compression_type='gzip',
+                    strip_trailing_newlines=True,
+                    skip_header_lines=1,  # El encabezado no es una fila (checksums, perfil, agregados)
+                    min_bundle_size=input_options.min_bundle_size or 0
+                )
             )
-        )
         
         # Procesar CSV en paralelo
         logger.info("⚡ Procesando CSV en paralelo...")
         processed_data = (
             raw_data
-            | 'ProcessCSV' >> beam.ParDo(CSVProcessor())
+            | 'ProcessCSV' >> beam.ParDo(profiled(CSVProcessor(), 'ProcessCSV', options))
             | 'FilterEmpty' >> beam.Filter(lambda x: len(x) > 0)
         )
         
-        # Cargar a BigQuery con configuración optimizada
-        logger.info("💾 Cargando a BigQuery...")
-        processed_data | 'WriteToBigQuery' >> WriteToBigQuery(
-            'tu-proyecto:tu-dataset.tu-tabla',  # Cambiar por tu tabla
-            schema=None,  # Auto-detect schema
-            create_disposition=BigQueryDisposition.CREATE_IF_NEEDED,
-            write_disposition=BigQueryDisposition.WRITE_TRUNCATE,
-            ignore_unknown_values=True,
-            ignore_insert_ids=True,
-            method='STREAMING_INSERTS'  # Más rápido que batch
-        )
+        # Checksums para validar la carga sin re-escanear la tabla
+        checksum_manifest = options.view_as(ChecksumOptions).checksum_manifest
+        if checksum_manifest:
+            processed_data | 'Checksums' >> ComputeChecksums(
+                checksum_manifest, column_names_from_schema(schema), column_types_from_schema(schema))
+        
+        # Distintos, cuantiles y top-k por columna sin escanear la tabla después
+        column_profile = options.view_as(ColumnProfileOptions).column_profile
+        if column_profile:
+            processed_data | 'ColumnProfile' >> ComputeColumnProfile(column_profile, column_names_from_schema(schema))
+        
+        # Filas y sumas por clave (con salting de claves calientes) en lugar de GROUP BY posteriores
+        if options.view_as(KeyAggregateOptions).key_aggregates:
+            processed_data | 'KeyAggregates' >> ComputeKeyAggregates.from_options(
+                options, column_names_from_schema(schema))
+        
+        routing_spec = options.view_as(RoutingOptions).routing_spec
+        if routing_spec:
+            # Varias tablas desde una sola lectura: descompresión y parseo una vez
+            routes = load_spec(routing_spec)
+            logger.info(f"🔀 Fan-out a {len(routes)} tablas:\n{describe(routes)}")
+            processed_data | 'FanOut' >> FanOut(routes, lambda route: WriteTable(
+                options,
+                route.table,
+                # El esquema detectado solo aplica a rutas sin proyección de columnas
+                route.schema or (None if route.columns else schema),
+                route.write_disposition
+            ))
+        else:
+            processed_data | 'Write' >> WriteTable(
+                options,
+                'tu-proyecto:tu-dataset.tu-tabla',  # Cambiar por tu tabla
+                schema
+            )
     
     end_time = time.time()
     duration = end_time - start_time